@@ -0,0 +1,134 @@
+import collections
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+from config import settings
+from logger_config import get_logger
+from db import connect, prune_table
+
+logger = get_logger(__name__)
+
+CALL_STATE_COLUMNS = ("call_sid", "call_id", "email", "transcript", "correlation_id", "updated_at")
+
+# Read-through cache of the latest state per call_id: call_id -> (fetched_at, state or None)
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def _bump(counter: str, amount: int = 1):
+    with _cache_lock:
+        _stats[counter] += amount
+
+
+def call_state_stats() -> dict:
+    with _cache_lock:
+        snapshot = dict(_stats, cached=len(_cache))
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_ratio"] = snapshot["hits"] / lookups if lookups else None
+    return snapshot
+
+
+def _invalidate(call_id):
+    with _cache_lock:
+        _cache.pop(str(call_id), None)
+
+
+def _store(call_sid: str, call_id, email: Optional[str], transcript, db_path: str, correlation_id: Optional[str] = None):
+    """
+    Upserts the row for call_sid (None leaves a column as it was; the first email stored wins). Old rows are
+    evicted by prune_call_state, not here.
+    """
+    now = time.time()
+    conn = connect(db_path)
+    try:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO call_state (call_sid, call_id, email, transcript, correlation_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (call_sid) DO UPDATE SET
+                call_id = COALESCE(excluded.call_id, call_id),
+                email = COALESCE(email, excluded.email),
+                transcript = COALESCE(excluded.transcript, transcript),
+                correlation_id = COALESCE(correlation_id, excluded.correlation_id),
+                updated_at = excluded.updated_at
+        """, (call_sid, call_id, email, json.dumps(transcript) if transcript is not None else None, correlation_id, now, now))
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"[call_state] Store for callSid {call_sid} failed: {e}")
+        return
+    finally:
+        conn.close()
+
+    if call_id is not None:
+        _invalidate(call_id)
+    _bump("stores")
+
+
+def prune_call_state(db_path="queue.db") -> int:
+    """Drops rows past CALL_STATE_TTL_SECONDS and the least recently updated beyond CALL_STATE_MAX_ENTRIES."""
+    try:
+        evicted = prune_table(
+            db_path, "call_state", "call_sid",
+            expires_column="updated_at", expires_before=time.time() - settings.CALL_STATE_TTL_SECONDS,
+            lru_column="updated_at", max_rows=settings.CALL_STATE_MAX_ENTRIES
+        )
+    except sqlite3.Error as e:
+        logger.error(f"[call_state] Eviction failed: {e}")
+        return 0
+    if evicted:
+        _bump("evictions", evicted)
+    return evicted
+
+
+def record_call_started(call_sid: str, call_id, email: Optional[str], db_path="queue.db", correlation_id: Optional[str] = None):
+    """Remembers which call_sid belongs to call_id, with the email the call was placed for and its trace id."""
+    _store(str(call_sid), call_id, email, None, db_path, correlation_id)
+
+
+def record_call_transcript(call_sid: str, call_id, email: Optional[str], transcript, db_path="queue.db"):
+    """
+    Adds the transcript from the call-ended webhook (stored as JSON, like post_call_jobs, so turns keep their
+    roles); an email stored when the call started is kept.
+    """
+    _store(str(call_sid), call_id, email, transcript, db_path)
+
+
+def get_call_state(call_id, db_path="queue.db") -> Optional[dict]:
+    """
+    Latest state (call_sid, email, transcript, correlation_id) for call_id, or None. Reads go through a bounded in-process LRU
+    that keeps entries for CALL_STATE_CACHE_TTL_SECONDS, so state written by another worker shows up within that.
+    """
+    key = str(call_id)
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and now - entry[0] < settings.CALL_STATE_CACHE_TTL_SECONDS:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[1]
+        _stats["misses"] += 1
+
+    conn = connect(db_path)
+    try:
+        row = conn.execute(
+            f"SELECT {', '.join(CALL_STATE_COLUMNS)} FROM call_state WHERE call_id = ? ORDER BY updated_at DESC LIMIT 1",
+            (call_id,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"[call_state] Lookup for call_id {call_id} failed: {e}")
+        return None
+    finally:
+        conn.close()
+
+    state = dict(zip(CALL_STATE_COLUMNS, row)) if row else None
+    if state and state["transcript"]:
+        state["transcript"] = json.loads(state["transcript"])
+    with _cache_lock:
+        _cache[key] = (now, state)
+        _cache.move_to_end(key)
+        while len(_cache) > settings.CALL_STATE_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return state
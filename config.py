@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -16,6 +17,108 @@ class Settings(BaseSettings):
     GROQ_API_KEY: str
     TWILIO_AUTH_TOKEN: str
     TWILIO_ACCOUNT_SID: str
+    # Number of calls that may be in flight at once (bounded by the ElevenLabs/Twilio concurrency limit)
+    MAX_CONCURRENT_CALLS: int = 3
+    # Lease on a claimed call_queue row; the owning worker renews it every CALL_HEARTBEAT_SECONDS
+    CALL_LEASE_SECONDS: int = 30
+    CALL_HEARTBEAT_SECONDS: int = 10
+    # Leases stop being renewed after this long, so calls whose webhook never arrives are reclaimed
+    CALL_MAX_DURATION_SECONDS: int = 660
+    # Dial attempts before a reclaimed call is dropped from the queue instead of re-queued
+    CALL_MAX_ATTEMPTS: int = 2
+    # Public URL of this app, used to register the Twilio status callback (e.g. https://sdr.example.com)
+    PUBLIC_BASE_URL: Optional[str] = None
+    # Reconciliation poll for calls whose Twilio status callback never arrived
+    TWILIO_RECONCILE_INTERVAL_SECONDS: int = 60
+    TWILIO_CALLBACK_GRACE_SECONDS: int = 90
+    # Post-call work (summary, notes, meeting invite) runs on a worker pool fed by the post_call_jobs table
+    POST_CALL_WORKERS: int = 4
+    POST_CALL_MAX_ATTEMPTS: int = 5
+    POST_CALL_RETRY_BASE_SECONDS: int = 30
+    POST_CALL_JOB_LEASE_SECONDS: int = 600
+    POST_CALL_POLL_SECONDS: int = 15
+    # Timeout for each meeting-invite request; keep well under POST_CALL_JOB_LEASE_SECONDS
+    MEETING_INVITE_TIMEOUT_SECONDS: int = 30
+    # Transcript chunks summarized concurrently per call (each chunk is one Groq request)
+    SUMMARY_MAX_CONCURRENCY: int = 4
+    # Greetings are generated ahead of dialing for this many queued calls (keep >= MAX_CONCURRENT_CALLS)
+    GREETING_PREFETCH_DEPTH: int = 5
+    GREETING_PREFETCH_POLL_SECONDS: int = 30
+    # Persistent cache of generated greetings keyed by a hash of model + prompts
+    GREETING_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    GREETING_CACHE_MAX_ENTRIES: int = 10000
+    # Per-call state (call_sid, email, transcript): rows kept in SQLite, and the in-process read cache in front of it
+    CALL_STATE_TTL_SECONDS: int = 7 * 24 * 3600
+    CALL_STATE_MAX_ENTRIES: int = 50000
+    CALL_STATE_CACHE_ENTRIES: int = 1024
+    CALL_STATE_CACHE_TTL_SECONDS: int = 10
+    # TTL and size eviction of greeting_cache and call_state runs on the lease heartbeat at most this often
+    CACHE_PRUNE_INTERVAL_SECONDS: int = 300
+    # Past call outcomes (from call_events) included in the dial prompt, newest first
+    CALL_HISTORY_PROMPT_EVENTS: int = 3
+    # Logging: root level plus per-module overrides ("httpx=WARNING,ingestion=DEBUG"), JSON lines in LOG_FILE
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = ""
+    LOG_FILE: str = "app.log"
+    LOG_JSON: bool = True
+    # Size-based rotation by default; set LOG_ROTATE_WHEN (e.g. "midnight") to rotate by time instead
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 5
+    LOG_ROTATE_WHEN: Optional[str] = None
+    # Records waiting for the log writer thread; past this, new records are dropped rather than blocking callers
+    LOG_QUEUE_SIZE: int = 10000
+    # Shared Groq limits (match the account's rate limits) and retry backoff
+    GROQ_REQUESTS_PER_MINUTE: int = 30
+    GROQ_TOKENS_PER_MINUTE: int = 12000
+    GROQ_MAX_RETRIES: int = 4
+    GROQ_BACKOFF_BASE_SECONDS: float = 1.0
+    GROQ_BACKOFF_MAX_SECONDS: float = 30.0
+    # Per-request timeout on the shared Groq client (the SDK default waits minutes)
+    GROQ_REQUEST_TIMEOUT_SECONDS: float = 30.0
+    # A greeting generated inline on the dispatcher waits at most this long for rate-limit capacity and the reply
+    # before the call goes out with the fallback greeting
+    GREETING_INLINE_ACQUIRE_TIMEOUT_SECONDS: float = 1.0
+    GREETING_INLINE_REQUEST_TIMEOUT_SECONDS: float = 5.0
+    # Rows per batch (and per commit) when ingesting uploaded sheets
+    INGEST_BATCH_SIZE: int = 5000
+    # "delta" upserts by customer_id/phone and keeps notes/tasks; "replace" clears customer_data first
+    INGEST_MODE: str = "delta"
+    # A queued/running ingest job whose owning worker has not heart-beaten for this long is marked failed
+    INGEST_JOB_STALE_SECONDS: int = 60
+    # Uploaded sheets are stored per upload under UPLOAD_DIR, named by content hash
+    UPLOAD_DIR: str = "uploads"
+    UPLOAD_MAX_BYTES: int = 100 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    # Background Excel export: re-checked every poll interval, rewritten only when customer_data changed
+    EXCEL_EXPORT_POLL_SECONDS: int = 30
+    EXCEL_EXPORT_WAIT_SECONDS: int = 60
+    # Only the worker holding the excel_export lease writes the file; the lease is renewed on every pass
+    EXCEL_EXPORT_LEASE_SECONDS: int = 300
+    # SQLite connection pool (db.py): busy timeout, page cache per connection, prepared statements per connection
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 16384
+    SQLITE_STATEMENT_CACHE_SIZE: int = 256
+    SQLITE_POOL_IDLE_PER_THREAD: int = 2
+    # /status and /customer-data-status page sizes (default and the most a client may ask for)
+    STATUS_PAGE_SIZE: int = 100
+    STATUS_PAGE_MAX: int = 1000
+    # /events feed: queue_events poll interval, in-memory replay buffer, events per send, keepalive, rows kept
+    EVENTS_POLL_SECONDS: float = 0.5
+    EVENTS_BUFFER_SIZE: int = 2000
+    EVENTS_BATCH_SIZE: int = 500
+    EVENTS_HEARTBEAT_SECONDS: int = 15
+    EVENTS_RETENTION_ROWS: int = 100000
+    EVENTS_PRUNE_SECONDS: int = 300
+    # /metrics needs "Authorization: Bearer <METRICS_TOKEN>" when set; open (like the webhooks) when empty
+    METRICS_TOKEN: str = ""
+    # Call lifecycle traces (tracing.py): "jsonl" appends spans to TRACE_FILE, "otlp" posts OTLP/HTTP JSON, "none" is off
+    TRACE_EXPORTER: str = "jsonl"
+    TRACE_FILE: str = "traces.jsonl"
+    TRACE_FILE_MAX_BYTES: int = 50 * 1024 * 1024
+    TRACE_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACE_SERVICE_NAME: str = "ai-sdr"
+    TRACE_QUEUE_SIZE: int = 10000
+    TRACE_BATCH_SIZE: int = 256
 
     class Config:
         env_file = ".env"
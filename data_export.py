@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Sequence
+from openpyxl import Workbook
+from db import connect
+from helperfuncs import DB_PATH
+
+# Columns of customer_data that may be exported (row_key/row_hash are internal delta-ingest bookkeeping)
+EXPORT_COLUMNS = (
+    "call_id", "customer_id", "customer_name", "phone_number", "email", "customer_requirements", "last_call_status",
+    "country_code", "industry", "company_name", "location", "to_call", "notes", "tasks", "updated_at"
+)
+# Columns of the resultant Excel file, in its historical order
+EXCEL_COLUMNS = EXPORT_COLUMNS[:-1]
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+FETCH_SIZE = 1000
+
+
+def timestamp_bound(value: str, end_of_range: bool) -> tuple:
+    """
+    Turns an ISO date/datetime into an (operator, 'YYYY-MM-DD HH:MM:SS') bound matching SQLite's CURRENT_TIMESTAMP.
+    A bare end date covers that whole day. Raises ValueError on unparseable input.
+    """
+    parsed = datetime.fromisoformat(value.strip())
+    if end_of_range and len(value.strip()) == 10:
+        return "<", (parsed + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+    return ("<=" if end_of_range else ">="), parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def build_export_query(
+    columns: Optional[Sequence[str]] = None,
+    last_call_status: Optional[Sequence[str]] = None,
+    updated_since: Optional[str] = None,
+    updated_until: Optional[str] = None
+) -> tuple:
+    """
+    Returns (columns, where, params) for a filtered, projected customer_data export, to pass to iter_export_rows.
+    Raises ValueError for unknown columns or bad dates. last_call_status accepts 'none' for never-called rows.
+    """
+    columns = list(columns) if columns else list(EXPORT_COLUMNS)
+    unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export column(s): {', '.join(unknown)}")
+
+    where, params = [], []
+    if last_call_status:
+        statuses = [status for status in last_call_status if status.lower() != "none"]
+        clauses = []
+        if statuses:
+            clauses.append(f"last_call_status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if len(statuses) < len(last_call_status):
+            clauses.append("last_call_status IS NULL")
+        where.append(f"({' OR '.join(clauses)})")
+    if updated_since:
+        operator, bound = timestamp_bound(updated_since, end_of_range=False)
+        where.append(f"updated_at {operator} ?")
+        params.append(bound)
+    if updated_until:
+        operator, bound = timestamp_bound(updated_until, end_of_range=True)
+        where.append(f"updated_at {operator} ?")
+        params.append(bound)
+    return columns, " AND ".join(where), params
+
+
+def iter_export_rows(columns: Sequence[str], where: str, params, db_path=DB_PATH) -> Iterator[tuple]:
+    """
+    Yields the selected columns in call_id order, one FETCH_SIZE keyset page per query. Each page is a short
+    read, so a slow client streaming a large export never holds the database lock between pages.
+    notes/tasks come from customer_data_with_history, i.e. with the call_events history appended.
+    """
+    sql = (
+        f"SELECT call_id, {', '.join(columns)} FROM customer_data_with_history "
+        f"WHERE {where + ' AND ' if where else ''}call_id > ? ORDER BY call_id ASC LIMIT {FETCH_SIZE}"
+    )
+    last_call_id = float("-inf")
+    while True:
+        conn = connect(db_path)
+        try:
+            page = conn.execute(sql, [*params, last_call_id]).fetchall()
+        finally:
+            conn.close()
+        if not page:
+            break
+        last_call_id = page[-1][0]
+        for row in page:
+            yield row[1:]
+        if len(page) < FETCH_SIZE:
+            break
+
+
+def iter_csv(columns: Sequence[str], rows: Iterator[tuple]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % FETCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def iter_jsonl(columns: Sequence[str], rows: Iterator[tuple]) -> Iterator[bytes]:
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        if len(chunk) >= FETCH_SIZE:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
+
+
+def write_xlsx(path: str, columns: Sequence[str], rows: Iterator[tuple], sheet_title: str = "Sheet1") -> int:
+    """Writes rows with openpyxl's write-only workbook (rows are flushed as they are appended). Returns rows written."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(list(columns))
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
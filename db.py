@@ -0,0 +1,175 @@
+import sqlite3
+import threading
+import time
+from config import settings
+from logger_config import get_logger
+from metrics import SQLITE_LOCK_WAIT_SECONDS
+
+logger = get_logger(__name__)
+
+# Database path
+DB_PATH = "queue.db"
+
+# Connection pools are per thread (sqlite3 connections must stay on the thread that created them)
+_local = threading.local()
+_wal_paths = set()
+_stats = {
+    "connections_opened": 0,
+    "checkouts": 0,
+    "lock_waits": 0,
+    "lock_wait_total_ms": 0.0,
+    "lock_wait_max_ms": 0.0,
+    "busy_errors": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _record_lock_wait(waited_ms: float):
+    with _stats_lock:
+        _stats["lock_waits"] += 1
+        _stats["lock_wait_total_ms"] += waited_ms
+        _stats["lock_wait_max_ms"] = max(_stats["lock_wait_max_ms"], waited_ms)
+
+
+def _record_busy():
+    with _stats_lock:
+        _stats["busy_errors"] += 1
+
+
+def db_stats() -> dict:
+    """Pool and lock-wait counters (process-wide). Lock waits cover every begin_immediate() write transaction."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot["lock_wait_avg_ms"] = snapshot["lock_wait_total_ms"] / snapshot["lock_waits"] if snapshot["lock_waits"] else None
+    return snapshot
+
+
+def _open(db_path: str) -> sqlite3.Connection:
+    """
+    Opens a raw connection with the tuned pragmas. WAL lets readers (/status, exports) run alongside the single
+    writer; synchronous=NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit.
+    """
+    conn = sqlite3.connect(
+        db_path,
+        timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=settings.SQLITE_STATEMENT_CACHE_SIZE
+    )
+    if db_path not in _wal_paths:
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            logger.warning(f"[db] Could not enable WAL for {db_path} (journal_mode={mode}).\n\n")
+        _wal_paths.add(db_path)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    with _stats_lock:
+        _stats["connections_opened"] += 1
+    return conn
+
+
+def _idle_connections(db_path: str) -> list:
+    pools = getattr(_local, "pools", None)
+    if pools is None:
+        pools = _local.pools = {}
+    return pools.setdefault(db_path, [])
+
+
+class PooledConnection:
+    """
+    A connection checked out of the calling thread's pool. It behaves like sqlite3.Connection, but close()
+    rolls back anything left open and returns the connection to the pool, so the prepared-statement cache
+    survives between calls. Used as a context manager it commits (or rolls back on error) and then releases.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, db_path: str):
+        self._conn = conn
+        self._db_path = db_path
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a released connection.")
+        return getattr(self._conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.isolation_level = ""
+        except sqlite3.Error as e:
+            logger.warning(f"[db] Dropping pooled connection after error on release: {e}\n\n")
+            conn.close()
+            return
+        idle = _idle_connections(self._db_path)
+        if len(idle) < settings.SQLITE_POOL_IDLE_PER_THREAD:
+            idle.append(conn)
+        else:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+
+def connect(db_path: str = DB_PATH, isolation_level="") -> PooledConnection:
+    """
+    Checks a connection out of this thread's pool (opening one if the pool is empty). Nested checkouts on the
+    same thread get separate connections, so an inner close() never touches an outer transaction.
+    isolation_level=None gives autocommit mode for code that issues BEGIN IMMEDIATE itself.
+    """
+    idle = _idle_connections(db_path)
+    conn = idle.pop() if idle else _open(db_path)
+    conn.isolation_level = isolation_level
+    with _stats_lock:
+        _stats["checkouts"] += 1
+    return PooledConnection(conn, db_path)
+
+
+def begin_immediate(cursor):
+    """Starts a write transaction, recording how long it waited for the write lock."""
+    started = time.perf_counter()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError:
+        _record_busy()
+        raise
+    waited = time.perf_counter() - started
+    _record_lock_wait(waited * 1000)
+    SQLITE_LOCK_WAIT_SECONDS.observe(waited)
+
+
+def prune_table(db_path: str, table: str, key_column: str, expires_column: str, expires_before: float, lru_column: str, max_rows: int) -> int:
+    """
+    TTL and size eviction for the SQLite-backed caches: deletes rows whose expires_column is at or before
+    expires_before, then the least recently used (oldest lru_column) beyond max_rows. Returns rows deleted.
+    The size bound counts the table, so this runs periodically rather than on every write.
+    """
+    conn = connect(db_path)
+    try:
+        c = conn.cursor()
+        c.execute(f"DELETE FROM {table} WHERE {expires_column} <= ?", (expires_before,))
+        deleted = c.rowcount
+        c.execute(f"""
+            DELETE FROM {table} WHERE {key_column} IN (
+                SELECT {key_column} FROM {table}
+                ORDER BY {lru_column} ASC
+                LIMIT MAX(0, (SELECT COUNT(*) FROM {table}) - ?)
+            )
+        """, (max_rows,))
+        deleted += c.rowcount
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
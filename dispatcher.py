@@ -0,0 +1,88 @@
+import threading
+import time
+from typing import Callable, Optional
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueueDispatcher:
+    """
+    One long-lived thread that fills free call slots.
+    Producers call wake() whenever rows are enqueued or a slot frees up; wakeups that arrive while a
+    dispatch is already pending are coalesced into a single pass over the queue.
+    """
+
+    def __init__(self, fill_slot: Callable[[], bool], name: str = "QueueDispatcher"):
+        # fill_slot() claims and dials at most one call, returning True if another attempt may succeed
+        self._fill_slot = fill_slot
+        self._name = name
+        self._cond = threading.Condition()
+        self._pending = False
+        self._first_wake_at: Optional[float] = None
+        self._reasons: set = set()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "wakeups": 0,
+            "coalesced_wakeups": 0,
+            "dispatches": 0,
+            "slots_filled": 0,
+            "last_dispatch_latency_ms": None,
+            "max_dispatch_latency_ms": 0.0,
+            "total_dispatch_latency_ms": 0.0,
+        }
+
+    def start(self):
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+            self._thread.start()
+        logger.info(f"[{self._name}] Dispatcher thread started.\n\n")
+
+    def wake(self, reason: str = "unspecified"):
+        """Requests a dispatch pass. Cheap and safe to call from any thread or request handler."""
+        with self._cond:
+            self._stats["wakeups"] += 1
+            self._reasons.add(reason)
+            if self._pending:
+                self._stats["coalesced_wakeups"] += 1
+                return
+            self._pending = True
+            self._first_wake_at = time.monotonic()
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            snapshot = dict(self._stats)
+        dispatches = snapshot["dispatches"]
+        snapshot["avg_dispatch_latency_ms"] = (
+            snapshot["total_dispatch_latency_ms"] / dispatches if dispatches else None
+        )
+        return snapshot
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                latency_ms = (time.monotonic() - self._first_wake_at) * 1000
+                reasons = sorted(self._reasons)
+                self._pending = False
+                self._first_wake_at = None
+                self._reasons = set()
+                self._stats["dispatches"] += 1
+                self._stats["last_dispatch_latency_ms"] = latency_ms
+                self._stats["max_dispatch_latency_ms"] = max(self._stats["max_dispatch_latency_ms"], latency_ms)
+                self._stats["total_dispatch_latency_ms"] += latency_ms
+
+            logger.info(f"[{self._name}] Dispatching after {latency_ms:.1f} ms (reasons: {', '.join(reasons)}).")
+            filled = 0
+            try:
+                # Keep filling slots until the queue is empty or every slot is busy
+                while self._fill_slot():
+                    filled += 1
+            except Exception as e:
+                logger.error(f"[{self._name}] Error while dispatching: {e}\n\n", exc_info=True)
+            with self._cond:
+                self._stats["slots_filled"] += filled
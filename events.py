@@ -0,0 +1,194 @@
+import asyncio
+import collections
+import json
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+from config import settings
+from logger_config import get_logger
+from db import connect
+from helperfuncs import DB_PATH
+
+logger = get_logger(__name__)
+
+EVENT_COLUMNS = ("event_id", "kind", "call_id", "status", "previous_status", "detail", "created_at")
+
+
+def record_event(cursor, kind: str, call_id: Optional[int] = None, status: Optional[str] = None, detail: Optional[dict] = None):
+    """Adds an application event (ingest progress, export done) to queue_events inside the caller's transaction."""
+    cursor.execute(
+        "INSERT INTO queue_events (kind, call_id, status, detail) VALUES (?, ?, ?, ?)",
+        (kind, call_id, status, json.dumps(detail) if detail is not None else None)
+    )
+
+
+def fetch_events(after_id: int, limit: int, db_path=DB_PATH) -> list:
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(EVENT_COLUMNS)} FROM queue_events WHERE event_id > ? ORDER BY event_id ASC LIMIT ?",
+            (after_id, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    events = []
+    for row in rows:
+        event = dict(zip(EVENT_COLUMNS, row))
+        event["detail"] = json.loads(event["detail"]) if event["detail"] else None
+        events.append(event)
+    return events
+
+
+def event_id_bounds(db_path=DB_PATH) -> tuple:
+    """(oldest retained event_id, latest event_id); (None, 0) when the table is empty."""
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT MIN(event_id), MAX(event_id) FROM queue_events").fetchone()
+    finally:
+        conn.close()
+    return row[0], row[1] or 0
+
+
+def format_sse(event: dict) -> str:
+    return f"id: {event['event_id']}\nevent: {event['kind']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class EventBroker:
+    """
+    Tails queue_events with one query per poll, however many clients are connected, and keeps the newest
+    EVENTS_BUFFER_SIZE events in memory. Each client holds only its own cursor: it is served from the buffer
+    while it keeps up and pages from the table once it falls behind, so a slow client costs no server memory
+    and cannot hold up the others.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, name: str = "EventBroker"):
+        self.db_path = db_path
+        self._name = name
+        self._lock = threading.Lock()
+        self._buffer = collections.deque(maxlen=settings.EVENTS_BUFFER_SIZE)
+        self._latest_id = 0
+        self._subscribers = {}
+        self._thread = None
+        self._stats = {"polls": 0, "events": 0, "pruned": 0, "buffer_reads": 0, "table_reads": 0}
+
+    def start(self):
+        if self._thread:
+            return
+        self._latest_id = event_id_bounds(self.db_path)[1]
+        self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+        self._thread.start()
+        logger.info(f"[{self._name}] Event feed started at event_id {self._latest_id}.\n\n")
+
+    def latest_id(self) -> int:
+        with self._lock:
+            return self._latest_id
+
+    def subscribe(self) -> asyncio.Event:
+        """Registers the calling event loop's client; the returned Event is set whenever new events arrive."""
+        wake = asyncio.Event()
+        with self._lock:
+            self._subscribers[wake] = asyncio.get_running_loop()
+        return wake
+
+    def unsubscribe(self, wake: asyncio.Event):
+        with self._lock:
+            self._subscribers.pop(wake, None)
+
+    def buffered_after(self, after_id: int, limit: int) -> Optional[list]:
+        """Events after after_id from the in-memory buffer, or None if the buffer no longer reaches back that far."""
+        with self._lock:
+            if after_id >= self._latest_id:
+                return []
+            if not self._buffer or self._buffer[0]["event_id"] > after_id + 1:
+                self._stats["table_reads"] += 1
+                return None
+            self._stats["buffer_reads"] += 1
+            return [event for event in self._buffer if event["event_id"] > after_id][:limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, subscribers=len(self._subscribers), latest_event_id=self._latest_id)
+
+    def _poll_once(self):
+        while True:
+            events = fetch_events(self.latest_id(), settings.EVENTS_BATCH_SIZE, self.db_path)
+            if not events:
+                return
+            with self._lock:
+                self._buffer.extend(events)
+                self._latest_id = events[-1]["event_id"]
+                self._stats["events"] += len(events)
+                subscribers = list(self._subscribers.items())
+            for wake, loop in subscribers:
+                try:
+                    loop.call_soon_threadsafe(wake.set)
+                except RuntimeError:
+                    # The client's loop has shut down without unsubscribing
+                    self.unsubscribe(wake)
+            if len(events) < settings.EVENTS_BATCH_SIZE:
+                return
+
+    def _prune(self):
+        conn = connect(self.db_path)
+        try:
+            c = conn.cursor()
+            c.execute("DELETE FROM queue_events WHERE event_id <= ?", (self.latest_id() - settings.EVENTS_RETENTION_ROWS,))
+            conn.commit()
+            pruned = c.rowcount
+        finally:
+            conn.close()
+        if pruned:
+            with self._lock:
+                self._stats["pruned"] += pruned
+            logger.info(f"[{self._name}] Pruned {pruned} old events.\n\n")
+
+    def _run(self):
+        polls_per_prune = max(1, int(settings.EVENTS_PRUNE_SECONDS / settings.EVENTS_POLL_SECONDS))
+        while True:
+            try:
+                self._poll_once()
+                with self._lock:
+                    self._stats["polls"] += 1
+                    prune_due = self._stats["polls"] % polls_per_prune == 0
+                if prune_due:
+                    self._prune()
+            except Exception as e:
+                logger.error(f"[{self._name}] Error reading queue events: {e}\n\n", exc_info=True)
+            time.sleep(settings.EVENTS_POLL_SECONDS)
+
+
+async def stream_events(broker: EventBroker, after_id: Optional[int], is_disconnected: Callable[[], Awaitable[bool]]):
+    """
+    Yields SSE frames for events after after_id (the client's Last-Event-ID), or only new events when it is None.
+    A resume point older than the retained events gets a 'reset' event first, telling the client to reload
+    /status before applying the rest. Each send is at most EVENTS_BATCH_SIZE events; the next batch is read
+    only after the client took the previous one.
+    """
+    wake = broker.subscribe()
+    try:
+        if after_id is None:
+            last_id = broker.latest_id()
+        else:
+            last_id = after_id
+            oldest_id, latest_id = await asyncio.to_thread(event_id_bounds, broker.db_path)
+            if (oldest_id is not None and after_id < oldest_id - 1) or after_id > latest_id:
+                last_id = broker.latest_id()
+                yield format_sse({"event_id": last_id, "kind": "reset"})
+        # Reconnect delay for EventSource; it resends Last-Event-ID, so nothing is lost across reconnects
+        yield "retry: 3000\n\n"
+
+        while not await is_disconnected():
+            wake.clear()
+            events = broker.buffered_after(last_id, settings.EVENTS_BATCH_SIZE)
+            if events is None:
+                events = await asyncio.to_thread(fetch_events, last_id, settings.EVENTS_BATCH_SIZE, broker.db_path)
+            if events:
+                last_id = events[-1]["event_id"]
+                yield "".join(format_sse(event) for event in events)
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(wake)
@@ -0,0 +1,148 @@
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+from config import settings
+from logger_config import get_logger
+from db import connect
+from helperfuncs import DB_PATH, acquire_background_lease, get_data_version
+from notes_and_tasks import export_customer_data_to_excel
+from events import record_event
+from metrics import EXPORT_SECONDS
+
+logger = get_logger(__name__)
+
+
+class ExcelExporter:
+    """
+    Keeps resultant_excel.xlsx in step with customer_data in the background. The file is only rewritten when
+    data_versions['customer_data'] moved past the version it was last exported at, and each export is written
+    to a temp file and swapped in, so readers never see a half-written workbook.
+    Every worker runs an exporter, but only the one holding the excel_export lease writes the file; the others
+    stand by and pick up the exported version from excel_exports, which also survives restarts.
+    """
+
+    def __init__(self, excel_path: str, db_path: str = DB_PATH, name: str = "ExcelExporter"):
+        self.excel_path = excel_path
+        self._db_path = db_path
+        self._name = name
+        self._cond = threading.Condition()
+        self._requested = False
+        self._exported_version = None
+        self._standby = False
+        self._thread = None
+        self._stats = {"requests": 0, "exports": 0, "skipped": 0, "standby": 0, "errors": 0, "last_export_ms": None}
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+        self._thread.start()
+        logger.info(f"[{self._name}] Background Excel export started for {self.excel_path}.\n\n")
+
+    def request(self):
+        """Asks for a refresh; a no-op pass if customer_data has not changed since the last export."""
+        with self._cond:
+            self._requested = True
+            self._stats["requests"] += 1
+            self._cond.notify_all()
+
+    def current_version(self) -> Optional[int]:
+        """customer_data version the file on disk was exported at, or None if there is no current file."""
+        with self._cond:
+            if self._exported_version is None or not os.path.exists(self.excel_path):
+                return None
+            return self._exported_version
+
+    def wait_until_current(self, timeout: float) -> Optional[int]:
+        """
+        Requests a refresh if the export is behind customer_data and waits up to timeout seconds for it.
+        Returns the exported version when the file is current, else None.
+        """
+        target = get_data_version("customer_data", self._db_path)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._exported_version is None or self._exported_version < target or not os.path.exists(self.excel_path):
+                if not self._requested:
+                    self._requested = True
+                    self._stats["requests"] += 1
+                    self._cond.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(timeout=remaining)
+            return self._exported_version
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, exported_version=self._exported_version)
+
+    def _read_exported_version(self) -> Optional[int]:
+        with connect(self._db_path) as conn:
+            row = conn.execute("SELECT version FROM excel_exports WHERE path = ?", (self.excel_path,)).fetchone()
+        return row[0] if row else None
+
+    def _export_once(self):
+        exported_version = self._read_exported_version()
+        if not acquire_background_lease("excel_export", settings.EXCEL_EXPORT_LEASE_SECONDS, db_path=self._db_path):
+            with self._cond:
+                self._standby = True
+                self._exported_version = exported_version
+                self._stats["standby"] += 1
+                self._cond.notify_all()
+            return
+        version = get_data_version("customer_data", self._db_path)
+        with self._cond:
+            self._standby = False
+            self._exported_version = exported_version
+            if version == exported_version and os.path.exists(self.excel_path):
+                self._stats["skipped"] += 1
+                self._cond.notify_all()
+                return
+        # Version is read before the table, so writes that land during the export trigger another pass
+        started = time.perf_counter()
+        directory = os.path.dirname(self.excel_path) or "."
+        extension = os.path.splitext(self.excel_path)[1]
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".export-", suffix=extension)
+        os.close(fd)
+        try:
+            export_customer_data_to_excel(db_path=self._db_path, excel_path=tmp_path)
+            os.replace(tmp_path, self.excel_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        EXPORT_SECONDS.observe(elapsed_ms / 1000, kind="excel")
+        with connect(self._db_path) as conn:
+            conn.execute(
+                "INSERT INTO excel_exports (path, version) VALUES (?, ?) ON CONFLICT(path) DO UPDATE SET version = excluded.version, exported_at = CURRENT_TIMESTAMP",
+                (self.excel_path, version)
+            )
+        with self._cond:
+            self._exported_version = version
+            self._stats["exports"] += 1
+            self._stats["last_export_ms"] = round(elapsed_ms, 1)
+            self._cond.notify_all()
+        with connect(self._db_path) as conn:
+            record_event(conn.cursor(), "excel_exported", detail={"version": version, "elapsed_ms": round(elapsed_ms, 1)})
+        logger.info(f"[{self._name}] Exported customer_data version {version} in {elapsed_ms:.0f} ms.\n\n")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # The periodic pass is one version read; it keeps the file fresh for /excel-status between requests
+                if not self._requested:
+                    self._cond.wait(timeout=settings.EXCEL_EXPORT_POLL_SECONDS)
+                elif self._standby:
+                    # Another worker writes the file; waiters re-read its progress at most once a second
+                    self._cond.wait(timeout=1)
+                self._requested = False
+            try:
+                self._export_once()
+            except Exception as e:
+                with self._cond:
+                    self._stats["errors"] += 1
+                    self._cond.notify_all()
+                logger.error(f"[{self._name}] Error exporting Excel: {e}\n\n", exc_info=True)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+from config import settings
+from logger_config import get_logger
+from db import connect, prune_table
+
+logger = get_logger(__name__)
+
+# Hit/miss counters for the greeting cache (process-wide)
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def _bump(counter: str, amount: int = 1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def greeting_cache_stats() -> dict:
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_ratio"] = snapshot["hits"] / lookups if lookups else None
+    return snapshot
+
+
+def make_cache_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    """Content address of a completion request: identical model and prompts always map to the same key."""
+    payload = json.dumps([model, system_prompt, user_prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_greeting(cache_key: str, db_path="queue.db") -> Optional[str]:
+    """Returns the cached message if present and younger than GREETING_CACHE_TTL_SECONDS, refreshing its LRU stamp."""
+    now = time.time()
+    conn = connect(db_path)
+    try:
+        c = conn.cursor()
+        c.execute(
+            "SELECT message FROM greeting_cache WHERE cache_key = ? AND created_at > ?",
+            (cache_key, now - settings.GREETING_CACHE_TTL_SECONDS)
+        )
+        row = c.fetchone()
+        if row:
+            c.execute("UPDATE greeting_cache SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?", (now, cache_key))
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"[greeting_cache] Lookup failed: {e}")
+        row = None
+    finally:
+        conn.close()
+
+    _bump("hits" if row else "misses")
+    return row[0] if row else None
+
+
+def store_greeting(cache_key: str, model: str, message: str, db_path="queue.db"):
+    """Stores a generated message; expired and least recently used entries are evicted by prune_greeting_cache."""
+    now = time.time()
+    conn = connect(db_path)
+    try:
+        c = conn.cursor()
+        c.execute(
+            "INSERT OR REPLACE INTO greeting_cache (cache_key, model, message, created_at, last_used_at, hits) VALUES (?, ?, ?, ?, ?, 0)",
+            (cache_key, model, message, now, now)
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"[greeting_cache] Store failed: {e}")
+        return
+    finally:
+        conn.close()
+
+    _bump("stores")
+
+
+def prune_greeting_cache(db_path="queue.db") -> int:
+    """Drops entries past GREETING_CACHE_TTL_SECONDS and the least recently used beyond GREETING_CACHE_MAX_ENTRIES."""
+    try:
+        evicted = prune_table(
+            db_path, "greeting_cache", "cache_key",
+            expires_column="created_at", expires_before=time.time() - settings.GREETING_CACHE_TTL_SECONDS,
+            lru_column="last_used_at", max_rows=settings.GREETING_CACHE_MAX_ENTRIES
+        )
+    except sqlite3.Error as e:
+        logger.error(f"[greeting_cache] Eviction failed: {e}")
+        return 0
+    if evicted:
+        _bump("evictions", evicted)
+    return evicted
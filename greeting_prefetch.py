@@ -0,0 +1,98 @@
+import threading
+from config import settings
+from logger_config import get_logger
+from db import connect
+from helperfuncs import (
+    DB_PATH,
+    DIAL_CONTEXT_COLUMNS,
+    INITIAL_MESSAGE_ERROR,
+    format_call_details,
+    generate_initial_message,
+    recent_calls_sql,
+    set_first_message
+)
+
+logger = get_logger(__name__)
+
+
+def fetch_rows_needing_greeting(depth: int):
+    """
+    Returns the dial context (DIAL_CONTEXT_COLUMNS) of the rows among the next `depth` queued calls that do not
+    have a prefetched first message yet.
+    """
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT q.call_id, q.customer_name, q.customer_id, q.phone_number, q.email, q.customer_requirements,
+                   q.notes, q.tasks, q.first_message, d.company_name, d.country_code, d.industry, d.location,
+                   {recent_calls_sql("q.call_id")}
+            FROM (
+                SELECT call_id, customer_name, customer_id, phone_number, email, customer_requirements, notes, tasks,
+                       first_message
+                FROM call_queue
+                WHERE status = 'queued'
+                ORDER BY created_at ASC, call_id ASC
+                LIMIT ?
+            ) q
+            LEFT JOIN customer_data d ON d.call_id = q.call_id
+            WHERE q.first_message IS NULL
+        """, (depth,))
+        return [dict(zip(DIAL_CONTEXT_COLUMNS, row)) for row in c.fetchall()]
+    finally:
+        conn.close()
+
+
+class GreetingPrefetcher:
+    """
+    Background stage that generates the first message for the next GREETING_PREFETCH_DEPTH queued calls,
+    so dialing only reads the stored greeting instead of waiting on the LLM.
+    """
+
+    def __init__(self, depth: int, name: str = "GreetingPrefetcher"):
+        self._depth = max(1, depth)
+        self._name = name
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+        self._thread.start()
+        logger.info(f"[{self._name}] Prefetching greetings for the next {self._depth} queued call(s).\n\n")
+
+    def wake(self):
+        """Called when rows are enqueued or claimed, i.e. whenever the prefetch window moves."""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                rows = fetch_rows_needing_greeting(self._depth)
+            except Exception as e:
+                logger.error(f"[{self._name}] Error reading queue: {e}\n\n", exc_info=True)
+                rows = []
+
+            if not rows:
+                self._wakeup.wait(timeout=settings.GREETING_PREFETCH_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+
+            for context in rows:
+                call_id = context["call_id"]
+                try:
+                    details, _ = format_call_details(context)
+                    first_message = generate_initial_message(details)
+                    if first_message == INITIAL_MESSAGE_ERROR:
+                        logger.warning(f"[{self._name}] Greeting generation failed for call_id {call_id}. Will retry later.\n\n")
+                        self._wakeup.wait(timeout=settings.GREETING_PREFETCH_POLL_SECONDS)
+                        self._wakeup.clear()
+                        break
+                    if set_first_message(call_id, first_message):
+                        logger.info(f"[{self._name}] Prefetched first message for call_id {call_id}.\n\n")
+                except Exception as e:
+                    logger.error(f"[{self._name}] Error prefetching greeting for call_id {call_id}: {e}\n\n", exc_info=True)
+                    self._wakeup.wait(timeout=settings.GREETING_PREFETCH_POLL_SECONDS)
+                    self._wakeup.clear()
+                    break
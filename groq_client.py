@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+from typing import Optional
+import groq
+from groq import Groq
+from config import settings
+from logger_config import get_logger
+from metrics import GROQ_RATE_LIMIT_WAIT_SECONDS, GROQ_REQUEST_SECONDS, GROQ_TOKENS
+from tracing import bind_trace, traced
+
+logger = get_logger(__name__)
+
+# Priority lanes: lower value is served first
+PRIORITY_GREETING = 0
+PRIORITY_SUMMARY = 1
+
+
+class GroqRateLimitTimeout(Exception):
+    """Raised when a request could not get rate-limit capacity within its timeout."""
+
+
+class TokenBucket:
+    """Continuous-refill bucket. Balance may go negative when actual usage exceeds the estimate."""
+
+    def __init__(self, capacity: float, per_minute: float):
+        self.capacity = float(capacity)
+        self.rate = per_minute / 60.0
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if available now). Caller must refill first."""
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class GroqRateLimiter:
+    """
+    Process-wide requests/min and tokens/min limiter shared by every Groq caller.
+    Waiters in a higher-priority lane (dial-time greetings) are always served before lower lanes
+    (post-call summaries), and a 429 Retry-After pauses every lane.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self._requests = TokenBucket(requests_per_minute, requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute)
+        self._cond = threading.Condition()
+        self._waiting = {}
+        self._paused_until = 0.0
+
+    def acquire(self, tokens: int, priority: int, timeout: Optional[float] = None):
+        tokens = min(tokens, self._tokens.capacity)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if any(lane < priority and count for lane, count in self._waiting.items()):
+                        wait = None  # a higher lane is waiting; it notifies when it proceeds
+                    else:
+                        self._requests.refill(now)
+                        self._tokens.refill(now)
+                        wait = max(self._paused_until - now, self._requests.wait_time(1), self._tokens.wait_time(tokens))
+                        if wait <= 0:
+                            self._requests.tokens -= 1
+                            self._tokens.tokens -= tokens
+                            return
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise GroqRateLimitTimeout(f"No Groq capacity within {timeout}s")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Charges the difference between the estimate taken in acquire() and the reported usage."""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self._tokens.tokens -= actual_tokens - min(estimated_tokens, self._tokens.capacity)
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+_client = None
+_client_lock = threading.Lock()
+limiter = GroqRateLimiter(settings.GROQ_REQUESTS_PER_MINUTE, settings.GROQ_TOKENS_PER_MINUTE)
+
+
+def get_groq_client() -> Groq:
+    """Returns the single Groq client shared by all callers. Retries are handled here, not by the SDK."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Groq(api_key=settings.GROQ_API_KEY, max_retries=0, timeout=settings.GROQ_REQUEST_TIMEOUT_SECONDS)
+        return _client
+
+
+def estimate_tokens(messages, max_output_tokens: int) -> int:
+    """Rough token estimate (~4 characters per token) for the prompt plus the expected completion."""
+    return sum(len(m.get("content") or "") for m in messages) // 4 + max_output_tokens
+
+
+def _retry_after_seconds(error) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _is_retryable(error) -> bool:
+    if isinstance(error, (groq.RateLimitError, groq.APIConnectionError, groq.APITimeoutError, GroqRateLimitTimeout)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code >= 500
+
+
+def _record_token_usage(caller: str, usage):
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if tokens:
+            GROQ_TOKENS.inc(tokens, caller=caller, kind=kind)
+
+
+@traced("groq.chat_completion")
+def chat_completion(
+    messages,
+    model: str,
+    priority: int = PRIORITY_SUMMARY,
+    max_retries: Optional[int] = None,
+    max_output_tokens: int = 512,
+    acquire_timeout: Optional[float] = None,
+    request_timeout: Optional[float] = None,
+    caller: str = "groq"
+):
+    """
+    Rate-limited chat completion through the shared client.
+    Retries 429/5xx/connection errors with jittered exponential backoff, honoring Retry-After on 429.
+    max_retries is the total number of attempts (defaults to settings.GROQ_MAX_RETRIES). acquire_timeout bounds
+    the wait for rate-limit capacity (GroqRateLimitTimeout) and request_timeout overrides the client's
+    GROQ_REQUEST_TIMEOUT_SECONDS for this call.
+    """
+    attempts = max_retries if max_retries is not None else settings.GROQ_MAX_RETRIES
+    estimated = estimate_tokens(messages, max_output_tokens)
+    # A child span of the calling stage (greeting, summary) when one is active
+    bind_trace(None, caller=caller, model=model)
+    client = get_groq_client()
+    if request_timeout is not None:
+        client = client.with_options(timeout=request_timeout)
+
+    for attempt in range(attempts):
+        try:
+            queued_at = time.perf_counter()
+            limiter.acquire(estimated, priority, timeout=acquire_timeout)
+            started = time.perf_counter()
+            GROQ_RATE_LIMIT_WAIT_SECONDS.observe(started - queued_at, caller=caller)
+            try:
+                response = client.chat.completions.create(messages=messages, model=model)
+            except Exception:
+                GROQ_REQUEST_SECONDS.observe(time.perf_counter() - started, caller=caller, outcome="error")
+                raise
+            GROQ_REQUEST_SECONDS.observe(time.perf_counter() - started, caller=caller, outcome="ok")
+            usage = getattr(response, "usage", None)
+            limiter.record_usage(estimated, getattr(usage, "total_tokens", None))
+            _record_token_usage(caller, usage)
+            return response
+        except Exception as e:
+            if not _is_retryable(e) or attempt + 1 >= attempts:
+                raise
+            backoff = min(settings.GROQ_BACKOFF_MAX_SECONDS, settings.GROQ_BACKOFF_BASE_SECONDS * (2 ** attempt))
+            delay = random.uniform(backoff / 2, backoff)
+            retry_after = _retry_after_seconds(e) if isinstance(e, groq.RateLimitError) else None
+            if retry_after is not None:
+                limiter.pause(retry_after)
+                delay = max(delay, retry_after)
+            logger.warning(f"[{caller}] Groq request failed (attempt {attempt+1}/{attempts}): {e}. Retrying in {delay:.1f}s.")
+            time.sleep(delay)
@@ -1,20 +1,175 @@
+import os
+import socket
 import sqlite3
+import uuid
 from fastapi import HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional
-from logger_config import logger
+from logger_config import get_logger
+from db import DB_PATH, connect, begin_immediate
 from config import settings
-from groq import Groq
+from groq_client import chat_completion, GroqRateLimitTimeout, PRIORITY_GREETING
+from greeting_cache import make_cache_key, get_cached_greeting, store_greeting
 
+logger = get_logger(__name__)
 
+# Identifies this process as the owner of the call_queue leases it holds
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
 
-# Database path
-DB_PATH = "queue.db"
+def _ensure_columns(cursor, table: str, columns: dict):
+    """Adds any missing columns to an existing table (lightweight schema migration)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, decl in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
 
 # --- DB Setup ---
+# Tables whose writes bump data_versions (see get_data_version)
+VERSIONED_TABLES = ("customer_data", "call_queue")
+
+
+def get_data_version(table: str, db_path=None) -> int:
+    """Current write counter for a versioned table; changes whenever any row is inserted, updated or deleted."""
+    conn = connect(db_path or DB_PATH)
+    try:
+        row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+    finally:
+        conn.close()
+
+
+def acquire_background_lease(name: str, seconds: int, worker_id: str = WORKER_ID, db_path=None) -> bool:
+    """
+    Takes or renews the named lease in background_leases, for background tasks only one worker may run (e.g. the
+    Excel export). Returns True while worker_id holds it; another worker can take it once it is seconds stale.
+    """
+    conn = connect(db_path or DB_PATH)
+    try:
+        row = conn.execute("""
+            INSERT INTO background_leases (name, worker_id, lease_expires_at) VALUES (?, ?, datetime('now', ?))
+            ON CONFLICT(name) DO UPDATE SET worker_id = excluded.worker_id, lease_expires_at = excluded.lease_expires_at
+            WHERE background_leases.worker_id = excluded.worker_id OR background_leases.lease_expires_at < datetime('now')
+            RETURNING worker_id
+        """, (name, worker_id, f"+{seconds} seconds")).fetchone()
+        conn.commit()
+        return row is not None
+    finally:
+        conn.close()
+
+
+# Triggers feeding queue_events (see events.py): status and Twilio status changes, removals, call results
+QUEUE_EVENT_TRIGGERS = {
+    "trg_call_queue_event_status": """
+        AFTER UPDATE OF status ON call_queue WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            INSERT INTO queue_events (kind, call_id, status, previous_status, detail)
+            VALUES ('status', NEW.call_id, NEW.status, OLD.status,
+                    json_object('customer_id', NEW.customer_id, 'attempts', NEW.attempts, 'worker_id', NEW.worker_id));
+        END
+    """,
+    "trg_call_queue_event_twilio_status": """
+        AFTER UPDATE OF twilio_status ON call_queue WHEN OLD.twilio_status IS NOT NEW.twilio_status
+        BEGIN
+            INSERT INTO queue_events (kind, call_id, status, previous_status, detail)
+            VALUES ('twilio_status', NEW.call_id, NEW.twilio_status, OLD.twilio_status,
+                    json_object('customer_id', NEW.customer_id, 'call_sid', NEW.call_sid));
+        END
+    """,
+    "trg_call_queue_event_delete": """
+        AFTER DELETE ON call_queue
+        BEGIN
+            INSERT INTO queue_events (kind, call_id, status, previous_status, detail)
+            VALUES ('removed', OLD.call_id, NULL, OLD.status, json_object('customer_id', OLD.customer_id));
+        END
+    """,
+    "trg_customer_data_event_result": """
+        AFTER UPDATE OF last_call_status ON customer_data WHEN OLD.last_call_status IS NOT NEW.last_call_status
+        BEGIN
+            INSERT INTO queue_events (kind, call_id, status, previous_status, detail)
+            VALUES ('call_result', NEW.call_id, NEW.last_call_status, OLD.last_call_status,
+                    json_object('customer_id', NEW.customer_id));
+        END
+    """,
+}
+
+
+def _history_lines(column: str, event_column: str) -> str:
+    """
+    customer_data_with_history expression: the stored column followed by one '[time] value' line per call event,
+    the same text the old read-modify-write append produced.
+    """
+    return f"""COALESCE(d.{column}, '') || COALESCE((
+            SELECT group_concat(line, '') FROM (
+                SELECT char(10) || '[' || e.created_at || '] ' || COALESCE(e.{event_column}, '') AS line
+                FROM call_events e WHERE e.call_id = d.call_id ORDER BY e.event_id
+            )
+        ), '') AS {column}"""
+
+
+# customer_data as exported: notes/tasks rendered from call_events instead of being rewritten on every call
+CUSTOMER_DATA_WITH_HISTORY_VIEW = f"""
+    CREATE VIEW customer_data_with_history AS
+    SELECT d.call_id, d.customer_id, d.customer_name, d.phone_number, d.email, d.customer_requirements,
+           d.last_call_status, d.country_code, d.industry, d.company_name, d.location, d.to_call,
+           {_history_lines("notes", "summary")},
+           {_history_lines("tasks", "tasks")},
+           d.updated_at
+    FROM customer_data d
+"""
+
+HOT_PATH_INDEXES = {
+    "idx_call_queue_status_created": "call_queue (status, created_at, call_id)",
+    "idx_call_queue_customer_status": "call_queue (customer_id, status)",
+    "idx_call_queue_call_sid": "call_queue (call_sid)",
+    "idx_call_queue_status_lease": "call_queue (status, lease_expires_at)",
+    "idx_post_call_jobs_status_next_run": "post_call_jobs (status, next_run_at)",
+}
+
+# (name, query, params, sort_allowed): the hot-path statements the code executes, registered next to their
+# definitions by the modules that run them. None may scan its table, and unless sort_allowed it must come out of
+# the index already ordered
+QUERY_PLAN_CHECKS = []
+
+
+def register_query_plan_check(name: str, query: str, params=(), sort_allowed: bool = False):
+    """Adds a statement to the EXPLAIN QUERY PLAN check run by init_db (params only need the right count)."""
+    QUERY_PLAN_CHECKS.append((name, query, tuple(params), sort_allowed))
+
+
+def explain_query_plan(cursor, query: str, params=()) -> list:
+    """Returns the EXPLAIN QUERY PLAN detail lines for a query."""
+    cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def is_table_scan(detail: str) -> bool:
+    """A plan line reading a whole table; scans of a subquery's own (bounded) result, e.g. 'SCAN (subquery-7)', are not."""
+    return detail.startswith("SCAN ") and not detail.startswith("SCAN (") and " INDEX " not in f"{detail} "
+
+
+def check_query_plans(cursor) -> list:
+    """
+    Runs EXPLAIN QUERY PLAN over QUERY_PLAN_CHECKS at startup and logs any hot-path query that scans a whole
+    table (or sorts when it should read in index order). Returns the list of problems found.
+    """
+    problems = []
+    for name, query, params, sort_allowed in QUERY_PLAN_CHECKS:
+        plan = explain_query_plan(cursor, query, params)
+        for detail in plan:
+            if is_table_scan(detail) or (not sort_allowed and "USE TEMP B-TREE" in detail):
+                problems.append(f"{name}: {detail}")
+    if problems:
+        for problem in problems:
+            logger.warning(f"[check_query_plans] Hot-path query is not index-backed: {problem}")
+    else:
+        logger.info(f"[check_query_plans] All {len(QUERY_PLAN_CHECKS)} hot-path queries use indexes.")
+    return problems
+
+
 def init_db(logger):
     logger.info("[init_db] Initializing the call_queue and customer_data databases and ensuring schema.")
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     c = conn.cursor()
     # Call queue for process management
     c.execute('''
@@ -33,6 +188,109 @@ def init_db(logger):
             called_at TIMESTAMP
         )
     ''')
+    # Lease columns used to claim rows safely across workers
+    _ensure_columns(c, "call_queue", {
+        "worker_id": "TEXT",
+        "lease_expires_at": "TIMESTAMP",
+        "attempts": "INTEGER DEFAULT 0",
+        "call_sid": "TEXT",
+        "twilio_status": "TEXT",
+        # Greeting generated ahead of dialing by the prefetch stage
+        "first_message": "TEXT",
+        # Trace id of the current attempt, assigned when the row is claimed (see tracing.py)
+        "correlation_id": "TEXT",
+    })
+    # Durable post-call work (summary, notes/tasks, meeting invite) processed by the worker pool
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS post_call_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            call_id INTEGER,
+            customer_name TEXT,
+            customer_email TEXT,
+            transcript TEXT,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            worker_id TEXT,
+            locked_until TIMESTAMP,
+            next_run_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    ''')
+    _ensure_columns(c, "post_call_jobs", {
+        "correlation_id": "TEXT",
+        # Progress saved as each step finishes, so a retry reuses the summary and skips invites already sent
+        "summary": "TEXT",
+        "invites_sent": "TEXT",
+    })
+    # Uploaded files, stored under settings.UPLOAD_DIR by content hash
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS uploads (
+            upload_id TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            filename TEXT,
+            path TEXT NOT NULL,
+            size_bytes INTEGER,
+            uploaded_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_uploads_sha256 ON uploads (sha256)")
+    # Background ingestion jobs started by /add-call, polled via /ingest-jobs/{job_id}
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            job_id TEXT PRIMARY KEY,
+            upload_path TEXT,
+            created_by TEXT,
+            status TEXT DEFAULT 'queued',
+            batches INTEGER DEFAULT 0,
+            rows_parsed INTEGER DEFAULT 0,
+            rows_inserted INTEGER DEFAULT 0,
+            rows_skipped INTEGER DEFAULT 0,
+            rows_per_second REAL DEFAULT 0,
+            cancel_requested INTEGER DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    _ensure_columns(c, "ingest_jobs", {
+        "upload_id": "TEXT",
+        "mode": "TEXT",
+        "rows_updated": "INTEGER DEFAULT 0",
+        "rows_unchanged": "INTEGER DEFAULT 0",
+        # Owning process and its liveness; jobs whose owner stopped heart-beating are failed (see ingest_jobs.py)
+        "worker_id": "TEXT",
+        "heartbeat_at": "TIMESTAMP",
+    })
+    # Content-addressed cache of generated greetings (TTL + size-bounded LRU)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS greeting_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            message TEXT,
+            created_at REAL,
+            last_used_at REAL,
+            hits INTEGER DEFAULT 0
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_greeting_cache_last_used ON greeting_cache (last_used_at)")
+    # Per-call state from dialing and the call-ended webhook (TTL + size-bounded, see call_state.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS call_state (
+            call_sid TEXT PRIMARY KEY,
+            call_id INTEGER,
+            email TEXT,
+            transcript TEXT,
+            created_at REAL,
+            updated_at REAL
+        )
+    ''')
+    _ensure_columns(c, "call_state", {"correlation_id": "TEXT"})
+    c.execute("CREATE INDEX IF NOT EXISTS idx_call_state_call_id ON call_state (call_id, updated_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_call_state_updated_at ON call_state (updated_at)")
     # Persistent customer data for notes/tasks/results
     c.execute('''
             CREATE TABLE IF NOT EXISTS customer_data (
@@ -52,7 +310,110 @@ def init_db(logger):
                 tasks TEXT
             )
         ''')
+    # Sheet identity for delta ingest: row_key is customer_id (phone_number when blank), row_hash covers the uploaded values
+    _ensure_columns(c, "customer_data", {"row_key": "TEXT", "row_hash": "TEXT"})
+    c.execute("UPDATE customer_data SET row_key = COALESCE(NULLIF(customer_id, ''), phone_number) WHERE row_key IS NULL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customer_data_row_key ON customer_data (row_key)")
+    # Last write time for date-range exports, stamped by triggers unless the writer sets it explicitly
+    _ensure_columns(c, "customer_data", {"updated_at": "TIMESTAMP"})
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_customer_data_updated_at_insert
+        AFTER INSERT ON customer_data WHEN NEW.updated_at IS NULL
+        BEGIN
+            UPDATE customer_data SET updated_at = CURRENT_TIMESTAMP WHERE call_id = NEW.call_id;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_customer_data_updated_at_update
+        AFTER UPDATE ON customer_data WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE customer_data SET updated_at = CURRENT_TIMESTAMP WHERE call_id = NEW.call_id;
+        END
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customer_data_updated_at ON customer_data (updated_at)")
+    # Per-status counts for /customer-data-status
+    c.execute("CREATE INDEX IF NOT EXISTS idx_customer_data_last_call_status ON customer_data (last_call_status, updated_at)")
+    # Append-only call history, one row per call outcome. customer_data.notes/tasks keep the sheet values (and any
+    # history appended before this table existed); customer_data_with_history renders the full notes/tasks.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS call_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            call_id INTEGER NOT NULL,
+            created_at TIMESTAMP,
+            status TEXT,
+            summary TEXT,
+            tasks TEXT,
+            transcript BLOB,
+            post_call_job_id INTEGER
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_call_events_call_id ON call_events (call_id, event_id)")
+    # A retried post-call job must not append its outcome twice
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_call_events_post_call_job ON call_events (post_call_job_id)")
+    # A new event counts as a customer_data change (updated_at filters, data_versions for the Excel export)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_call_events_touch_customer_data
+        AFTER INSERT ON call_events
+        BEGIN
+            UPDATE customer_data SET updated_at = CURRENT_TIMESTAMP WHERE call_id = NEW.call_id;
+        END
+    """)
+    c.execute("DROP VIEW IF EXISTS customer_data_with_history")
+    c.execute(CUSTOMER_DATA_WITH_HISTORY_VIEW)
+    # Per-table write counters, bumped by triggers; derived artifacts (e.g. the Excel export) compare against them
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        c.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 0)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            """)
+    # Leases for background tasks that run in one worker only (see acquire_background_lease)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS background_leases (
+            name TEXT PRIMARY KEY,
+            worker_id TEXT,
+            lease_expires_at TIMESTAMP
+        )
+    ''')
+    # customer_data version each Excel export on disk was written at, shared by all workers and kept across restarts
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS excel_exports (
+            path TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Change feed for /events: queue transitions are recorded by triggers, so every writer (dispatcher, webhooks,
+    # reconciler, reaper, manual edits) emits them; bulk inserts from ingest are reported per batch instead
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS queue_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            call_id INTEGER,
+            status TEXT,
+            previous_status TEXT,
+            detail TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for name, trigger in QUEUE_EVENT_TRIGGERS.items():
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {trigger}")
+    # Indexes for the dial hot path (claim, webhook lookups, lease reaper, post-call claim)
+    for name, target in HOT_PATH_INDEXES.items():
+        c.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    c.execute("ANALYZE")
     conn.commit()
+    check_query_plans(c)
     conn.close()
 
 # --- Models ---
@@ -90,7 +451,7 @@ class QueueUpdateRequest(BaseModel):
 def add_to_queue(entity_type: str, entity_id: str) -> bool:
     logger.info(f"[add_to_queue] Attempting to add {entity_type}:{entity_id} to the queue.")
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         c = conn.cursor()
         c.execute("INSERT INTO call_queue (entity_type, entity_id) VALUES (?, ?)",
                   (entity_type, entity_id))
@@ -106,53 +467,180 @@ def add_to_queue(entity_type: str, entity_id: str) -> bool:
     finally:
         conn.close()
 
-def pop_next_call():
-    logger.info("[pop_next_call] Attempting to fetch and mark the next queued call as processing.")
-    conn = sqlite3.connect(DB_PATH, isolation_level='EXCLUSIVE')  # lock DB during transaction
+# Everything needed to dial a claimed call: the call_queue row plus its customer_data company/country/industry/location
+DIAL_CONTEXT_COLUMNS = (
+    "call_id", "customer_name", "customer_id", "phone_number", "email", "customer_requirements", "notes", "tasks",
+    "first_message", "company_name", "country_code", "industry", "location", "recent_calls"
+)
+
+
+def recent_calls_sql(call_id_column: str) -> str:
+    """Scalar subquery: the last CALL_HISTORY_PROMPT_EVENTS call outcomes for call_id_column, newest first, one per line."""
+    return f"""(SELECT group_concat(line, char(10)) FROM (
+                SELECT '[' || e.created_at || '] ' || COALESCE(e.status, '') || ': ' || COALESCE(e.summary, '') AS line
+                FROM call_events e WHERE e.call_id = {call_id_column}
+                ORDER BY e.event_id DESC LIMIT {int(settings.CALL_HISTORY_PROMPT_EVENTS)}
+            ))"""
+
+# Claims the oldest queued row while fewer than the given number of calls are processing, and returns its dial
+# context. Params: worker_id, lease modifier, correlation_id, max processing
+CLAIM_NEXT_CALL_SQL = f"""
+    UPDATE call_queue
+    SET status = 'processing',
+        called_at = CURRENT_TIMESTAMP,
+        worker_id = ?,
+        lease_expires_at = datetime('now', ?),
+        attempts = COALESCE(attempts, 0) + 1,
+        correlation_id = ?,
+        call_sid = NULL,
+        twilio_status = NULL
+    WHERE call_id = (
+        SELECT call_id FROM call_queue
+        WHERE status = 'queued'
+        ORDER BY created_at ASC, call_id ASC
+        LIMIT 1
+    )
+    AND (SELECT COUNT(*) FROM call_queue WHERE status = 'processing') < ?
+    RETURNING call_id, customer_name, customer_id, phone_number, email, customer_requirements, notes, tasks, first_message,
+        (SELECT company_name FROM customer_data d WHERE d.call_id = call_queue.call_id),
+        (SELECT country_code FROM customer_data d WHERE d.call_id = call_queue.call_id),
+        (SELECT industry FROM customer_data d WHERE d.call_id = call_queue.call_id),
+        (SELECT location FROM customer_data d WHERE d.call_id = call_queue.call_id),
+        {recent_calls_sql("call_queue.call_id")}
+"""
+register_query_plan_check("claim next queued call", CLAIM_NEXT_CALL_SQL, ("", "", "", 0))
+
+def pop_next_call(max_processing: Optional[int] = None, worker_id: str = WORKER_ID):
+    """
+    Claims the oldest queued call for worker_id with a single UPDATE ... RETURNING and leases it for
+    settings.CALL_LEASE_SECONDS. When max_processing is given, the claim only succeeds while fewer than
+    that many calls are in processing, so each concurrent call slot claims its own row atomically.
+    Returns the full dial context (DIAL_CONTEXT_COLUMNS, including the customer_data fields and recent call
+    outcomes) as a dict, or None. The claim also assigns the attempt a new correlation_id (its trace id) and
+    clears any call_sid/twilio_status left from an earlier attempt, so this attempt's Twilio callbacks are not
+    taken for duplicates. first_message is kept: it is this attempt's prefetched greeting.
+    """
+    correlation_id = str(uuid.uuid4())
+    logger.debug("[pop_next_call] Attempting to fetch and mark the next queued call as processing.")
+    conn = connect(DB_PATH, isolation_level=None)
     try:
         c = conn.cursor()
-
-        # Start transaction
-        c.execute("BEGIN EXCLUSIVE")
-        c.execute("""
-            SELECT call_id, customer_name, customer_id, phone_number, email, customer_requirements, notes, tasks
-            FROM call_queue
-            WHERE status = 'queued'
-            ORDER BY created_at ASC
-            LIMIT 1
-        """)
-        row = c.fetchone()
-
-        if row:
-            call_id, customer_name, customer_id, phone_number, email, customer_requirements, notes, tasks = row
-
-            # Mark as processing
-            c.execute("""
-                UPDATE call_queue
-                SET status = 'processing', called_at = CURRENT_TIMESTAMP
-                WHERE call_id = ?
-            """, (call_id,))
-            conn.commit()
-            logger.info(f"Marked call_id {call_id} as processing.")
-            return call_id, customer_name, customer_id, phone_number, email, customer_requirements, notes, tasks
-        else:
-            logger.info("No queued calls found.")
-            conn.commit()
-            return None
+        # Take the write lock up front so the candidate row cannot be claimed by another worker in between
+        begin_immediate(c)
+        c.execute(CLAIM_NEXT_CALL_SQL, (
+            worker_id,
+            f"+{settings.CALL_LEASE_SECONDS} seconds",
+            correlation_id,
+            max_processing if max_processing is not None else 2**63 - 1,
+        ))
+        rows = c.fetchall()
+        c.execute("COMMIT")
+
+        if rows:
+            call_id = rows[0][0]
+            logger.info("[pop_next_call] Marked call_id %s as processing (worker %s).", call_id, worker_id)
+            return dict(zip(DIAL_CONTEXT_COLUMNS, rows[0]), correlation_id=correlation_id)
+        logger.debug("[pop_next_call] No queued calls found or all call slots are busy.")
+        return None
 
     except sqlite3.Error as e:
         logger.error(f"Error in pop_next_call: {e}", exc_info=True)
-        conn.rollback()
+        if conn.in_transaction:
+            conn.rollback()
         return None
     finally:
         conn.close()
 
+# Params: lease modifier, worker_id, max call duration modifier
+RENEW_CALL_LEASES_SQL = """
+    UPDATE call_queue
+    SET lease_expires_at = datetime('now', ?)
+    WHERE status = 'processing' AND worker_id = ? AND called_at > datetime('now', ?)
+"""
+register_query_plan_check("call lease renewal", RENEW_CALL_LEASES_SQL, ("", "", ""))
+
+def renew_call_leases(worker_id: str = WORKER_ID) -> int:
+    """
+    Heartbeat: extends the lease on every call this worker is processing.
+    Calls older than settings.CALL_MAX_DURATION_SECONDS are no longer renewed so they can be reclaimed.
+    """
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(RENEW_CALL_LEASES_SQL, (
+            f"+{settings.CALL_LEASE_SECONDS} seconds",
+            worker_id,
+            f"-{settings.CALL_MAX_DURATION_SECONDS} seconds",
+        ))
+        conn.commit()
+        return c.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Error renewing call leases for {worker_id}: {e}")
+        return 0
+    finally:
+        conn.close()
+
+# Params: max attempts, max call duration modifier
+REQUEUE_EXPIRED_LEASES_SQL = """
+    UPDATE call_queue
+    SET status = 'queued', worker_id = NULL, lease_expires_at = NULL,
+        call_sid = NULL, twilio_status = NULL, first_message = NULL
+    WHERE status = 'processing'
+      AND (lease_expires_at IS NULL OR lease_expires_at < datetime('now'))
+      AND call_sid IS NULL
+      AND COALESCE(attempts, 0) < ?
+      AND called_at > datetime('now', ?)
+    RETURNING call_id
+"""
+register_query_plan_check("lease reaper requeue", REQUEUE_EXPIRED_LEASES_SQL, (0, ""))
+
+# Params: max call duration modifier
+DELETE_EXPIRED_LEASES_SQL = """
+    DELETE FROM call_queue
+    WHERE status = 'processing'
+      AND (lease_expires_at IS NULL OR lease_expires_at < datetime('now'))
+      AND (call_sid IS NULL OR called_at <= datetime('now', ?))
+    RETURNING call_id, customer_id, customer_name
+"""
+register_query_plan_check("lease reaper delete", DELETE_EXPIRED_LEASES_SQL, ("",))
+
+def reclaim_expired_leases():
+    """
+    Reclaims processing calls whose lease has expired (crashed worker or missing webhook).
+    Only calls that were never dialed (no call_sid) are put back to 'queued', and only while they have attempts
+    left and are within settings.CALL_MAX_DURATION_SECONDS; a dialed call may still be live after its worker
+    restarted, so it stays in processing for the call-ended webhook or the Twilio reconciler to close out.
+    Undialed calls out of attempts and dialed calls past CALL_MAX_DURATION_SECONDS are removed from the queue and
+    returned as (call_id, customer_id, customer_name) rows so the caller can record the outcome.
+    """
+    conn = connect(DB_PATH, isolation_level=None)
+    try:
+        c = conn.cursor()
+        begin_immediate(c)
+        c.execute(REQUEUE_EXPIRED_LEASES_SQL, (settings.CALL_MAX_ATTEMPTS, f"-{settings.CALL_MAX_DURATION_SECONDS} seconds"))
+        requeued = [row[0] for row in c.fetchall()]
+        c.execute(DELETE_EXPIRED_LEASES_SQL, (f"-{settings.CALL_MAX_DURATION_SECONDS} seconds",))
+        expired = c.fetchall()
+        c.execute("COMMIT")
+        if requeued:
+            logger.warning(f"[reclaim_expired_leases] Re-queued call_ids with expired leases: {requeued}")
+        if expired:
+            logger.warning(f"[reclaim_expired_leases] Removed call_ids with expired leases: {[row[0] for row in expired]}")
+        return requeued, expired
+    except sqlite3.Error as e:
+        logger.error(f"Error reclaiming expired call leases: {e}", exc_info=True)
+        if conn.in_transaction:
+            conn.rollback()
+        return [], []
+    finally:
+        conn.close()
+
 
 def update_call_details(call_id: int, phone_number: str, lead_name: str, details: str):
     logger.info(f"[update_call_details] Updating call details for call_id: {call_id}.")
     """Updates the phone number, lead name, and details for a specific call queue entry."""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         c = conn.cursor()
         c.execute("UPDATE call_queue SET phone_number = ?, lead_name = ?, details = ? WHERE call_id = ?",
                   (phone_number, lead_name, details, call_id))
@@ -168,7 +656,7 @@ def mark_call_completed(call_id: int):
     logger.info(f"[mark_call_completed] Marking call_id {call_id} as 'called'.")
     """Marks a call queue entry as 'called'."""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         c = conn.cursor()
         c.execute("UPDATE call_queue SET status = 'called' WHERE id = ?", (call_id,))
         conn.commit()
@@ -183,7 +671,7 @@ def pop_call_by_id(call_id: int):
     logger.info(f"[pop_call_by_id] Removing call_id {call_id} from the queue.")
     """Deletes a call queue entry by its CALL_ID."""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         c = conn.cursor()
         c.execute("DELETE FROM call_queue WHERE call_id = ?", (call_id,))
         conn.commit()
@@ -196,6 +684,87 @@ def pop_call_by_id(call_id: int):
     finally:
         conn.close()
 
+def format_call_details(context: dict):
+    """
+    Builds the customer details passed to the agent (and used for the greeting) from a dial context
+    (see DIAL_CONTEXT_COLUMNS). Returns (details, country_code).
+    """
+    company_name, country_code, industry, location = (
+        context.get(key).strip() if context.get(key) else None
+        for key in ("company_name", "country_code", "industry", "location")
+    )
+
+    details = f"These are the details of the customer you are speaking with. Name: {context['customer_name']}:\n\n"
+    details += f"Customer Requirements: {context['customer_requirements']}\n"
+    details += f"Notes: {(context['notes'] or '').strip()}\n"
+    details += f"Tasks: {context['tasks']}\n"
+    details += f"Company Name: {company_name}\n"
+    details += f"Country Code: {country_code}\n"
+    details += f"Industry: {industry}\n"
+    details += f"Location: {location}\n"
+    if context.get("recent_calls"):
+        # Only the last few outcomes; the full history stays in call_events
+        details += f"Recent Calls:\n{context['recent_calls']}\n"
+    return details, country_code
+
+def set_first_message(call_id: int, first_message: str) -> bool:
+    """Stores a prefetched greeting on a queued row. Returns False if the row was claimed or removed meanwhile."""
+    try:
+        conn = connect(DB_PATH)
+        c = conn.cursor()
+        c.execute("UPDATE call_queue SET first_message = ? WHERE call_id = ? AND status = 'queued'", (first_message, call_id))
+        conn.commit()
+        return c.rowcount > 0
+    except Exception as e:
+        logger.error(f"Error saving first message for call_id {call_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+def set_call_sid(call_id: int, call_sid: str):
+    """Records the Twilio callSid on the claimed queue row so status callbacks can be matched to it."""
+    try:
+        conn = connect(DB_PATH)
+        c = conn.cursor()
+        c.execute("UPDATE call_queue SET call_sid = ? WHERE call_id = ?", (call_sid, call_id))
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving call_sid {call_sid} for call_id {call_id}: {e}")
+    finally:
+        conn.close()
+
+CALL_ID_BY_SID_SQL = "SELECT call_id FROM call_queue WHERE call_sid = ?"
+register_query_plan_check("call_sid lookup", CALL_ID_BY_SID_SQL, ("",))
+
+# call-ended webhook: the processing row for a customer, when the webhook did not carry the call_id
+PROCESSING_CALL_BY_CUSTOMER_SQL = "SELECT call_id FROM call_queue WHERE customer_id = ? AND status = 'processing'"
+register_query_plan_check("call-ended lookup", PROCESSING_CALL_BY_CUSTOMER_SQL, ("",))
+
+def get_call_id_by_sid(call_sid: str) -> Optional[int]:
+    """Looks up the queue row for a Twilio callSid."""
+    try:
+        conn = connect(DB_PATH)
+        c = conn.cursor()
+        c.execute(CALL_ID_BY_SID_SQL, (call_sid,))
+        row = c.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Error looking up call_sid {call_sid}: {e}")
+        return None
+    finally:
+        conn.close()
+
+def queue_depth_by_status(db_path=None) -> dict:
+    """Rows in call_queue per status (queued and processing always present); read from the status index."""
+    conn = connect(db_path or DB_PATH)
+    try:
+        rows = conn.execute("SELECT status, COUNT(*) FROM call_queue GROUP BY status").fetchall()
+    finally:
+        conn.close()
+    depth = {"queued": 0, "processing": 0}
+    depth.update({status if status is not None else "none": count for status, count in rows})
+    return depth
+
 # def fetch_contact_details(contact_id: str):
 #     logger.info(f"[fetch_contact_details] Fetching Salesforce contact details for contact_id: {contact_id}.")
 #     formatter = SalesforceContactFormatter()
@@ -283,12 +852,21 @@ COUNTRY_CODE_MAP = {
     "french southern territories": "TF",
 }
 
-# Assuming these constants are set somewhere in your environment
-DB_PATH = "queue.db"
+INITIAL_MESSAGE_ERROR = "[Error: Unable to generate initial message due to Groq API limit or error.]"
 
-def generate_initial_message(lead_data: str) -> str:
-    import time
-    client = Groq(api_key=settings.GROQ_API_KEY)
+def fallback_initial_message(customer_name: Optional[str]) -> str:
+    """Plain greeting used when no generated first message is available at dial time."""
+    name = f" {customer_name}" if customer_name else ""
+    return f"Hi{name}, this is Technology Mindz's AI assistant. Is this a good time to talk?"
+
+GREETING_MODEL = "llama-3.3-70b-versatile"
+
+def generate_initial_message(lead_data: str, max_retries: int = 3, acquire_timeout: Optional[float] = None, request_timeout: Optional[float] = None) -> str:
+    """
+    Personalized greeting for a lead from the greeting cache or Groq. acquire_timeout/request_timeout bound the
+    wait for rate-limit capacity and for the reply (used when dialing inline); returns INITIAL_MESSAGE_ERROR
+    when no greeting could be generated.
+    """
 
     # Prepare the prompt that instructs the LLM what to do
     system_prompt = (
@@ -305,24 +883,35 @@ def generate_initial_message(lead_data: str) -> str:
     )
     user_prompt = f"Here is the lead data:\n{lead_data[:8000]}\nGenerate Technology Mindz's AI Assistant a first message that Technology Mindz's AI assistant would say when reaching out to understand their requirements and offer help."
 
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                model="llama-3.3-70b-versatile"
-            )
-            # If Groq returns a valid response, break and return
-            if hasattr(chat_completion, 'choices') and chat_completion.choices and hasattr(chat_completion.choices[0], 'message'):
-                return chat_completion.choices[0].message.content
-            else:
-                logger.info(f"Groq API did not return a valid response, attempt {attempt+1}.")
-        except Exception as e:
-            # Check for Groq limit exceeded or non-200 response
-            logger.info(f"Groq API call failed (attempt {attempt+1}): {e}. Retrying in 60 seconds...")
-            time.sleep(60)
-    logger.info("Failed to get a valid response from Groq after 3 attempts.")
-    return "[Error: Unable to generate initial message due to Groq API limit or error.]"
\ No newline at end of file
+    # Identical lead data (re-uploads, retries) reuses the stored greeting instead of calling the LLM again
+    cache_key = make_cache_key(GREETING_MODEL, system_prompt, user_prompt)
+    cached = get_cached_greeting(cache_key, db_path=DB_PATH)
+    if cached is not None:
+        logger.info("[generate_initial_message] Greeting cache hit.")
+        return cached
+
+    # Dial-time lane: served ahead of post-call summaries by the shared Groq rate limiter
+    try:
+        completion = chat_completion(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model=GREETING_MODEL,
+            priority=PRIORITY_GREETING,
+            max_retries=max_retries,
+            max_output_tokens=200,
+            acquire_timeout=acquire_timeout,
+            request_timeout=request_timeout,
+            caller="generate_initial_message"
+        )
+        if completion.choices and completion.choices[0].message.content:
+            message = completion.choices[0].message.content
+            store_greeting(cache_key, GREETING_MODEL, message, db_path=DB_PATH)
+            return message
+        logger.info("Groq API did not return a valid response.")
+    except GroqRateLimitTimeout as e:
+        logger.info(f"No Groq capacity for the greeting: {e}.")
+    except Exception as e:
+        logger.info(f"Groq API call failed after {max_retries} attempt(s): {e}.")
+    return INITIAL_MESSAGE_ERROR
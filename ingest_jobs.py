@@ -0,0 +1,223 @@
+import threading
+import uuid
+from typing import Callable, Optional
+from config import settings
+from logger_config import get_logger
+from db import connect, begin_immediate
+from helperfuncs import DB_PATH, WORKER_ID
+from events import record_event
+from ingestion import ingest_upload_file
+
+logger = get_logger(__name__)
+
+ACTIVE_INGEST_STATUSES = ("queued", "running")
+INGEST_JOB_COLUMNS = (
+    "job_id", "upload_id", "upload_path", "created_by", "mode", "status", "batches", "rows_parsed", "rows_inserted",
+    "rows_updated", "rows_unchanged", "rows_skipped", "rows_per_second", "cancel_requested", "error", "created_at", "started_at", "finished_at"
+)
+
+
+class IngestCancelled(Exception):
+    """Raised from the progress callback to stop an ingest job between batches."""
+
+
+def create_ingest_job(
+    upload_path: str,
+    created_by: Optional[str] = None,
+    upload_id: Optional[str] = None,
+    mode: Optional[str] = None
+) -> Optional[str]:
+    """
+    Records a queued ingest job and returns its job_id, or None if another ingest is still queued/running
+    (concurrent ingests would race on the same customer_data keys).
+    """
+    job_id = uuid.uuid4().hex
+    conn = connect(DB_PATH, isolation_level=None)
+    try:
+        c = conn.cursor()
+        begin_immediate(c)
+        c.execute(
+            f"SELECT job_id FROM ingest_jobs WHERE status IN ({', '.join('?' for _ in ACTIVE_INGEST_STATUSES)}) LIMIT 1",
+            ACTIVE_INGEST_STATUSES
+        )
+        if c.fetchone():
+            c.execute("ROLLBACK")
+            return None
+        c.execute(
+            """INSERT INTO ingest_jobs (job_id, upload_id, upload_path, created_by, mode, status, worker_id, heartbeat_at)
+               VALUES (?, ?, ?, ?, ?, 'queued', ?, CURRENT_TIMESTAMP)""",
+            (job_id, upload_id, upload_path, created_by, mode or settings.INGEST_MODE, WORKER_ID)
+        )
+        c.execute("COMMIT")
+        return job_id
+    finally:
+        conn.close()
+
+
+def get_ingest_job(job_id: str) -> Optional[dict]:
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(f"SELECT {', '.join(INGEST_JOB_COLUMNS)} FROM ingest_jobs WHERE job_id = ?", (job_id,))
+        row = c.fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    job = dict(zip(INGEST_JOB_COLUMNS, row))
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def request_ingest_cancel(job_id: str) -> bool:
+    """Flags a queued/running job for cancellation. Returns False if the job is unknown or already finished."""
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(
+            f"UPDATE ingest_jobs SET cancel_requested = 1 WHERE job_id = ? AND status IN ({', '.join('?' for _ in ACTIVE_INGEST_STATUSES)})",
+            (job_id, *ACTIVE_INGEST_STATUSES)
+        )
+        conn.commit()
+        return c.rowcount == 1
+    finally:
+        conn.close()
+
+
+def renew_ingest_heartbeats(worker_id: str = WORKER_ID) -> int:
+    """Heartbeat: marks the queued/running jobs owned by worker_id as still alive."""
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(
+            f"""UPDATE ingest_jobs SET heartbeat_at = CURRENT_TIMESTAMP
+                WHERE worker_id = ? AND status IN ({', '.join('?' for _ in ACTIVE_INGEST_STATUSES)})""",
+            (worker_id, *ACTIVE_INGEST_STATUSES)
+        )
+        conn.commit()
+        return c.rowcount
+    finally:
+        conn.close()
+
+
+def fail_interrupted_ingest_jobs():
+    """
+    Marks queued/running jobs as failed when their owning worker stopped heart-beating for
+    INGEST_JOB_STALE_SECONDS (its threads died with it). Jobs of live workers, including other uvicorn workers
+    sharing the database, are left alone. Runs at startup and with every heartbeat.
+    """
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(
+            f"""UPDATE ingest_jobs SET status = 'failed', error = 'Interrupted: owning worker stopped', finished_at = CURRENT_TIMESTAMP
+                WHERE status IN ({', '.join('?' for _ in ACTIVE_INGEST_STATUSES)})
+                  AND (heartbeat_at IS NULL OR heartbeat_at < datetime('now', ?))""",
+            (*ACTIVE_INGEST_STATUSES, f"-{settings.INGEST_JOB_STALE_SECONDS} seconds")
+        )
+        conn.commit()
+        if c.rowcount:
+            logger.warning(f"[fail_interrupted_ingest_jobs] Marked {c.rowcount} interrupted ingest job(s) as failed.\n\n")
+    finally:
+        conn.close()
+
+
+def _record_progress(job_id: str, progress: dict) -> bool:
+    """Writes the running totals for job_id and returns whether cancellation has been requested."""
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(
+            """UPDATE ingest_jobs
+               SET batches = ?, rows_parsed = ?, rows_inserted = ?, rows_updated = ?, rows_unchanged = ?,
+                   rows_skipped = ?, rows_per_second = ?, heartbeat_at = CURRENT_TIMESTAMP
+               WHERE job_id = ?
+               RETURNING cancel_requested""",
+            (progress["batches"], progress["rows_parsed"], progress["rows_inserted"], progress["rows_updated"],
+             progress["rows_unchanged"], progress["rows_skipped"], progress["rows_per_second"], job_id)
+        )
+        row = c.fetchone()
+        # One event per batch stands in for per-row queue events during bulk ingest
+        record_event(c, "ingest_job", status="running", detail=dict(progress, job_id=job_id))
+        conn.commit()
+        return bool(row and row[0])
+    finally:
+        conn.close()
+
+
+def _finish_job(job_id: str, status: str, error: Optional[str] = None):
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(
+            "UPDATE ingest_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (status, error, job_id)
+        )
+        record_event(c, "ingest_job", status=status, detail={"job_id": job_id, "error": error})
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_ingest_job(
+    job_id: str,
+    upload_path: str,
+    on_batch: Optional[Callable[[], None]] = None,
+    mode: Optional[str] = None
+):
+    """
+    Runs one ingest job to completion. Progress is written after every committed batch, and cancellation is
+    checked at the same point, so a cancelled job keeps the batches it already committed.
+    on_batch is called after each batch (used to wake the dispatcher so dialing starts before the file is done).
+    """
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(
+            """UPDATE ingest_jobs SET status = 'running', started_at = CURRENT_TIMESTAMP, worker_id = ?, heartbeat_at = CURRENT_TIMESTAMP
+               WHERE job_id = ? RETURNING cancel_requested""",
+            (WORKER_ID, job_id)
+        )
+        row = c.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    if row and row[0]:
+        _finish_job(job_id, "cancelled")
+        logger.info(f"[run_ingest_job] Job {job_id} cancelled before it started.\n\n")
+        return
+
+    def on_progress(progress: dict):
+        cancel_requested = _record_progress(job_id, progress)
+        if on_batch and (progress["rows_inserted"] or progress["rows_updated"]):
+            on_batch()
+        if cancel_requested:
+            raise IngestCancelled()
+
+    try:
+        progress = ingest_upload_file(upload_path, db_path=DB_PATH, on_progress=on_progress, mode=mode)
+        _finish_job(job_id, "completed")
+        logger.info(
+            f"[run_ingest_job] Job {job_id} completed: {progress['rows_parsed']} rows parsed, "
+            f"{progress['rows_inserted']} new, {progress['rows_updated']} updated, {progress['rows_unchanged']} unchanged, "
+            f"{progress['rows_skipped']} skipped.\n\n"
+        )
+    except IngestCancelled:
+        _finish_job(job_id, "cancelled")
+        logger.info(f"[run_ingest_job] Job {job_id} cancelled.\n\n")
+    except Exception as e:
+        _finish_job(job_id, "failed", str(e))
+        logger.error(f"[run_ingest_job] Job {job_id} failed: {e}\n\n", exc_info=True)
+
+
+def start_ingest_job(
+    job_id: str,
+    upload_path: str,
+    on_batch: Optional[Callable[[], None]] = None,
+    mode: Optional[str] = None
+) -> threading.Thread:
+    thread = threading.Thread(
+        target=run_ingest_job, args=(job_id, upload_path, on_batch, mode), daemon=True, name=f"IngestJob-{job_id[:8]}"
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,288 @@
+import hashlib
+import os
+import time
+from typing import Callable, Iterator, Optional
+import pandas as pd
+from openpyxl import load_workbook
+from config import settings
+from logger_config import get_logger
+from db import connect, begin_immediate
+from helperfuncs import register_query_plan_check
+
+logger = get_logger(__name__)
+
+# Columns written to call_queue / customer_data, in insert order
+QUEUE_COLUMNS = ["customer_name", "customer_id", "phone_number", "email", "customer_requirements", "to_call", "notes", "tasks"]
+CUSTOMER_COLUMNS = QUEUE_COLUMNS + ["country_code", "industry", "company_name", "location"]
+IDENTITY_COLUMNS = ["row_key", "row_hash"]
+# notes/tasks are owned by the app after the first ingest (post-call summaries append to them), so they are
+# neither hashed nor overwritten by delta ingest
+DELTA_COLUMNS = [column for column in CUSTOMER_COLUMNS if column not in ("notes", "tasks")]
+INGEST_MODES = ("delta", "replace")
+
+
+def _text_column(df: pd.DataFrame, column: str, integral_numbers: bool = False) -> pd.Series:
+    """
+    Column-wise text cleanup: missing cells become '', everything else is str()-ed and stripped.
+    With integral_numbers, numeric cells (Excel stores phone numbers and country codes as floats) are written
+    as integers, e.g. 5551234567.0 -> '5551234567'.
+    """
+    if column not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    col = df[column]
+    missing = col.isna()
+    if integral_numbers and pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+        text = col.fillna(0).astype("int64").astype(str)
+    else:
+        text = col.astype(str).str.strip()
+        if integral_numbers and col.dtype == object:
+            numeric = col.map(lambda value: isinstance(value, (int, float)) and not isinstance(value, bool)) & ~missing
+            if numeric.any():
+                text[numeric] = col[numeric].astype("float64").astype("int64").astype(str)
+        if integral_numbers:
+            # Text sources (CSV) carry the same floats as strings, e.g. '5551234567.0'
+            text = text.str.replace(r"^(\d+)\.0+$", r"\1", regex=True)
+    return text.mask(missing, "").astype(object)
+
+
+def normalize_upload_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizes an uploaded sheet in one vectorized pass and keeps the rows with a customer name and phone number,
+    whatever their to_call (delta ingest must see a row switched to "no" to take it out of the queue).
+    Returns a frame with CUSTOMER_COLUMNS; callable_rows() selects the ones to queue.
+    """
+    out = pd.DataFrame(index=df.index)
+    for column in CUSTOMER_COLUMNS:
+        out[column] = _text_column(df, column, integral_numbers=column in ("phone_number", "country_code"))
+
+    keep = (out["customer_name"] != "") & (out["phone_number"] != "")
+    return out.loc[keep, CUSTOMER_COLUMNS].reset_index(drop=True)
+
+
+def callable_rows(rows: pd.DataFrame) -> pd.Series:
+    """Mask of the rows that should be queued for a call (to_call == 'yes')."""
+    return rows["to_call"].str.lower() == "yes"
+
+
+def add_row_identity(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds row_key (customer_id, or phone_number when blank) and row_hash (sha1 of the DELTA_COLUMNS values).
+    Rows repeating a key within the frame keep only the last occurrence, as the sheet's latest value wins.
+    """
+    rows = rows.copy()
+    rows["row_key"] = rows["customer_id"].where(rows["customer_id"] != "", rows["phone_number"])
+    joined = rows[DELTA_COLUMNS[0]].str.cat(rows[DELTA_COLUMNS[1:]], sep="\x1f")
+    rows["row_hash"] = joined.map(lambda value: hashlib.sha1(value.encode("utf-8")).hexdigest())
+    return rows.drop_duplicates(subset="row_key", keep="last").reset_index(drop=True)
+
+
+# Delta ingest: stored identity and hash for a chunk of row keys ({placeholders} is one "?" per key)
+ROW_HASH_LOOKUP_SQL = "SELECT row_key, call_id, row_hash FROM customer_data WHERE row_key IN ({placeholders})"
+register_query_plan_check("delta ingest key lookup", ROW_HASH_LOOKUP_SQL.format(placeholders="?, ?"), ("", ""))
+
+
+def existing_row_hashes(cursor, keys, chunk_size: int = 500) -> dict:
+    """Maps row_key -> (call_id, row_hash) for the keys already in customer_data."""
+    existing = {}
+    keys = list(keys)
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start:start + chunk_size]
+        cursor.execute(
+            ROW_HASH_LOOKUP_SQL.format(placeholders=", ".join("?" for _ in chunk)),
+            chunk
+        )
+        for row_key, call_id, row_hash in cursor.fetchall():
+            existing[row_key] = (call_id, row_hash)
+    return existing
+
+
+def next_call_ids(cursor, count: int) -> range:
+    """
+    Reserves `count` consecutive call_ids above everything call_queue's AUTOINCREMENT has handed out, so
+    call_queue and customer_data rows can be bulk-inserted with matching ids. Must run inside the write transaction.
+    """
+    cursor.execute("""
+        SELECT MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'call_queue'), 0),
+            COALESCE((SELECT MAX(call_id) FROM call_queue), 0),
+            COALESCE((SELECT MAX(call_id) FROM customer_data), 0)
+        )
+    """)
+    base = cursor.fetchone()[0]
+    return range(base + 1, base + 1 + count)
+
+
+def bulk_insert_calls(cursor, rows: pd.DataFrame) -> int:
+    """Inserts normalized rows into call_queue and customer_data with two executemany calls. Returns rows inserted."""
+    if rows.empty:
+        return 0
+    call_ids = next_call_ids(cursor, len(rows))
+    queue_rows = list(zip(call_ids, *(rows[column].tolist() for column in QUEUE_COLUMNS)))
+    customer_columns = CUSTOMER_COLUMNS + IDENTITY_COLUMNS
+    customer_rows = list(zip(call_ids, *(rows[column].tolist() for column in customer_columns)))
+
+    cursor.executemany(
+        f"INSERT INTO call_queue (call_id, {', '.join(QUEUE_COLUMNS)}, status) VALUES (?, {', '.join('?' for _ in QUEUE_COLUMNS)}, 'queued')",
+        queue_rows
+    )
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO customer_data (call_id, {', '.join(customer_columns)}) VALUES (?, {', '.join('?' for _ in customer_columns)})",
+        customer_rows
+    )
+    logger.info(f"[bulk_insert_calls] Inserted {len(rows)} rows (call_ids {call_ids.start}-{call_ids.stop - 1}).")
+    return len(rows)
+
+
+def apply_delta(cursor, rows: pd.DataFrame) -> tuple:
+    """
+    Upserts identity-tagged rows against customer_data by row_key: new keys are inserted and queued when to_call
+    is "yes" (other new rows are skipped), keys whose row_hash changed get their sheet columns updated
+    (notes/tasks and last_call_status are kept) and are queued again, or taken out of the queue if to_call is no
+    longer "yes"; unchanged keys are left alone. Returns (inserted, updated, unchanged).
+    """
+    if rows.empty:
+        return 0, 0, 0
+    existing = existing_row_hashes(cursor, rows["row_key"])
+    known = rows["row_key"].map(lambda key: key in existing)
+    previous_hash = rows["row_key"].map(lambda key: existing.get(key, (None, None))[1])
+    changed = rows[known & (rows["row_hash"] != previous_hash)]
+    unchanged = int((known & (rows["row_hash"] == previous_hash)).sum())
+
+    inserted = bulk_insert_calls(cursor, rows[~known & callable_rows(rows)])
+    if not changed.empty:
+        call_ids = [existing[key][0] for key in changed["row_key"]]
+        update_columns = DELTA_COLUMNS + IDENTITY_COLUMNS
+        # UPDATE OR REPLACE mirrors the INSERT OR REPLACE used for new rows when a phone_number moves between keys
+        cursor.executemany(
+            f"UPDATE OR REPLACE customer_data SET {', '.join(f'{column} = ?' for column in update_columns)} WHERE call_id = ?",
+            list(zip(*(changed[column].tolist() for column in update_columns), call_ids))
+        )
+        to_call = callable_rows(changed).tolist()
+        dequeue_ids = [call_id for call_id, wanted in zip(call_ids, to_call) if not wanted]
+        call_ids = [call_id for call_id, wanted in zip(call_ids, to_call) if wanted]
+        # Rows switched away from to_call "yes" leave the queue unless they are being dialed right now
+        cursor.executemany("DELETE FROM call_queue WHERE call_id = ? AND status = 'queued'", [(call_id,) for call_id in dequeue_ids])
+        if dequeue_ids:
+            logger.info(f"[apply_delta] Removed {len(dequeue_ids)} rows no longer marked to_call from the queue.")
+        # Queued rows pick up the new values (and a fresh greeting); rows no longer in the queue are queued again.
+        # Rows being dialed right now are left alone.
+        queue_columns = ", ".join(QUEUE_COLUMNS)
+        cursor.executemany(
+            f"""UPDATE call_queue
+                SET ({queue_columns}) = (SELECT {queue_columns} FROM customer_data WHERE customer_data.call_id = call_queue.call_id),
+                    first_message = NULL
+                WHERE call_id = ? AND status = 'queued'""",
+            [(call_id,) for call_id in call_ids]
+        )
+        cursor.executemany(
+            f"""INSERT OR IGNORE INTO call_queue (call_id, {queue_columns}, status)
+                SELECT call_id, {queue_columns}, 'queued' FROM customer_data WHERE call_id = ?""",
+            [(call_id,) for call_id in call_ids]
+        )
+        logger.info(f"[apply_delta] Updated {len(changed)} changed rows; {len(call_ids)} re-queued.")
+    return inserted, len(changed), unchanged
+
+
+def iter_upload_batches(path: str, batch_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Yields the uploaded sheet as DataFrames of at most batch_size rows without loading the whole file.
+    .xlsx is read with openpyxl's read-only row iterator, .csv with pandas' chunked reader.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        # Read as text so phone numbers keep leading zeros
+        yield from pd.read_csv(path, chunksize=batch_size, dtype=str)
+        return
+    if extension not in (".xlsx", ".xlsm"):
+        # Legacy formats have no streaming reader; fall back to a full read sliced into batches
+        df = pd.read_excel(path)
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size]
+        return
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row[:len(columns)])
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def ingest_upload_file(
+    path: str,
+    db_path: str = "queue.db",
+    batch_size: Optional[int] = None,
+    on_progress: Optional[Callable[[dict], None]] = None,
+    mode: Optional[str] = None
+) -> dict:
+    """
+    Streams an uploaded sheet into call_queue/customer_data in fixed-size batches, committing after each batch so
+    memory stays bounded regardless of file size.
+    mode "delta" (default, settings.INGEST_MODE) upserts by customer_id/phone via apply_delta; "replace" clears
+    customer_data in the first batch's transaction and queues every row.
+    on_progress receives the running totals after every batch.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    mode = mode or settings.INGEST_MODE
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode {mode!r}; expected one of {INGEST_MODES}")
+    progress = {
+        "batches": 0, "rows_parsed": 0, "rows_inserted": 0, "rows_updated": 0, "rows_unchanged": 0,
+        "rows_skipped": 0, "rows_per_second": 0.0
+    }
+    started = time.perf_counter()
+
+    conn = connect(db_path, isolation_level=None)
+    try:
+        c = conn.cursor()
+        cleared = False
+        for frame in iter_upload_batches(path, batch_size):
+            rows = add_row_identity(normalize_upload_frame(frame))
+            begin_immediate(c)
+            try:
+                if mode == "replace":
+                    if not cleared:
+                        # Clear customer_data table before adding new batch
+                        c.execute("DELETE FROM customer_data")
+                        logger.info("[ingest_upload_file] Deleted previous customer data.")
+                        cleared = True
+                    inserted, updated, unchanged = bulk_insert_calls(c, rows[callable_rows(rows)]), 0, 0
+                else:
+                    inserted, updated, unchanged = apply_delta(c, rows)
+                c.execute("COMMIT")
+            except Exception:
+                conn.rollback()
+                raise
+
+            progress["batches"] += 1
+            progress["rows_parsed"] += len(frame)
+            progress["rows_inserted"] += inserted
+            progress["rows_updated"] += updated
+            progress["rows_unchanged"] += unchanged
+            # Rows without a name/phone, repeated keys and new rows not marked to_call
+            progress["rows_skipped"] += len(frame) - inserted - updated - unchanged
+            elapsed = time.perf_counter() - started
+            progress["rows_per_second"] = progress["rows_parsed"] / elapsed if elapsed > 0 else 0.0
+            logger.info(
+                f"[ingest_upload_file] Batch {progress['batches']} ({mode}): {progress['rows_parsed']} rows parsed, "
+                f"{progress['rows_inserted']} new, {progress['rows_updated']} updated, {progress['rows_unchanged']} unchanged, "
+                f"{progress['rows_skipped']} skipped ({progress['rows_per_second']:.0f} rows/s)."
+            )
+            if on_progress:
+                on_progress(dict(progress))
+    finally:
+        conn.close()
+    return progress
@@ -1,15 +1,100 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import threading
+from datetime import datetime, timezone
+from config import settings
 
-# Logging setup
-LOG_FILE = "app.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()  # optional: still outputs to console
-    ]
-)
+# Logging setup: callers only enqueue records; a single listener thread formats them and does the file/console I/O
+LOG_FILE = settings.LOG_FILE
+
+_stats = {"dropped": 0}
+_stats_lock = threading.Lock()
+
+
+def logging_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats, queued=_log_queue.qsize(), capacity=settings.LOG_QUEUE_SIZE)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener without formatting them (QueueHandler.prepare would render the message and
+    traceback in the calling thread). A full queue drops the record and counts it instead of blocking the caller.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _stats_lock:
+                _stats["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; any extra= fields given to the log call are included."""
+
+    _RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage().strip(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in self._RESERVED})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _file_handler() -> logging.Handler:
+    if settings.LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when=settings.LOG_ROTATE_WHEN, backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    return logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+
+
+def _parse_levels(spec: str) -> dict:
+    """'httpx=WARNING, ingestion=DEBUG' -> {'httpx': 'WARNING', 'ingestion': 'DEBUG'}"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Per-module logger; its level can be set on its own through settings.LOG_LEVELS."""
+    return logging.getLogger(name)
+
+
+_log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+_file = _file_handler()
+_file.setFormatter(JsonFormatter() if settings.LOG_JSON else logging.Formatter("%(asctime)s [%(levelname)s] %(name)s - %(message)s"))
+_console = logging.StreamHandler()  # optional: still outputs to console
+_console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s - %(message)s"))
+_listener = logging.handlers.QueueListener(_log_queue, _file, _console, respect_handler_level=True)
+
+_root = logging.getLogger()
+_root.setLevel(settings.LOG_LEVEL.upper())
+_root.handlers = [NonBlockingQueueHandler(_log_queue)]
+for _name, _level in _parse_levels(settings.LOG_LEVELS).items():
+    logging.getLogger(_name).setLevel(_level)
+_listener.start()
+# Flush whatever is still queued when the process exits
+atexit.register(_listener.stop)
 
 # Create a logger that can be imported by other modules
-logger = logging.getLogger(__name__)
\ No newline at end of file
+logger = get_logger(__name__)
@@ -1,5 +1,8 @@
-import uuid
-import sqlite3
+import asyncio
+import logging
+import base64
+import hashlib
+import hmac
 import requests
 import time
 import threading
@@ -9,14 +12,15 @@ from datetime import datetime
 from elevenlabs import ElevenLabs
 from config import settings
 from requests.auth import HTTPBasicAuth
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Response, Header
-from logger_config import logger
-import pandas as pd
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Response, Header, Query
+from logger_config import get_logger, logging_stats
+from db import connect, db_stats
 import io
-import math
 import os
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import tempfile
 from fastapi.templating import Jinja2Templates
 from fastapi import Depends, HTTPException, Cookie, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
@@ -27,19 +31,57 @@ from helperfuncs import (
     CallRequest,
     QueueUpdateRequest,
     pop_next_call,
+    renew_call_leases,
+    reclaim_expired_leases,
     update_call_details,
     pop_call_by_id,
+    set_call_sid,
+    get_call_id_by_sid,
+    format_call_details,
+    queue_depth_by_status,
     generate_initial_message,
+    fallback_initial_message,
+    INITIAL_MESSAGE_ERROR,
+    PROCESSING_CALL_BY_CUSTOMER_SQL,
     COUNTRY_CODE_MAP,
     init_db,
     DB_PATH
 )
-from notes_and_tasks import (
-    summarize_conversation_transcript,
-    update_customer_data_notes_and_tasks,
-    export_customer_data_to_excel,
-    send_meeting_invite
+from dispatcher import QueueDispatcher
+from ingestion import INGEST_MODES
+from ingest_jobs import (
+    create_ingest_job,
+    fail_interrupted_ingest_jobs,
+    renew_ingest_heartbeats,
+    get_ingest_job,
+    request_ingest_cancel,
+    start_ingest_job
 )
+from greeting_prefetch import GreetingPrefetcher
+from notes_and_tasks import get_call_history, update_customer_data_notes_and_tasks
+from post_call_jobs import PostCallWorkerPool, enqueue_post_call_job
+from excel_export import ExcelExporter
+from data_export import EXPORT_FORMATS, build_export_query, iter_csv, iter_export_rows, iter_jsonl, write_xlsx
+from uploads import UploadTooLarge, completed_ingest_for_content, get_upload, latest_upload, store_upload
+from status_pages import build_status_query, fetch_status_page
+from events import EventBroker, stream_events
+from call_state import call_state_stats, get_call_state, prune_call_state, record_call_started, record_call_transcript
+from greeting_cache import greeting_cache_stats, prune_greeting_cache
+from metrics import (
+    CALL_OUTCOMES,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    DIAL_ATTEMPTS,
+    EXPORT_SECONDS,
+    INITIATE_CALL_SECONDS,
+    WEBHOOK_SECONDS,
+    register_collector,
+    render_metrics,
+    stats_collector,
+    timed
+)
+from tracing import bind_trace, record_span, span, span_exporter, traced
+
+logger = get_logger(__name__)
 
 app = FastAPI(title="Call Queue")
 
@@ -60,16 +102,10 @@ templates = Jinja2Templates(directory="templates")
 # ElevenLabs client setup
 client = ElevenLabs(api_key=settings.ELEVENLABS_API)
 
-# Global dict to store both email and transcript by call_sid
-email_and_transcript = {}
-email_and_transcript_lock = threading.Lock()
-
-call_id_to_sid = {}  # Maps call_sid to call_id
-call_id_to_sid_lock = threading.Lock()
-
 init_db(logger=logger)  # Initialize the database at startup
+fail_interrupted_ingest_jobs()
 
-TERMINAL_STATUSES = {"completed", "busy", "failed", "no-answer", "cancelled"}
+TERMINAL_STATUSES = {"completed", "busy", "failed", "no-answer", "cancelled", "canceled"}
 
 # --- Phone Number Formatting and Validation ---
 # def format_and_validate_number(raw_number, country=None):
@@ -123,60 +159,149 @@ def validate_email(email: str) -> bool:
     email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
     return bool(email_pattern.match(email))
 
-def poll_twilio_status(call_sid, call_id, customer_id, customer_name, max_wait=150, poll_interval=5):
-    """
-    Poll Twilio for call status. If the call is completed or fails, remove it from the queue and process the next.
-    """
-    logger.info(f"[poll_twilio_status] Starting polling for callSid: {call_sid} (call_id: {call_id}, customer_id: {customer_id})\n\n")
+def validate_twilio_signature(url: str, params: dict, signature: Optional[str]) -> bool:
+    """Validates the X-Twilio-Signature header: base64 HMAC-SHA1 of the URL followed by the sorted POST params."""
+    if not signature:
+        return False
+    payload = url + "".join(f"{key}{params[key]}" for key in sorted(params))
+    digest = hmac.new(settings.TWILIO_AUTH_TOKEN.encode(), payload.encode(), hashlib.sha1).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), signature)
 
-    account_sid = getattr(settings, "TWILIO_ACCOUNT_SID", None)
-    auth_token = getattr(settings, "TWILIO_AUTH_TOKEN", None)
+def twilio_status_callback_url() -> Optional[str]:
+    if not settings.PUBLIC_BASE_URL:
+        return None
+    return settings.PUBLIC_BASE_URL.rstrip("/") + "/webhook/twilio-status"
 
-    if not account_sid or not auth_token:
-        logger.error("[poll_twilio_status] Missing Twilio credentials in settings.\n\n")
-        return
+def register_twilio_status_callback(call_sid) -> bool:
+    """
+    Points the Twilio call's status callback at /webhook/twilio-status. ElevenLabs places the call, so the
+    callback is attached to the call right after dialing; Twilio then posts the final status once the call ends.
+    """
+    callback_url = twilio_status_callback_url()
+    if not callback_url:
+        logger.info(f"[register_twilio_status_callback] PUBLIC_BASE_URL not set. callSid {call_sid} will be picked up by reconciliation.\n\n")
+        return False
 
+    account_sid = settings.TWILIO_ACCOUNT_SID
     url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Calls/{call_sid}.json"
-    auth = HTTPBasicAuth(account_sid, auth_token)
+    try:
+        response = requests.post(
+            url,
+            data={"StatusCallback": callback_url, "StatusCallbackMethod": "POST"},
+            auth=HTTPBasicAuth(account_sid, settings.TWILIO_AUTH_TOKEN),
+            timeout=10
+        )
+        if response.status_code >= 400:
+            logger.warning(f"[register_twilio_status_callback] Twilio API error {response.status_code}: {response.text}\n\n")
+            return False
+        logger.info(f"[register_twilio_status_callback] Status callback registered for callSid {call_sid}.\n\n")
+        return True
+    except Exception as e:
+        logger.error(f"[register_twilio_status_callback] Exception while registering callback for callSid {call_sid}: {e}\n\n")
+        return False
 
-    elapsed = 0
-    while elapsed < max_wait:
-        try:
-            response = requests.get(url, auth=auth, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                status = data.get("status")
-                logger.info(f"[poll_twilio_status] Twilio callSid {call_sid} status: {status}\n\n")
-
-                if status in TERMINAL_STATUSES:
-                    logger.info(f"[poll_twilio_status] Terminal status '{status}' received for callSid {call_sid}.\n\n")
-                    logger.info(f"[poll_twilio_status] Updating customer_data with last_call_status: {status}\n\n")
-                   
-                    conn = sqlite3.connect(DB_PATH)
-                    c = conn.cursor()
-                    c.execute("UPDATE customer_data SET last_call_status = ? WHERE call_id = ?", (status, call_id))
-                    conn.commit()
-                    conn.close()
-                   
-                    if status != "completed":
-
-                        logger.warning(f"[poll_twilio_status] PARSED == NONE being passed to append_notes_and_tasks since call status: {status}")
-                        update_customer_data_notes_and_tasks(call_id=call_id, parsed=None, db_path="queue.db")
-                        logger.info(f"removing {call_id} from queue after terminal status {status}\n\n")
-                        pop_call_by_id(call_id)
-                    threading.Thread(target=process_queue_single_run, daemon=True).start()
-                    return      
-            else:
-                logger.warning(f"[poll_twilio_status] Twilio API error {response.status_code}: {response.text}\n\n")
+@traced("call.status")
+def handle_twilio_call_status(call_id, call_sid, status, source="callback") -> bool:
+    """
+    Applies a Twilio call status to the queue row. Terminal statuses set customer_data.last_call_status; for
+    non-completed calls the outcome is also logged and the row is removed to free its slot. Completed calls keep
+    their slot until the call-ended webhook delivers the transcript.
+    Returns False if the status was a duplicate (e.g. both the callback and the reconciler reported it).
+    Traced as the call's "call.status" span (the row's correlation_id comes back from the UPDATE).
+    """
+    logger.info(f"[handle_twilio_call_status] Twilio callSid {call_sid} (call_id: {call_id}) status: {status} (source: {source})\n\n")
+    terminal = sorted(TERMINAL_STATUSES)
+    placeholders = ", ".join("?" for _ in terminal)
+
+    conn = connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        f"UPDATE call_queue SET twilio_status = ? WHERE call_id = ? AND (twilio_status IS NULL OR twilio_status NOT IN ({placeholders})) RETURNING correlation_id",
+        (status, call_id, *terminal)
+    )
+    row = c.fetchone()
+    applied = row is not None
+    if applied:
+        bind_trace(row[0], call_id=call_id, call_sid=call_sid, status=status, source=source)
+    if applied and status in TERMINAL_STATUSES:
+        logger.info(f"[handle_twilio_call_status] Updating customer_data with last_call_status: {status}\n\n")
+        c.execute("UPDATE customer_data SET last_call_status = ? WHERE call_id = ?", (status, call_id))
+    conn.commit()
+    conn.close()
+
+    if not applied:
+        logger.info(f"[handle_twilio_call_status] Status for callSid {call_sid} already handled or call no longer queued.\n\n")
+        return False
+    if status not in TERMINAL_STATUSES:
+        return True
+    CALL_OUTCOMES.inc(status=status)
 
-        except Exception as e:
-            logger.error(f"[poll_twilio_status] Exception while polling Twilio: {e}\n\n")
+    if status != "completed":
+        logger.warning(f"[handle_twilio_call_status] PARSED == NONE being passed to append_notes_and_tasks since call status: {status}")
+        update_customer_data_notes_and_tasks(call_id=call_id, parsed=None, db_path=DB_PATH, status=status)
+        logger.info(f"removing {call_id} from queue after terminal status {status}\n\n")
+        pop_call_by_id(call_id)
+        dispatcher.wake("twilio-terminal-status")
+    return True
 
-        time.sleep(poll_interval)
-        elapsed += poll_interval
+def fetch_twilio_call_statuses(call_sids: set, start_date: str, max_pages: int = 10) -> dict:
+    """
+    Fetches the status of many calls with one paged Twilio list request (calls started on or after start_date)
+    instead of one request per call. Returns {call_sid: status} for the requested call_sids that were found.
+    """
+    account_sid = settings.TWILIO_ACCOUNT_SID
+    auth = HTTPBasicAuth(account_sid, settings.TWILIO_AUTH_TOKEN)
+    url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Calls.json"
+    params = {"StartTime>": start_date, "PageSize": 1000}
+    statuses = {}
+
+    for _ in range(max_pages):
+        response = requests.get(url, params=params, auth=auth, timeout=10)
+        if response.status_code != 200:
+            logger.warning(f"[fetch_twilio_call_statuses] Twilio API error {response.status_code}: {response.text}\n\n")
+            break
+        data = response.json()
+        for call in data.get("calls", []):
+            if call.get("sid") in call_sids:
+                statuses[call["sid"]] = call.get("status")
+        next_page_uri = data.get("next_page_uri")
+        if len(statuses) == len(call_sids) or not next_page_uri:
+            break
+        url, params = f"https://api.twilio.com{next_page_uri}", None
+    return statuses
+
+def reconcile_twilio_statuses():
+    """
+    Fallback for calls whose Twilio status callback never arrived. Runs every TWILIO_RECONCILE_INTERVAL_SECONDS
+    and checks all overdue in-flight calls with a single multiplexed Twilio request.
+    """
+    logger.info("[reconcile_twilio_statuses] Background thread started. Reconciling missed Twilio status callbacks.\n\n")
+    terminal = sorted(TERMINAL_STATUSES)
+    placeholders = ", ".join("?" for _ in terminal)
 
-    logger.info(f"[poll_twilio_status] Max wait time exceeded for callSid {call_sid}. No terminal status received.\n\n")
+    while True:
+        time.sleep(settings.TWILIO_RECONCILE_INTERVAL_SECONDS)
+        try:
+            with connect(DB_PATH) as conn:
+                rows = conn.execute(f"""
+                    SELECT call_id, call_sid, called_at
+                    FROM call_queue
+                    WHERE status = 'processing' AND call_sid IS NOT NULL
+                      AND (twilio_status IS NULL OR twilio_status NOT IN ({placeholders}))
+                      AND called_at <= datetime('now', ?)
+                """, (*terminal, f"-{settings.TWILIO_CALLBACK_GRACE_SECONDS} seconds")).fetchall()
+            if not rows:
+                continue
+
+            pending = {call_sid: call_id for call_id, call_sid, _ in rows}
+            start_date = min(called_at for _, _, called_at in rows)[:10]
+            logger.info(f"[reconcile_twilio_statuses] Reconciling {len(pending)} call(s) without a status callback.\n\n")
+            for call_sid, twilio_status in fetch_twilio_call_statuses(set(pending), start_date).items():
+                handle_twilio_call_status(pending[call_sid], call_sid, twilio_status, source="reconcile")
+        except Exception as e:
+            logger.error(f"[reconcile_twilio_statuses] Exception while reconciling Twilio statuses: {e}\n\n", exc_info=True)
 
+@traced("call.dial")
 def initiate_call(
     phone_number: str,
     details: str,
@@ -185,12 +310,14 @@ def initiate_call(
     correlation_id: str,
     call_id: Optional[int] = None,
     email: Optional[str] = None,
-    country_code: Optional[str] = None
+    country_code: Optional[str] = None,
+    first_message: Optional[str] = None
 ) -> bool:
-    logger.info(f"[initiate_call] country code: {country_code}")
-    logger.info(f"[initiate_call] phone number: {phone_number}")
+    # correlation_id rides along as a structured field of every record for this call
+    log_extra = {"correlation_id": correlation_id, "call_id": call_id}
+    bind_trace(correlation_id, call_id=call_id, greeting="prefetched" if first_message else "inline")
     try:
-        logger.info(f"[initiate_call] Starting outbound call for {lead_name} (SF ID: {customer_id})\n\n")
+        logger.info("[initiate_call] Starting outbound call for %s (SF ID: %s)", lead_name, customer_id, extra=log_extra)
         phone_number_clean = (str(phone_number) if phone_number is not None else '').strip()
         # Sanitize country_code: remove decimals, whitespace, and ensure string
         country_code_clean = ''
@@ -204,151 +331,121 @@ def initiate_call(
 
         phone_number_final = country_code_clean + phone_number_clean
         
-        logger.info(f"[initiate_call] Using phone number: {phone_number_final}\n\n")
-        logger.info(f"[{correlation_id}] Initiating outbound call to {phone_number_final} with email: {email} being sent to initiate call function.\n\n")
-        result = client.conversational_ai.twilio.outbound_call(
-            agent_id=settings.AGENT_ID,
-            agent_phone_number_id=settings.AGENT_PHONE_NUMBER_ID,
-            to_number=phone_number_final,
-            conversation_initiation_client_data={
-                "dynamic_variables": {
-                    "first_message": generate_initial_message(details),
-                    "customer_id": customer_id,
-                    "customer_name": lead_name,
-                    "customer_details": details,
-                    "date_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "email": email or "Please check the details for email",
-                    "call_id": call_id 
-                }
-            },
-        )
+        logger.debug("[initiate_call] Using phone number: %s", phone_number_final, extra=log_extra)
+        if not first_message:
+            # Not prefetched yet: make a single attempt so the dialer never waits on LLM retries
+            logger.info("[initiate_call] No prefetched first message for call_id %s. Generating inline.", call_id, extra=log_extra)
+            with span("call.greeting"):
+                first_message = generate_initial_message(
+                    details,
+                    max_retries=1,
+                    acquire_timeout=settings.GREETING_INLINE_ACQUIRE_TIMEOUT_SECONDS,
+                    request_timeout=settings.GREETING_INLINE_REQUEST_TIMEOUT_SECONDS
+                )
+            if first_message == INITIAL_MESSAGE_ERROR:
+                first_message = fallback_initial_message(lead_name)
+
+        logger.debug("[initiate_call] Initiating outbound call to %s with email: %s", phone_number_final, email, extra=log_extra)
+        with span("elevenlabs.outbound_call"):
+            result = client.conversational_ai.twilio.outbound_call(
+                agent_id=settings.AGENT_ID,
+                agent_phone_number_id=settings.AGENT_PHONE_NUMBER_ID,
+                to_number=phone_number_final,
+                conversation_initiation_client_data={
+                    "dynamic_variables": {
+                        "first_message": first_message,
+                        "customer_id": customer_id,
+                        "customer_name": lead_name,
+                        "customer_details": details,
+                        "date_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "email": email or "Please check the details for email",
+                        "call_id": call_id 
+                    }
+                },
+            )
 
-        logger.info(f"[{correlation_id}] Outbound call API result: {result}\n\n")
+        logger.debug("[initiate_call] Outbound call API result: %s", result, extra=log_extra)
 
         if hasattr(result, 'success') and result.success is False:
-            logger.error(f"[{correlation_id}] Outbound call failed: {getattr(result, 'message', 'No message')}\n\n")
+            logger.error("[initiate_call] Outbound call failed: %s", getattr(result, 'message', 'No message'), extra=log_extra)
+            bind_trace(None, outcome="failed")
             return False
 
-        # Start background polling for call status
+        # Track the call so Twilio status callbacks (or the reconciler) can free its slot
         call_sid = getattr(result, 'callSid', None) or getattr(result, 'call_sid', None)
         if call_sid and call_id is not None:
-            
-            with call_id_to_sid_lock:
-                call_id_to_sid[str(call_id)] = str(call_sid)
-         
-            # Save email to global email_and_transcript dict
-            with email_and_transcript_lock:
-                if str(call_sid) not in email_and_transcript:
-                    email_and_transcript[str(call_sid)] = {"email": email, "transcript": None}
-                else:
-                    email_and_transcript[str(call_sid)]["email"] = email
-            threading.Thread(
-                target=poll_twilio_status,
-                args=(call_sid, call_id, customer_id, lead_name),
-                daemon=True
-            ).start()
-
-        logger.info(f"[{correlation_id}] Successfully initiated call to {phone_number_final} (Customer ID: {customer_id})\n\n")
+            set_call_sid(call_id, str(call_sid))
+            record_call_started(call_sid, call_id, email, db_path=DB_PATH, correlation_id=correlation_id)
+            register_twilio_status_callback(call_sid)
+
+        logger.info("[initiate_call] Successfully initiated call to %s (Customer ID: %s)", phone_number_final, customer_id, extra=log_extra)
+        bind_trace(None, outcome="initiated", call_sid=str(call_sid) if call_sid else None)
         return True
 
     except Exception as e:
-        logger.error(f"[{correlation_id}] Call failed. Error while making the call: {e}\n\n")
-        update_customer_data_notes_and_tasks(call_id=call_id, parsed=None, db_path="queue.db")
+        logger.error("[initiate_call] Call failed. Error while making the call: %s", e, extra=log_extra)
+        bind_trace(None, outcome="error", error=str(e))
+        update_customer_data_notes_and_tasks(call_id=call_id, parsed=None, db_path="queue.db", status="failed")
         return False
 
 # --- Shared Queue Processing Function ---
-def process_queue_single_run():
-    logger.info("[process_queue_single_run] Checking queue for next call.\n\n")
-    conn = None
-
+def queue_has_queued_calls() -> bool:
+    conn = connect(DB_PATH)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM call_queue WHERE status = 'processing'")
-        if c.fetchone()[0] > 0:
-            logger.info("[process_queue_single_run] A call is already in processing. Exiting.\n\n")
-            return
-    except Exception as db_exc:
-        logger.error(f"[process_queue_single_run] DB error while checking processing count: {db_exc}\n\n", exc_info=True)
-        return
+        return conn.execute("SELECT EXISTS (SELECT 1 FROM call_queue WHERE status = 'queued')").fetchone()[0] == 1
     finally:
-        if conn:
-            conn.close()
-
-    try:
-        next_call = pop_next_call()
-        
-        # Optimized log rotation - only check/rotate periodically
-        try:
-            import os
-            if os.path.exists("app.log") and os.path.getsize("app.log") > 1024 * 1024:  # Only check if file > 1MB
-                with open("app.log", "r") as f:
-                    lines = f.readlines()
-                if len(lines) > 1000:
-                    with open("app.log", "w") as f:
-                        f.writelines(lines[-1000:])
-                    logger.info(f"[process_queue_single_run] Rotated log file, kept last 1000 lines from {len(lines)} total")
-        except Exception as log_exc:
-            logger.warning(f"[process_queue_single_run] Log rotation failed: {log_exc}\n\n")
-
-        if not next_call:
-            logger.info("[process_queue_single_run] No queued calls found.\n\n")
-            export_customer_data_to_excel(db_path="queue.db", excel_path="resultant_excel.xlsx")
-            return
-
-        call_id, customer_name, customer_id, phone_number, email, customer_requirements, notes, tasks = next_call
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT company_name, country_code, industry, location FROM customer_data WHERE call_id = ?", (call_id,))
-        row = c.fetchone()
-        if not row:
-            logger.warning(f"[process_queue_single_run] No customer data found for call_id: {call_id}\n\n")
-        if row:
-            company_name, country_code, industry, location = row
-            company_name = company_name.strip() if company_name else None
-            logger.info(f"[process_queue_single_run] Company Name: {company_name}\n\n")
-            country_code = country_code.strip() if country_code else None
-            logger.info(f"[process_queue_single_run] Country Code: {country_code}\n\n")
-            industry = industry.strip() if industry else None
-            logger.info(f"[process_queue_single_run] Industry: {industry}\n\n")
-            location = location.strip() if location else None
-            logger.info(f"[process_queue_single_run] Location: {location}\n\n")
-        else:
-            company_name, country_code, industry, location = None, None, None, None
-        conn.commit()
         conn.close()
-        logger.info(f"[process_queue_single_run] Picked call_id: {call_id} for {customer_id}:{phone_number}\n\n")
 
+def process_queue_single_run() -> bool:
+    """
+    Fills one free call slot: claims the next queued row and dials it.
+    Up to settings.MAX_CONCURRENT_CALLS calls may be in processing at the same time; a slot is freed
+    when the row leaves the queue (terminal Twilio status, call-ended webhook or failed dial).
+    Returns True when a row was claimed, so the dispatcher should try to fill another slot.
+    """
+    logger.debug("[process_queue_single_run] Checking queue for next call.")
+    max_calls = max(1, settings.MAX_CONCURRENT_CALLS)
 
-        notes = notes.strip()
-        logger.info(f"[process_queue_single_run] Notes: {notes}\n\n")
-        logger.info(f"[process_queue_single_run] Customer Requirements: {customer_requirements}\n\n")
-        logger.info(f"[process_queue_single_run] Customer ID: {customer_id}\n\n")
-        logger.info(f"[process_queue_single_run] Creating the details for dynamic variables using customer_requirements and notes")
+    try:
+        # One round trip: the claim returns the full dial context, customer_data fields included
+        claim_started = time.time_ns()
+        next_call = pop_next_call(max_processing=max_calls)
 
-        details = f"These are the details of the customer you are speaking with. Name: {customer_name}:\n\n"
-        details += f"Customer Requirements: {customer_requirements}\n"
-        details += f"Notes: {notes}\n"
-        details += f"Tasks: {tasks}\n"
-        details += f"Company Name: {company_name}\n"
-        details += f"Country Code: {country_code}\n"
-        details += f"Industry: {industry}\n"
-        details += f"Location: {location}\n"
+        if not next_call:
+            # Off the hot path: tell a drained queue (refresh the export) from busy slots
+            if queue_has_queued_calls():
+                logger.info("[process_queue_single_run] All %d call slots are busy.", max_calls)
+            else:
+                logger.info("[process_queue_single_run] No queued calls found.\n\n")
+                excel_exporter.request()
+            return False
 
-        logger.info(f"[process_queue_single_run] Details for call: {details}\n\n")
+        call_id = next_call["call_id"]
+        # The claim assigned this attempt's correlation_id; it is the trace id for every later stage of the call
+        correlation_id = next_call["correlation_id"]
+        record_span("call.claim", correlation_id, claim_started, time.time_ns(), call_id=call_id)
+        customer_name = next_call["customer_name"]
+        customer_id = next_call["customer_id"]
+        phone_number = next_call["phone_number"]
+        # The prefetch window moved; keep greetings ready for the rows behind this one
+        greeting_prefetcher.wake()
+        logger.info("[process_queue_single_run] Picked call_id: %s for %s:%s", call_id, customer_id, phone_number)
+
+        details, country_code = format_call_details(next_call)
+        # Full customer details only at DEBUG; arguments are formatted by the log writer, and only if enabled
+        logger.debug("[process_queue_single_run] Details for call_id %s: %s", call_id, details)
         # Normalize phone number
         phone = phone_number.strip()
-        logger.info(f"[process_queue_single_run] Trying Phone: {phone}\n\n")
         
-        # If no valid phone found, remove from queue and restart thread
+        # If no valid phone found, remove from queue and let the dispatcher move on
         if not phone:
             logger.error(f"[process_queue_single_run] No valid phone found for {customer_id} (call_id: {call_id}). Removing from queue.\n\n")
             pop_call_by_id(call_id)
-            threading.Thread(target=process_queue_single_run, daemon=True).start()
-            return
+            DIAL_ATTEMPTS.inc(result="no_phone")
+            return True
 
 
-        correlation_id = str(uuid.uuid4())
+        started = time.perf_counter()
         try:
             call_success = initiate_call(
                 phone_number=phone,
@@ -357,24 +454,51 @@ def process_queue_single_run():
                 customer_id=customer_id,
                 correlation_id=correlation_id,
                 call_id=call_id,
-                email=email,
-                country_code=country_code
+                email=next_call["email"],
+                country_code=country_code,
+                first_message=next_call["first_message"]
             )
         except Exception as call_exc:
             logger.error(f"[process_queue_single_run] Exception during call initiation for call_id {call_id}: {call_exc}\n\n", exc_info=True)
             call_success = False
+        INITIATE_CALL_SECONDS.observe(time.perf_counter() - started, outcome="ok" if call_success else "failed")
+        DIAL_ATTEMPTS.inc(result="initiated" if call_success else "failed")
 
         if not call_success:
             logger.error(f"[process_queue_single_run] Call initiation failed for {customer_id} (call_id: {call_id}). Removing from queue.\n\n")
             pop_call_by_id(call_id)
-            threading.Thread(target=process_queue_single_run, daemon=True).start()
         else:
-            logger.info(f"[process_queue_single_run] Call successfully initiated for {customer_id} (call_id: {call_id}). Awaiting webhook or Twilio polling.\n\n")
+            logger.info("[process_queue_single_run] Call successfully initiated for %s (call_id: %s). Awaiting webhook or Twilio polling.", customer_id, call_id)
+        return True
 
     except Exception as e:
         logger.error(f"[process_queue_single_run] Unexpected error: {e}\n\n", exc_info=True)
         if 'call_id' in locals():
             pop_call_by_id(call_id)
+        return False
+
+
+dispatcher = QueueDispatcher(process_queue_single_run)
+post_call_workers = PostCallWorkerPool(settings.POST_CALL_WORKERS)
+greeting_prefetcher = GreetingPrefetcher(settings.GREETING_PREFETCH_DEPTH)
+excel_exporter = ExcelExporter(os.path.join(os.getcwd(), "resultant_excel.xlsx"))
+event_broker = EventBroker()
+
+
+def collect_queue_depth() -> list:
+    depth = queue_depth_by_status(DB_PATH)
+    return [("sdr_queue_depth", "gauge", "Rows in call_queue by status.", [({"status": status}, count) for status, count in sorted(depth.items())])]
+
+
+register_collector(collect_queue_depth)
+register_collector(stats_collector("sdr_db", "SQLite pool and lock-wait counters", db_stats))
+register_collector(stats_collector("sdr_dispatcher", "Queue dispatcher counters", dispatcher.stats))
+register_collector(stats_collector("sdr_greeting_cache", "Greeting cache counters", greeting_cache_stats))
+register_collector(stats_collector("sdr_call_state", "Call state cache counters", call_state_stats))
+register_collector(stats_collector("sdr_excel_export", "Background Excel export counters", excel_exporter.stats))
+register_collector(stats_collector("sdr_events", "Event feed counters", event_broker.stats))
+register_collector(stats_collector("sdr_logging", "Log queue counters", logging_stats))
+register_collector(stats_collector("sdr_tracing", "Span exporter counters", span_exporter.stats))
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -433,14 +557,28 @@ async def upload_page(request: Request, username: str = Depends(get_current_user
 
 @app.post("/upload-file")
 async def upload_file(file: UploadFile = File(...), username: str = Depends(get_current_user)):
-    TEMP_FILE_PATH = "temp_upload.xlsx"
+    """
+    Streams the file to per-upload storage and returns its upload_id for /add-call.
+    already_ingested_job_id is set when identical content has already been ingested.
+    """
     try:
-        with open(TEMP_FILE_PATH, "wb") as buffer:
-            contents = await file.read()
-            buffer.write(contents)
-        return JSONResponse(content={"message": "File uploaded successfully"})
+        upload = await store_upload(file, uploaded_by=username)
+    except UploadTooLarge:
+        return JSONResponse(
+            content={"message": f"Upload failed: file is larger than {settings.UPLOAD_MAX_BYTES} bytes"},
+            status_code=413
+        )
     except Exception as e:
         return JSONResponse(content={"message": f"Upload failed: {str(e)}"}, status_code=500)
+
+    previous = completed_ingest_for_content(upload["sha256"])
+    return JSONResponse(content={
+        "message": "File uploaded successfully" if not previous else "File uploaded successfully (identical to a file already processed)",
+        "upload_id": upload["upload_id"],
+        "sha256": upload["sha256"],
+        "size_bytes": upload["size_bytes"],
+        "already_ingested_job_id": previous["job_id"] if previous else None,
+    })
     
 @app.get("/auth-check")
 async def auth_check(username: str = Depends(get_current_user)):
@@ -448,25 +586,25 @@ async def auth_check(username: str = Depends(get_current_user)):
 
 # Endpoint to download the resultant Excel file
 @app.get("/download-excel")
-def download_excel(username: str = Depends(get_current_user)):
+def download_excel(username: str = Depends(get_current_user), if_none_match: Optional[str] = Header(None)):
     """
     Delivers the resultant Excel file as a downloadable response.
+    The file is regenerated in the background only when customer_data changed; the ETag is the exported
+    data version, so unchanged downloads are answered with 304.
     """
     logger.info(f"[download-excel] User {username} downloading Excel file\n\n")
-    # Always export the latest customer_data to Excel before serving
-    excel_path = os.path.join(os.getcwd(), "resultant_excel.xlsx")
-    try:
-        export_customer_data_to_excel(db_path=DB_PATH, excel_path=excel_path)
-    except Exception as e:
-        logger.error(f"[download_excel] Error exporting Excel: {e}")
-        raise HTTPException(status_code=500, detail="Failed to generate Excel file.")
-    if not os.path.exists(excel_path):
-        logger.error(f"[download_excel] File not found: {excel_path}")
-        raise HTTPException(status_code=404, detail="Excel file not found.")
+    version = excel_exporter.wait_until_current(timeout=settings.EXCEL_EXPORT_WAIT_SECONDS)
+    if version is None:
+        logger.error("[download_excel] Excel export is not ready.")
+        raise HTTPException(status_code=503, detail="Excel file is still being generated. Please try again shortly.", headers={"Retry-After": "5"})
+    etag = f'"customer-data-v{version}"'
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
     return FileResponse(
-        path=excel_path,
+        path=excel_exporter.excel_path,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename="resultant_excel.xlsx"
+        filename="resultant_excel.xlsx",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
     )
 
 
@@ -489,101 +627,183 @@ def excel_status(username: str = Depends(get_current_user)):
 
     
 
-@app.post("/add-call")
-async def add_call(username: str = Depends(get_current_user)):
+def split_query_list(value: Optional[str]):
+    """'a, b,c' -> ['a', 'b', 'c']; None/empty -> None."""
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+@app.get("/export")
+def export_customer_data(
+    format: str = "csv",
+    columns: Optional[str] = None,
+    last_call_status: Optional[str] = None,
+    updated_since: Optional[str] = None,
+    updated_until: Optional[str] = None,
+    username: str = Depends(get_current_user)
+):
     """
-    Processes the previously uploaded Excel file (temp_upload.xlsx) and adds calls to the queue.
+    Streams customer_data as csv, jsonl or xlsx straight from a SQLite cursor.
+    columns and last_call_status are comma-separated ('none' matches never-called rows);
+    updated_since/updated_until are ISO dates or datetimes filtering on updated_at.
     """
-    logger.info(f"[add_call API] User {username} processing previously uploaded Excel file\n\n")
-    TEMP_FILE_PATH = "temp_upload.xlsx"
+    logger.info(f"[export] User {username} exporting customer data as {format}\n\n")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}.")
     try:
-        if not os.path.exists(TEMP_FILE_PATH):
-            logger.error("No file uploaded yet. temp_upload.xlsx not found.")
-            raise HTTPException(status_code=400, detail="No file uploaded yet. Please upload an Excel file first.")
+        selected, where, params = build_export_query(
+            columns=split_query_list(columns),
+            last_call_status=split_query_list(last_call_status),
+            updated_since=updated_since,
+            updated_until=updated_until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"customer_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    rows = iter_export_rows(selected, where, params, db_path=DB_PATH)
+    if format == "csv":
+        chunks = EXPORT_SECONDS.time_iter(iter_csv(selected, rows), kind="csv")
+        return StreamingResponse(chunks, media_type=EXPORT_FORMATS[format], headers=headers)
+    if format == "jsonl":
+        chunks = EXPORT_SECONDS.time_iter(iter_jsonl(selected, rows), kind="jsonl")
+        return StreamingResponse(chunks, media_type=EXPORT_FORMATS[format], headers=headers)
+
+    # XLSX is a zip container, so it is spooled through a temp file (written row by row) and removed after sending
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        with EXPORT_SECONDS.time(kind="xlsx"):
+            write_xlsx(tmp_path, selected, rows)
+    except Exception as e:
+        os.remove(tmp_path)
+        logger.error(f"[export] Error writing xlsx export: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to generate export.")
+    return FileResponse(
+        path=tmp_path,
+        media_type=EXPORT_FORMATS[format],
+        filename=filename,
+        background=BackgroundTask(os.remove, tmp_path)
+    )
 
-        df = pd.read_excel(TEMP_FILE_PATH)
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
 
-        # Clear customer_data table before adding new batch
-        c.execute("DELETE FROM customer_data")
-        logger.info(f"Deleted previous customer data.")
+@app.post("/add-call", status_code=202)
+async def add_call(
+    upload_id: Optional[str] = None,
+    force: bool = False,
+    mode: Optional[str] = None,
+    username: str = Depends(get_current_user)
+):
+    """
+    Starts a background ingest job for an uploaded file (upload_id, or the user's latest upload when omitted)
+    and returns its job_id immediately. Poll /ingest-jobs/{job_id} for progress.
+    mode is "delta" (only new/changed rows are written and queued) or "replace"; defaults to settings.INGEST_MODE.
+    If identical content was already ingested, the earlier job is returned instead unless force is set.
+    """
+    mode = mode or settings.INGEST_MODE
+    if mode not in INGEST_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(INGEST_MODES)}.")
+    logger.info(f"[add_call API] User {username} processing uploaded file {upload_id or '(latest)'}\n\n")
+    upload = get_upload(upload_id) if upload_id else latest_upload(username)
+    if not upload:
+        logger.error(f"[add_call] Upload {upload_id or '(latest)'} not found for user {username}.")
+        raise HTTPException(status_code=404 if upload_id else 400, detail="No file uploaded yet. Please upload an Excel file first.")
+
+    if not force:
+        previous = completed_ingest_for_content(upload["sha256"])
+        if previous:
+            logger.info(f"[add_call] Upload {upload['upload_id']} matches already ingested job {previous['job_id']}; skipping.\n\n")
+            return JSONResponse(status_code=200, content={
+                "job_id": previous["job_id"],
+                "status": "completed",
+                "duplicate": True,
+                "finished_at": previous["finished_at"],
+                "message": f"This file was already processed (job {previous['job_id']}, finished {previous['finished_at']} UTC). Re-import it to process it again.",
+            })
 
-        added_count = 0
-        for _, row in df.iterrows():
-            customer_name_raw = row.get('customer_name', '')
-            if pd.isna(customer_name_raw):
-                customer_name = None
-            else:
-                customer_name = str(customer_name_raw).strip()
-            customer_id = (str(row.get('customer_id', '')) if row.get('customer_id', '') is not None else '').strip()
-            # Sanitize phone_number
-            phone_number_raw = row.get('phone_number', '')
-            if phone_number_raw is None or (isinstance(phone_number_raw, float) and math.isnan(phone_number_raw)):
-                phone_number = ''
-            elif isinstance(phone_number_raw, float):
-                phone_number = str(int(phone_number_raw))
-            else:
-                phone_number = str(phone_number_raw).strip()
-            # Sanitize country_code
-            country_code_raw = row.get('country_code', '')
-            if country_code_raw is None or (isinstance(country_code_raw, float) and math.isnan(country_code_raw)):
-                country_code = ''
-            elif isinstance(country_code_raw, float):
-                country_code = str(int(country_code_raw))
-            else:
-                country_code = str(country_code_raw).strip()
-            logger.info(f"country_code: {country_code}")
-            email = (str(row.get('email', '')) if row.get('email', '') is not None else '').strip()
-            customer_requirements = (str(row.get('customer_requirements', '')) if row.get('customer_requirements', '') is not None else '').strip()
-            notes = (str(row.get('notes', '')) if row.get('notes', '') is not None else '').strip()
-            tasks = (str(row.get('tasks', '')) if row.get('tasks', '') is not None else '').strip()
-            to_call = (str(row.get('to_call', '')) if row.get('to_call', '') is not None else '').strip()
-            industry = (str(row.get('industry', '')) if row.get('industry', '') is not None else '').strip()
-            company_name = (str(row.get('company_name', '')) if row.get('company_name', '') is not None else '').strip()
-            location = (str(row.get('location', '')) if row.get('location', '') is not None else '').strip()
-            logger.info(f"Processing row: customer_id={customer_id}, customer_name={customer_name}, phone_number={phone_number}, to_call={to_call}")
-            if to_call.lower() == "yes":
-                # Insert into call_queue first to get call_id
-                if customer_name and phone_number:
-                    try:
-                        c.execute("INSERT INTO call_queue (customer_name, customer_id, phone_number, email, customer_requirements, to_call, notes, tasks, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued')", (customer_name, customer_id, phone_number, email, customer_requirements, to_call, notes, tasks))
-                        call_id = c.lastrowid
-                        # Insert into customer_data with the same call_id
-                        c.execute("""
-                            INSERT OR REPLACE INTO customer_data (call_id, customer_name, customer_id, phone_number, email, customer_requirements, to_call, notes, tasks, country_code, industry, company_name, location)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (call_id, customer_name, customer_id, phone_number, email, customer_requirements, to_call, notes, tasks, country_code, industry, company_name, location))
-                        added_count += 1
-                    except Exception as e:
-                        logger.error(f"[add_call] Failed to insert row: {e}")
-        conn.commit()
-        conn.close()
-        response = {
-            "message": f"Processed {len(df)} rows. Added {added_count} new entries to queue."
-        }
-        threading.Thread(target=process_queue_single_run, daemon=True).start()
-        return response
+    try:
+        job_id = create_ingest_job(upload["path"], created_by=username, upload_id=upload["upload_id"], mode=mode)
     except Exception as e:
-        logger.error(f"[add_call] Error processing Excel file: {e}")
-        raise HTTPException(status_code=400, detail="Failed to process Excel file.")
-
-
+        logger.error(f"[add_call] Error creating ingest job: {e}")
+        raise HTTPException(status_code=500, detail="Failed to start processing the uploaded file.")
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="Another file is still being processed. Please wait for it to finish.")
+
+    start_ingest_job(job_id, upload["path"], on_batch=wake_after_ingest_batch, mode=mode)
+    logger.info(f"[add_call] Started ingest job {job_id} for upload {upload['upload_id']}.\n\n")
+    return {"job_id": job_id, "status": "queued", "duplicate": False, "message": "Processing started."}
+
+def wake_after_ingest_batch():
+    greeting_prefetcher.wake()
+    dispatcher.wake("calls-enqueued")
+
+@app.get("/ingest-jobs/{job_id}")
+def ingest_job_status(job_id: str, username: str = Depends(get_current_user)):
+    """Returns status and rows parsed/inserted/skipped and rows-per-second for an ingest job."""
+    job = get_ingest_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found.")
+    return job
+
+@app.post("/ingest-jobs/{job_id}/cancel")
+def cancel_ingest_job(job_id: str, username: str = Depends(get_current_user)):
+    """Requests cancellation; the job stops after its current batch and keeps the batches already committed."""
+    if not request_ingest_cancel(job_id):
+        if get_ingest_job(job_id) is None:
+            raise HTTPException(status_code=404, detail="Ingest job not found.")
+        raise HTTPException(status_code=409, detail="Ingest job has already finished.")
+    logger.info(f"[cancel_ingest_job] User {username} requested cancellation of ingest job {job_id}.\n\n")
+    return {"job_id": job_id, "status": "cancelling"}
+
+
+@app.get("/call-history/{call_id}")
+def call_history(call_id: int, limit: Optional[int] = None, username: str = Depends(get_current_user)):
+    """Past call outcomes for a customer_data row (summary, tasks, status, transcript), newest first."""
+    return {"call_id": call_id, "calls": get_call_history(call_id, db_path=DB_PATH, limit=limit)}
+
+
+@app.post("/webhook/twilio-status")
+@timed(WEBHOOK_SECONDS, webhook="twilio_status")
+async def twilio_status_webhook(request: Request, x_twilio_signature: Optional[str] = Header(None)):
+    """
+    Receives Twilio call status callbacks and applies terminal statuses to the queue.
+    """
+    form = await request.form()
+    params = {key: value for key, value in form.items()}
+    url = twilio_status_callback_url() or str(request.url)
+    if not validate_twilio_signature(url, params, x_twilio_signature):
+        logger.warning("[twilio_status_webhook] Rejected callback with invalid Twilio signature.\n\n")
+        raise HTTPException(status_code=403, detail="Invalid Twilio signature.")
+
+    call_sid = params.get("CallSid")
+    call_status = params.get("CallStatus")
+    if not call_sid or not call_status:
+        raise HTTPException(status_code=400, detail="Missing CallSid or CallStatus.")
+
+    # The lookup and the status update write SQLite (and post-call notes), so they run off the event loop
+    call_id = await asyncio.to_thread(get_call_id_by_sid, call_sid)
+    if call_id is None:
+        logger.info(f"[twilio_status_webhook] No queued call for callSid {call_sid}. Possibly already handled.\n\n")
+        return {"status": "ignored"}
+
+    await asyncio.to_thread(handle_twilio_call_status, call_id, call_sid, call_status, source="callback")
+    return {"status": "ok"}
 
 @app.post("/webhook/call-ended")
+@timed(WEBHOOK_SECONDS, webhook="call_ended")
+@traced("call.webhook")
 async def call_ended(request: Request):
     logger.info("[call_ended API] Received call end webhook.\n\n")
 
     try:
         data = await request.json()
-        logger.info(f"[call_ended] Webhook received data.")
         
         # Log all top-level keys and important subfields for debugging
-        logger.info(f"[call_ended] Webhook received keys: {list(data.keys())}")
-        logger.info(f"[call_ended] data['data'] keys: {list(data.get('data', {}).keys())}")
-        logger.info(f"[call_ended] dynamic_variables: {list(data.get('data', {}).get('conversation_initiation_client_data', {}).get('dynamic_variables', {}).keys())}")
-        logger.info(f"[call_ended] analysis keys: {list(data.get('data', {}).get('analysis', {}).keys())}")
-        logger.info(f"[call_ended] metadata keys: {list(data.get('data', {}).get('metadata', {}).keys())}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[call_ended] Webhook received keys: %s", list(data.keys()))
+            logger.debug("[call_ended] data['data'] keys: %s", list(data.get('data', {}).keys()))
+            logger.debug("[call_ended] dynamic_variables: %s", list(data.get('data', {}).get('conversation_initiation_client_data', {}).get('dynamic_variables', {}).keys()))
+            logger.debug("[call_ended] analysis keys: %s", list(data.get('data', {}).get('analysis', {}).keys()))
+            logger.debug("[call_ended] metadata keys: %s", list(data.get('data', {}).get('metadata', {}).keys()))
 
         # Extract relevant data
         dynamic_vars = data["data"]["conversation_initiation_client_data"]["dynamic_variables"]
@@ -598,38 +818,42 @@ async def call_ended(request: Request):
 
         logger.info(f"[call_ended] Extracted fields: call_sid={call_sid}, customer_id={customer_id}, customer_name={customer_name}, call_summary={'present' if call_summary else 'missing'}, call_transcript={'present' if call_transcript else 'missing'}")
 
+        if not customer_id:
+            logger.error("Missing 'customer_id' in webhook payload.\n\n")
+            raise HTTPException(status_code=400, detail="Missing customer_id in webhook.")
+
         customer_email = dynamic_vars.get("email", "No email provided")
+        # Join the call's trace: the correlation_id was stored with the call's state when it was dialed
+        correlation_id = (get_call_state(call_id, db_path=DB_PATH) or {}).get("correlation_id")
+        bind_trace(correlation_id, call_id=call_id, call_sid=call_sid)
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         c = conn.cursor()
         c.execute("UPDATE customer_data SET last_call_status = ? WHERE call_id = ?", ("completed", call_id))
         conn.commit()
         conn.close()
 
-        # Save transcript to global email_and_transcript dict
-        with email_and_transcript_lock:
-            if str(call_sid) not in email_and_transcript:
-                email_and_transcript[str(call_sid)] = {"email": customer_email, "transcript": call_transcript}
-            else:
-                email_and_transcript[str(call_sid)]["transcript"] = call_transcript
+        # Keep the transcript with the call's state so the lease reaper can still hand it to post-call work
+        record_call_transcript(call_sid, call_id, customer_email, call_transcript, db_path=DB_PATH)
 
-        if not customer_id:
-            logger.error("Missing 'customer_id' in webhook payload.\n\n")
-            raise HTTPException(status_code=400, detail="Missing customer_id in webhook.")
+        # Summary, notes/tasks and meeting invite run on the post-call worker pool so the webhook acks immediately
+        job_id = enqueue_post_call_job(call_id, customer_name, customer_email, call_transcript, correlation_id=correlation_id)
+        post_call_workers.wake()
 
-        # Post call summary to Excel
-        parsed = summarize_conversation_transcript(call_transcript)
-        update_customer_data_notes_and_tasks(call_id=call_id, parsed=parsed, db_path=DB_PATH)
-        send_meeting_invite(parsed=parsed, customer_name=customer_name, customer_email=customer_email)
-        # Remove completed call from queue
+        # Remove completed call from queue. Several calls can be in flight, so prefer the exact call_id.
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with connect(DB_PATH) as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT call_id FROM call_queue WHERE customer_id = ? AND status = 'processing'",
-                    (customer_id,)
-                )
-                row = cursor.fetchone()
+                row = None
+                if call_id is not None:
+                    cursor.execute(
+                        "SELECT call_id FROM call_queue WHERE call_id = ? AND status = 'processing'",
+                        (call_id,)
+                    )
+                    row = cursor.fetchone()
+                if not row:
+                    cursor.execute(PROCESSING_CALL_BY_CUSTOMER_SQL, (customer_id,))
+                    row = cursor.fetchone()
                 if row:
                     queue_id = row[0] if isinstance(row, (tuple, list)) else row
                     pop_call_by_id(queue_id)
@@ -641,92 +865,109 @@ async def call_ended(request: Request):
 
         # Trigger next call
         logger.info("[call_ended] Triggering next call after webhook.\n\n")
-        threading.Thread(target=process_queue_single_run, daemon=True).start()
+        dispatcher.wake("call-ended")
 
-        # Handle stuck calls older than 11 minutes
-        try:
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT call_id, customer_id, customer_name, called_at
-                    FROM call_queue
-                    WHERE status = 'processing' AND called_at <= datetime('now', '-11 minutes')
-                    ORDER BY called_at ASC
-                    LIMIT 1
-                """)
-                stuck = cursor.fetchone()
-                if stuck:
-                    stuck_call_id, customer_id, customer_name, _ = stuck
-                    logger.warning(f"Stuck call detected (ID {stuck_call_id}), removing from queue.\n\n")
-
-                    pop_call_by_id(stuck_call_id)
-
-                    parsed = summarize_conversation_transcript(call_transcript)
-                    update_customer_data_notes_and_tasks(call_id=stuck_call_id, parsed=parsed, db_path=DB_PATH)
-                    send_meeting_invite(parsed=parsed, customer_name=customer_name, customer_email=customer_email)
-                   
-                    threading.Thread(target=process_queue_single_run, daemon=True).start()
-        except Exception as stuck_exc:
-            logger.error(f"Error checking for stuck calls: {stuck_exc}\n\n", exc_info=True)
-
-        return {"status": "Webhook processed, queue updated.", "entity_id_processed": customer_id}
+        return {"status": "Webhook processed, queue updated.", "entity_id_processed": customer_id, "post_call_job_id": job_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Fatal error in call-ended webhook: {e}\n\n", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error.")
 
-@app.get("/status")
-def queue_status():
-    logger.info("[status API] /status endpoint called. Returns current queue status.\n\n")
+def status_page_response(view: str, endpoint: str, fields, status, since, until, after, limit, if_none_match, all_rows=False):
+    """Shared body of /status and /customer-data-status: one filtered keyset page plus per-status counts, with ETag/304."""
+    try:
+        query = build_status_query(
+            view,
+            fields=split_query_list(fields),
+            statuses=split_query_list(status),
+            since=since,
+            until=until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.execute("""
-                SELECT call_id, customer_id, customer_name, phone_number, email, status, created_at
-                FROM call_queue 
-                ORDER BY call_id ASC
-            """)
-            queue = [
-                {
-                    "call_id": row[0],
-                    "customer_id": row[1],
-                    "customer_name": row[2],
-                    "phone": row[3],
-                    "email": row[4],
-                    "status": row[5],
-                    "created_at": row[6]
-                }
-                for row in cursor.fetchall()
-            ]
-        return {"queue": queue}
+        etag, page = fetch_status_page(query, after=after, limit=limit, if_none_match=if_none_match, db_path=DB_PATH, all_rows=all_rows)
     except Exception as e:
-        logger.error("Error in /status: %s\n\n", e, exc_info=True)
+        logger.error(f"Error in {endpoint}: {e}\n\n", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch queue status.")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if page is None:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(page, headers=headers)
+
+@app.get("/status")
+def queue_status(
+    fields: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    all_rows: bool = Query(False, alias="all"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    One page of call_queue in call_id order. Pass the returned next_cursor as after to get the next page, or
+    all=true for every matching row in one response (not for polling: it reads the whole filtered table).
+    fields and status are comma-separated; since/until filter created_at. counts are per status over the date range.
+    """
+    logger.info("[status API] /status endpoint called. Returns current queue status.\n\n")
+    return status_page_response("call_queue", "/status", fields, status, since, until, after, limit, if_none_match, all_rows)
 
 @app.get("/customer-data-status")
-def customer_data_status():
+def customer_data_status(
+    fields: Optional[str] = None,
+    last_call_status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    all_rows: bool = Query(False, alias="all"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    One page of customer_data in call_id order, paged like /status. last_call_status accepts 'none' for
+    never-called rows; since/until filter updated_at.
+    """
     logger.info("[status API] /customer-data-status endpoint called. Returns current customer data status.\n\n")
+    return status_page_response("customer_data", "/customer-data-status", fields, last_call_status, since, until, after, limit, if_none_match, all_rows)
+
+@app.get("/events")
+async def events_feed(
+    request: Request,
+    after: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None),
+    username: str = Depends(get_current_user)
+):
+    """
+    Server-Sent Events feed of queue transitions (status, twilio_status, removed), call results, ingest job
+    progress and Excel exports. Reconnecting EventSource clients resume from Last-Event-ID; ?after= does
+    the same for the first connection. Without either, the feed starts at the next event.
+    """
+    logger.info(f"[events] User {username} subscribed to the event feed.\n\n")
+    resume_from = last_event_id or after
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.execute("""
-                SELECT call_id, customer_id, customer_name, phone_number, email, country_code
-                FROM customer_data
-                ORDER BY call_id ASC
-            """)
-            queue = [
-                {
-                    "call_id": row[0],
-                    "customer_id": row[1],
-                    "customer_name": row[2],
-                    "phone": row[3],
-                    "email": row[4],
-                    "country_code": row[5]
-                }
-                for row in cursor.fetchall()
-            ]
-        return {"queue": queue}
-    except Exception as e:
-        logger.error("Error in /customer-data-status: %s\n\n", e, exc_info=True)
-        raise HTTPException(status_code=500, detail="Failed to fetch queue status.")
+        after_id = int(resume_from) if resume_from is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an integer event id.")
+    return StreamingResponse(
+        stream_events(event_broker, after_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+def metrics(authorization: Optional[str] = Header(None)):
+    """
+    Prometheus text exposition: dial, Groq, webhook, lock-wait and export metrics recorded in this process, plus
+    queue depth and the background components' counters read at scrape time.
+    """
+    if settings.METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {settings.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token.")
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 
 @app.post("/update-queue")
 def update_queue(req: QueueUpdateRequest):
@@ -759,7 +1000,7 @@ def update_queue(req: QueueUpdateRequest):
             WHERE id = ?
         """
 
-        with sqlite3.connect(DB_PATH) as conn:
+        with connect(DB_PATH) as conn:
             conn.execute(query, params)
             conn.commit()
 
@@ -774,15 +1015,15 @@ def delete_queue_item(queue_id: int):
     logger.info(f"[delete_queue_item API] /delete-queue/{queue_id} endpoint called. Deleting queue item {queue_id}.\n\n")
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with connect(DB_PATH) as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM call_queue WHERE call_id = ?", (queue_id,))
             if cursor.rowcount == 0:
                 raise HTTPException(status_code=404, detail="Queue item not found")
             conn.commit()
 
-        # Trigger background process to handle next call
-        threading.Thread(target=process_queue_single_run, daemon=True).start()
+        # Wake the dispatcher to handle next call
+        dispatcher.wake("queue-item-deleted")
 
         return {"message": f"Queue item {queue_id} deleted successfully."}
 
@@ -797,7 +1038,7 @@ def delete_all_queue():
     logger.info("[delete_all_queue API] /delete-all-queue endpoint called. Deleting all queue items.\n\n")
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with connect(DB_PATH) as conn:
             conn.execute("DELETE FROM call_queue")
             conn.commit()
 
@@ -812,7 +1053,7 @@ def delete_customer_data_queue():
     logger.info("[delete_customer_data_queue API] /delete-customer-data-queue endpoint called. Deleting all customer data.\n\n")
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with connect(DB_PATH) as conn:
             conn.execute("DELETE FROM customer_data")
             conn.commit()
 
@@ -823,70 +1064,47 @@ def delete_customer_data_queue():
         raise HTTPException(status_code=500, detail="Failed to delete all customer data.")
 
 def cleanup_stuck_calls():
-    logger.info("[cleanup_stuck_calls] Background thread started. Periodically cleaning up stuck calls.\n\n")
+    """
+    Lease heartbeat and reaper. Renews the leases on calls this worker is processing and reclaims calls
+    whose lease expired (crashed worker, or no webhook within CALL_MAX_DURATION_SECONDS), so slots held
+    by dead workers are freed within one lease period. The same beat keeps this worker's ingest jobs alive
+    and fails the ones left behind by a dead worker, and every CACHE_PRUNE_INTERVAL_SECONDS evicts old
+    greeting_cache and call_state rows.
+    """
+    logger.info("[cleanup_stuck_calls] Background thread started. Renewing call leases and reclaiming stuck calls.\n\n")
+    last_pruned = None
 
     while True:
         try:
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT call_id, customer_id, customer_name, created_at
-                    FROM call_queue
-                    WHERE status = 'processing' AND created_at <= datetime('now', '-15 minutes')
-                    ORDER BY created_at ASC
-                    LIMIT 1
-                """)
-                stuck = cursor.fetchone()
-
-                if stuck:
-                    call_id, customer_id, customer_name, called_at = stuck
-                    logger.warning(f"[{call_id}] No response for 15 minutes. Logging and retrying next call.\n\n")
-
-                    pop_call_by_id(call_id)
-
-                    owner_id = "Unknown"
-
-                    # Attempt to fetch owner and lead/contact name
-                    # try:
-                    #     fetch_map = {
-                    #         "lead": fetch_lead_details,
-                    #         "opportunity": fetch_opportunity_details,
-                    #         "contact": fetch_contact_details
-                    #     }
-                    #     if entity_type in fetch_map:
-                    #         data = fetch_map[entity_type](entity_id)
-                    #         owner_id = data.get("OwnerId", "Unknown")
-                    #         lead_name = data.get("Name", lead_name)
-                    # except Exception as fetch_exc:
-                    #     logger.error(f"[{call_id}] Failed to fetch entity details: {fetch_exc}\n\n")
-
-
-                    # Retrieve call_sid for this stuck call if possible
-                    stuck_call_sid = None
-                    with call_id_to_sid_lock:
-                        stuck_call_sid = call_id_to_sid.get(str(call_id))                    
-                    # Get transcript and email from global dict if possible
-                    with email_and_transcript_lock:
-                        stuck_email = None
-                        stuck_transcript = None
-                        if stuck_call_sid and stuck_call_sid in email_and_transcript:
-                            stuck_email = email_and_transcript[stuck_call_sid].get("email", "No email provided")
-                            stuck_transcript = email_and_transcript[stuck_call_sid].get("transcript", None)
-                        else:
-                            stuck_email = "No email provided"
-                            stuck_transcript = None
-
-                    parsed = summarize_conversation_transcript(stuck_transcript)
-                    update_customer_data_notes_and_tasks(call_id=call_id, parsed=parsed, db_path=DB_PATH)
-                    send_meeting_invite(parsed=parsed, customer_name=customer_name, customer_email=stuck_email)
-
-                    # Start next call
-                    threading.Thread(target=process_queue_single_run, daemon=True).start()
+            renew_call_leases()
+            renew_ingest_heartbeats()
+            fail_interrupted_ingest_jobs()
+            requeued, expired = reclaim_expired_leases()
+
+            for call_id, customer_id, customer_name in expired:
+                logger.warning(f"[{call_id}] Lease expired with no attempts left or past the max call duration. Logging and moving to the next call.\n\n")
+
+                # Email and transcript recorded for this call's latest call_sid, if any
+                state = get_call_state(call_id, db_path=DB_PATH) or {}
+                stuck_email = state.get("email") or "No email provided"
+                stuck_transcript = state.get("transcript")
+
+                enqueue_post_call_job(call_id, customer_name, stuck_email, stuck_transcript, correlation_id=state.get("correlation_id"))
+                post_call_workers.wake()
+
+            if requeued or expired:
+                # Start next call(s) in the freed slots
+                dispatcher.wake("lease-reclaimed")
+
+            if last_pruned is None or time.monotonic() - last_pruned >= settings.CACHE_PRUNE_INTERVAL_SECONDS:
+                last_pruned = time.monotonic()
+                prune_greeting_cache(db_path=DB_PATH)
+                prune_call_state(db_path=DB_PATH)
 
         except Exception as e:
             logger.error(f"Error in stuck call cleanup loop: {e}\n\n", exc_info=True)
 
-        time.sleep(60)  # Wait before next check
+        time.sleep(settings.CALL_HEARTBEAT_SECONDS)  # Wait before next heartbeat
 
 # def periodic_queue_processor():
 #     logger.info("[periodic_queue_processor] Background thread started. Periodically processing queue.\n\n")
@@ -899,8 +1117,15 @@ def cleanup_stuck_calls():
 
 #         time.sleep(60)
 
-# Start both background threads at app startup
-# threading.Thread(target=cleanup_stuck_calls, daemon=True, name="StuckCallCleaner").start()
+# Start the background threads at app startup
+dispatcher.start()
+post_call_workers.start()
+greeting_prefetcher.start()
+excel_exporter.start()
+event_broker.start()
+span_exporter.start()
+threading.Thread(target=cleanup_stuck_calls, daemon=True, name="StuckCallCleaner").start()
+threading.Thread(target=reconcile_twilio_statuses, daemon=True, name="TwilioReconciler").start()
 # threading.Thread(target=periodic_queue_processor, daemon=True, name="QueueProcessor").start()
 
 # Periodic thread to poll /excel-status and log notification when Excel file is ready
@@ -0,0 +1,218 @@
+import bisect
+import functools
+import math
+import threading
+import time
+from typing import Callable, Iterator, Sequence
+
+# In-process metrics in the Prometheus text format (served by /metrics). Recording is a lock, a dict lookup and an
+# add; formatting, and the collectors that read SQLite or the components' stats(), only run when /metrics is scraped.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; wide enough for a SQLite write up to a Groq completion or an Excel export
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOCK_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_registry = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list:
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list:
+        with self._lock:
+            values = list(self._values.items())
+        return [("_total", dict(zip(self.labelnames, key)), value) for key, value in sorted(values)]
+
+
+class Histogram(_Metric):
+    """Fixed-bucket distribution per label set; buckets are upper bounds (le) in seconds by default."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, labels)
+
+    def time_iter(self, iterator: Iterator, **labels) -> Iterator:
+        """Passes iterator through, observing the time from the first item until it is exhausted or closed."""
+        started = None
+        try:
+            for item in iterator:
+                if started is None:
+                    started = time.perf_counter()
+                yield item
+        finally:
+            if started is not None:
+                self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> list:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in sorted(values):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+        return False
+
+
+def timed(histogram: Histogram, **labels):
+    """Decorator for async endpoints: observes each call's duration with an extra outcome label (ok/error)."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await func(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                histogram.observe(time.perf_counter() - started, outcome=outcome, **labels)
+        return wrapper
+    return decorate
+
+
+def register_collector(collect: Callable[[], list]):
+    """
+    Adds a scrape-time source. collect() returns (name, type, help, samples) tuples with samples as
+    (labels dict, value) pairs; it runs on every /metrics request, so it should be cheap.
+    """
+    with _registry_lock:
+        _collectors.append(collect)
+
+
+def stats_collector(prefix: str, documentation: str, read_stats: Callable[[], dict]) -> Callable[[], list]:
+    """Collector exposing a component's stats() dict as one untyped sample per numeric key (prefix_key)."""
+    def collect():
+        families = []
+        for key, value in read_stats().items():
+            if isinstance(value, (int, float)) or value is None:
+                families.append((f"{prefix}_{key}", "untyped", f"{documentation} ({key})", [({}, value)]))
+        return families
+    return collect
+
+
+def render_metrics() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+        collectors = list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collect in collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            lines.append(f"# collector {getattr(collect, '__qualname__', collect)} failed: {_escape(e)}")
+            continue
+        for name, type_name, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {type_name}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Shared metrics, recorded where the work happens
+DIAL_ATTEMPTS = Counter("sdr_dial_attempts", "Calls claimed from the queue by dial result.", ("result",))
+CALL_OUTCOMES = Counter("sdr_call_outcomes", "Terminal Twilio call statuses applied to the queue.", ("status",))
+INITIATE_CALL_SECONDS = Histogram("sdr_initiate_call_seconds", "initiate_call duration (greeting fallback plus the outbound call API).", ("outcome",))
+GROQ_REQUEST_SECONDS = Histogram("sdr_groq_request_seconds", "Groq chat completion request latency per attempt.", ("caller", "outcome"))
+GROQ_RATE_LIMIT_WAIT_SECONDS = Histogram("sdr_groq_rate_limit_wait_seconds", "Time spent waiting for Groq rate-limit capacity.", ("caller",))
+GROQ_TOKENS = Counter("sdr_groq_tokens", "Groq tokens reported in completion usage.", ("caller", "kind"))
+WEBHOOK_SECONDS = Histogram("sdr_webhook_seconds", "Webhook handler duration.", ("webhook", "outcome"))
+SQLITE_LOCK_WAIT_SECONDS = Histogram("sdr_sqlite_lock_wait_seconds", "Wait for the SQLite write lock in begin_immediate().", buckets=LOCK_WAIT_BUCKETS)
+EXPORT_SECONDS = Histogram("sdr_export_seconds", "customer_data export duration by kind (background Excel or /export format).", ("kind",))
+CALL_STAGE_SECONDS = Histogram("sdr_call_stage_seconds", "Traced call lifecycle span duration by stage (see tracing.py).", ("stage",))
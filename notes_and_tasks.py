@@ -1,22 +1,117 @@
-import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from groq import Groq
 import json
 import requests
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import dateparser
-import sqlite3
-import pandas as pd
 from datetime import datetime
-from logger_config import logger
+from config import settings
+from logger_config import get_logger
+from db import connect
+from groq_client import chat_completion, PRIORITY_SUMMARY
+from tracing import in_current_trace
+from data_export import EXCEL_COLUMNS, build_export_query, iter_export_rows, write_xlsx
+
+logger = get_logger(__name__)
 
 
 load_dotenv()
 
 # === Configuration ===
-Groq_api_key = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=Groq_api_key)
+# Groq requests go through the shared, rate-limited client in groq_client.py
+
+class PostCallStepError(Exception):
+    """A post-call step failed in a way a retry can fix (Groq unavailable, invite API down); the job is retried."""
+
+
+def summarize_transcript_chunk(chunk, idx, total):
+    """
+    Map step: asks the LLM for the summary/tasks/meeting JSON of one transcript chunk.
+    Returns (parsed dict or None, elapsed seconds).
+    """
+    system_prompt = """You are a helpful assistant that extracts summary and tasks from AI call transcripts. 
+        The conversation transcript is provided by the user.
+        The details of the tasks should be detailed and descriptive. 
+        Make sure to include all tasks mentioned in the conversation chunk.
+        Make sure you **do not** miss any tasks and/or their details.
+        **Do not** take normal conversation where the customer is expressing their requirements as a task. Only take the task if the customer explicitly wants the company to perform an action.
+        from the transcript, you have to summarize the conversation in short.
+        from the transcript, you have to extract the tasks that the customer asks to perform.
+        Only extract tasks that the customer/user explicitly wants the company to perform. Ignore greetings, agent actions, and generic conversational flow.
+        from the transcript, you have to check if the customer wants to schedule a meeting with the owner.
+        if the customer wants to schedule a meeting, you have to return the meeting status as True.
+        if the customer wants to schedule an in-person meeting, you have to return meeting_type_in_person in JSON response with a boolean value True. If the customer does not want to schedule an in-person meeting, you have to return meeting_type_in_person as False.
+        "In-person meeting" means the customer wants to visit a showroom or a store or wants to have a meeting at a physical location.
+        if the customer wants to schedule an in person meeting, then find out the time that the user prefers for the in-person meeting and return it in the JSON response as meeting_time_in_person_raw.
+        if the customer wants to schedule a virtual meeting, you have to return meeting_type_virtual in JSON response with a boolean value True. If the customer does not want to schedule a virtual meeting, you have to return meeting_type_virtual as False.
+        if the customer wants to schedule a virtual meeting, then find out the time that the user prefers for the virtual meeting and return it in the JSON response as meeting_time_virtual_raw.
+        if the customer wants to schedule both a virtual and an in-person meeting, you have to return both meeting_type_in_person and meeting_type_virtual as True. In this case, you have to find out the time that the user prefers for both meetings and return it in the JSON response as meeting_time_in_person_raw and meeting_time_virtual_raw.
+        if the customer does not want to schedule a meeting, you have to return the meeting status as False and also return meeting_type_in_person and meeting_type_virtual as False. In this case, you do not need to return meeting_time_in_person_raw and meeting_time_virtual_raw. Just return them as empty strings. But it is applicable only if the customer does not want to schedule a meeting.
+        if meeting_type_in_person is True, then meeting_time_in_person_raw should not be empty.
+        if meeting_type_virtual is True, then meeting_time_virtual_raw should not be empty.
+        If meeting_type_in_person is False, then meeting_time_in_person_raw should be an empty string.
+        If meeting_type_virtual is False, then meeting_time_virtual_raw should be an empty string.
+        If both meeting_type_in_person and meeting_type_virtual are False, then both meeting_time_in_person_raw and meeting_time_virtual_raw should be empty strings.
+        If both meeting_type_in_person and meeting_type_virtual are True, then both meeting_time_in_person_raw and meeting_time_virtual_raw should contain the respective preferred times.
+        your final JSON response should look like this (this is just an example, do not use these values.):\n\n
+        {
+            "summary": "the detailed summary of the conversation",
+            "tasks": 1. Get the product details , 2. Call Tom , ...,
+            "meeting_schedule_is_true": true/false,
+            "meeting_type_in_person": true/false,
+            "meeting_type_virtual": true/false,
+            "meeting_time_in_person_raw": "in person raw meeting time as string",
+            "meeting_time_virtual_raw": "virtual meeting time as string"
+        }
+        Make sure to return the JSON response in a single line without any extra spaces or newlines.
+        Do not return any other text or explanation. Just return the JSON response as it is.
+        Do not return ````json`` or any other formatting. Just return the JSON response as it is."""
+
+    messages = [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user",
+            "content": f"""Here is the conversation transcript chunk {idx+1}/{total}:\n\n
+                f"{chunk}\n\n
+                "Please extract any summary,tasks, meeting_schedule_is_true, meeting_time and meeting_type mentioned by the customer in this conversation transcript chunk.
+                "Only return valid JSON.
+                            """
+        }
+    ]
+
+    started = time.perf_counter()
+    try:
+        logger.info(f"[summarize_conversation_transcript] Summarizing chunk {idx+1}/{total}.\n\n")
+        response = chat_completion(
+            messages=messages,
+            model="llama-3.3-70b-versatile",
+            priority=PRIORITY_SUMMARY,
+            caller="summarize_conversation_transcript"
+        )
+        logger.info("[summarize_conversation_transcript] Received response from LLM.\n\n")
+        content = response.choices[0].message.content.strip()
+        logger.debug("[summarize_conversation_transcript] Raw content from LLM: %s", content)
+        if not content.startswith('{') or not content.endswith('}'):
+            logger.error("[summarize_conversation_transcript] Response content is not a valid JSON object.\n\n")
+            return None, time.perf_counter() - started
+        content = content.replace("\n", "").replace("\t", "")
+        content = content.replace("True", "true").replace("False", "false")
+        parsed = json.loads(content)
+        logger.debug("[summarize_conversation_transcript] Parsed JSON (chunk %d): %s", idx + 1, parsed)
+        return parsed, time.perf_counter() - started
+
+    except json.JSONDecodeError as e:
+        logger.error(f"[summarize_conversation_transcript] JSON decoding failed for chunk {idx+1}: {e}\n\n")
+    except Exception as e:
+        logger.error(f"[summarize_conversation_transcript] Unexpected error in chunk {idx+1}: {e}\n\n")
+    return None, time.perf_counter() - started
+
 
 def summarize_conversation_transcript(conversation_transcript):
      # Handle case where transcript is a list of dicts (preserve roles/messages)
@@ -27,7 +122,7 @@ def summarize_conversation_transcript(conversation_transcript):
                     message = turn.get("message", "")
                     formatted_transcript.append(f"{role}: {message}")
                 conversation_transcript = "\n".join(formatted_transcript)
-    print("Formatted Transcript:", conversation_transcript)  # Debugging line    
+    logger.debug("[summarize_conversation_transcript] Formatted transcript: %s", conversation_transcript)
    
     if not conversation_transcript or not isinstance(conversation_transcript, str):
         logger.error("[summarize_conversation_transcript] Conversation transcript is empty or None.")
@@ -54,6 +149,17 @@ def summarize_conversation_transcript(conversation_transcript):
     chunks = chunk_text(conversation_transcript, chunk_size=1000, overlap=100)
     logger.info(f"[summarize_conversation_transcript] Split transcript into {len(chunks)} chunks.\n\n")
 
+    # Map: summarize chunks concurrently (bounded), then reduce in chunk order so the result is deterministic
+    started = time.perf_counter()
+    workers = max(1, min(settings.SUMMARY_MAX_CONCURRENCY, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarize") as pool:
+        results = list(pool.map(in_current_trace(summarize_transcript_chunk), chunks, range(len(chunks)), [len(chunks)] * len(chunks)))
+    chunk_timings = [round(elapsed, 3) for _, elapsed in results]
+    logger.info(f"[summarize_conversation_transcript] {len(chunks)} chunk(s) summarized in {time.perf_counter() - started:.2f}s wall time with {workers} worker(s); per-chunk seconds: {chunk_timings}\n\n")
+    # Nothing usable came back (e.g. a Groq outage): fail so the post-call job retries instead of storing an empty summary
+    if all(parsed is None for parsed, _ in results):
+        raise PostCallStepError(f"All {len(chunks)} transcript chunk(s) failed to summarize.")
+
     all_summaries = []
     all_tasks = []
     meeting_schedule_is_true = False
@@ -62,100 +168,26 @@ def summarize_conversation_transcript(conversation_transcript):
     meeting_time_in_person_raw = ""
     meeting_time_virtual_raw = ""
 
-    for idx, chunk in enumerate(chunks):
-        system_prompt = """You are a helpful assistant that extracts summary and tasks from AI call transcripts. 
-        The conversation transcript is provided by the user.
-        The details of the tasks should be detailed and descriptive. 
-        Make sure to include all tasks mentioned in the conversation chunk.
-        Make sure you **do not** miss any tasks and/or their details.
-        **Do not** take normal conversation where the customer is expressing their requirements as a task. Only take the task if the customer explicitly wants the company to perform an action.
-        from the transcript, you have to summarize the conversation in short.
-        from the transcript, you have to extract the tasks that the customer asks to perform.
-        Only extract tasks that the customer/user explicitly wants the company to perform. Ignore greetings, agent actions, and generic conversational flow.
-        from the transcript, you have to check if the customer wants to schedule a meeting with the owner.
-        if the customer wants to schedule a meeting, you have to return the meeting status as True.
-        if the customer wants to schedule an in-person meeting, you have to return meeting_type_in_person in JSON response with a boolean value True. If the customer does not want to schedule an in-person meeting, you have to return meeting_type_in_person as False.
-        "In-person meeting" means the customer wants to visit a showroom or a store or wants to have a meeting at a physical location.
-        if the customer wants to schedule an in person meeting, then find out the time that the user prefers for the in-person meeting and return it in the JSON response as meeting_time_in_person_raw.
-        if the customer wants to schedule a virtual meeting, you have to return meeting_type_virtual in JSON response with a boolean value True. If the customer does not want to schedule a virtual meeting, you have to return meeting_type_virtual as False.
-        if the customer wants to schedule a virtual meeting, then find out the time that the user prefers for the virtual meeting and return it in the JSON response as meeting_time_virtual_raw.
-        if the customer wants to schedule both a virtual and an in-person meeting, you have to return both meeting_type_in_person and meeting_type_virtual as True. In this case, you have to find out the time that the user prefers for both meetings and return it in the JSON response as meeting_time_in_person_raw and meeting_time_virtual_raw.
-        if the customer does not want to schedule a meeting, you have to return the meeting status as False and also return meeting_type_in_person and meeting_type_virtual as False. In this case, you do not need to return meeting_time_in_person_raw and meeting_time_virtual_raw. Just return them as empty strings. But it is applicable only if the customer does not want to schedule a meeting.
-        if meeting_type_in_person is True, then meeting_time_in_person_raw should not be empty.
-        if meeting_type_virtual is True, then meeting_time_virtual_raw should not be empty.
-        If meeting_type_in_person is False, then meeting_time_in_person_raw should be an empty string.
-        If meeting_type_virtual is False, then meeting_time_virtual_raw should be an empty string.
-        If both meeting_type_in_person and meeting_type_virtual are False, then both meeting_time_in_person_raw and meeting_time_virtual_raw should be empty strings.
-        If both meeting_type_in_person and meeting_type_virtual are True, then both meeting_time_in_person_raw and meeting_time_virtual_raw should contain the respective preferred times.
-        your final JSON response should look like this (this is just an example, do not use these values.):\n\n
-        {
-            "summary": "the detailed summary of the conversation",
-            "tasks": 1. Get the product details , 2. Call Tom , ...,
-            "meeting_schedule_is_true": true/false,
-            "meeting_type_in_person": true/false,
-            "meeting_type_virtual": true/false,
-            "meeting_time_in_person_raw": "in person raw meeting time as string",
-            "meeting_time_virtual_raw": "virtual meeting time as string"
-        }
-        Make sure to return the JSON response in a single line without any extra spaces or newlines.
-        Do not return any other text or explanation. Just return the JSON response as it is.
-        Do not return ````json`` or any other formatting. Just return the JSON response as it is."""
-
-        messages = [
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user",
-                "content": f"""Here is the conversation transcript chunk {idx+1}/{len(chunks)}:\n\n
-                    f"{chunk}\n\n
-                    "Please extract any summary,tasks, meeting_schedule_is_true, meeting_time and meeting_type mentioned by the customer in this conversation transcript chunk.
-                    "Only return valid JSON.
-                                """
-            }
-        ]
-
-        try:
-            logger.info(f"[summarize_conversation_transcript] Summarizing chunk {idx+1}/{len(chunks)}.\n\n")
-            response = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=messages,
-            )
-            logger.info("[summarize_conversation_transcript] Received response from LLM.\n\n")
-            content = response.choices[0].message.content.strip()
-            logger.info(f"[summarize_conversation_transcript] Raw content from LLM: {content}\n\n")
-            if not content.startswith('{') or not content.endswith('}'):
-                logger.error("[summarize_conversation_transcript] Response content is not a valid JSON object.\n\n")
-                continue
-            content = content.replace("\n", "").replace("\t", "")
-            content = content.replace("True", "true").replace("False", "false")
-            parsed = json.loads(content)
-            logger.info(f"[summarize_conversation_transcript] Parsed JSON (chunk {idx+1}): {parsed}\n\n")
-
-            # Collect summaries and tasks
-            if "summary" in parsed:
-                all_summaries.append(parsed["summary"])
-            if "tasks" in parsed:
-                all_tasks.append(str(parsed["tasks"]))
-
-            # Merge meeting info if found in any chunk
-            if parsed.get("meeting_schedule_is_true", False):
-                meeting_schedule_is_true = True
-            if parsed.get("meeting_type_in_person", False):
-                meeting_type_in_person = True
-                meeting_time_in_person_raw = parsed.get("meeting_time_in_person_raw", "")
-            if parsed.get("meeting_type_virtual", False):
-                meeting_type_virtual = True
-                meeting_time_virtual_raw = parsed.get("meeting_time_virtual_raw", "")
-
-        except json.JSONDecodeError as e:
-            logger.error(f"[summarize_conversation_transcript] JSON decoding failed for chunk {idx+1}: {e}\n\n")
-            continue
-        except Exception as e:
-            logger.error(f"[summarize_conversation_transcript] Unexpected error in chunk {idx+1}: {e}\n\n")
+    for parsed, _ in results:
+        if parsed is None:
             continue
 
+        # Collect summaries and tasks
+        if "summary" in parsed:
+            all_summaries.append(parsed["summary"])
+        if "tasks" in parsed:
+            all_tasks.append(str(parsed["tasks"]))
+
+        # Merge meeting info if found in any chunk
+        if parsed.get("meeting_schedule_is_true", False):
+            meeting_schedule_is_true = True
+        if parsed.get("meeting_type_in_person", False):
+            meeting_type_in_person = True
+            meeting_time_in_person_raw = parsed.get("meeting_time_in_person_raw", "")
+        if parsed.get("meeting_type_virtual", False):
+            meeting_type_virtual = True
+            meeting_time_virtual_raw = parsed.get("meeting_time_virtual_raw", "")
+
     # Combine all summaries
     combined_summary = "\n".join(all_summaries)
 
@@ -182,64 +214,82 @@ def summarize_conversation_transcript(conversation_transcript):
         "meeting_time_in_person_raw": meeting_time_in_person_raw,
         "meeting_time_virtual_raw": meeting_time_virtual_raw
     }
-    logger.info(f"[summarize_conversation_transcript] Final combined output: {final_parsed_result}\n\n")
+    logger.debug("[summarize_conversation_transcript] Final combined output: %s", final_parsed_result)
     return final_parsed_result
 
 
-def update_customer_data_notes_and_tasks(call_id, parsed, db_path="queue.db"):
+def update_customer_data_notes_and_tasks(call_id, parsed, db_path="queue.db", status=None, transcript=None, post_call_job_id=None):
     """
-    Appends new notes and tasks (with timestamp) to the existing notes and tasks columns for a given call_id in customer_data.
+    Appends the outcome of one call (timestamped summary and tasks, status, zlib-compressed transcript) to
+    call_events. Nothing is read back or rewritten, so the cost is independent of the customer's history and
+    concurrent calls cannot overwrite each other. customer_data_with_history renders the notes/tasks columns.
+    A post_call_job_id is recorded once, so a retried post-call job does not append twice.
     """
     if not parsed:
         logger.warning(f"[update_customer_data_notes_and_tasks] No valid parsed data available for call_id: {call_id}\n\n")
-        
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("SELECT notes, tasks FROM customer_data WHERE call_id = ?", (call_id,))
-        row = c.fetchone()
-        if row:
-            existing_notes, existing_tasks = row
-            new_notes = "No summary available. Conversation transcript missing."
-            new_tasks = "No tasks found for this call."
-            updated_notes = (existing_notes or "") + f"\n[{timestamp}] " + (new_notes or "")
-            updated_tasks = (existing_tasks or "") + f"\n[{timestamp}] " + (new_tasks or "")
-            c.execute("UPDATE customer_data SET notes = ?, tasks = ? WHERE call_id = ?", (updated_notes, updated_tasks, call_id))
-            conn.commit()
+        summary = "No summary available. Conversation transcript missing."
+        tasks = "No tasks found for this call."
+    else:
+        summary = parsed.get("summary", "No summary available.")
+        tasks = parsed.get("tasks", "No tasks found for this call.")
+
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    compressed = zlib.compress(json.dumps(transcript).encode("utf-8")) if transcript is not None else None
+    conn = connect(db_path)
+    try:
+        conn.execute(
+            """INSERT OR IGNORE INTO call_events (call_id, created_at, status, summary, tasks, transcript, post_call_job_id)
+               SELECT ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM customer_data WHERE call_id = ?)""",
+            (call_id, timestamp, status, summary, tasks, compressed, post_call_job_id, call_id)
+        )
+        conn.commit()
+    finally:
         conn.close()
 
-    if parsed:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("SELECT notes, tasks FROM customer_data WHERE call_id = ?", (call_id,))
-        row = c.fetchone()
-        if row:
-            existing_notes, existing_tasks = row
-            new_notes = parsed.get("summary", "No summary available.")
-            new_tasks = parsed.get("tasks", "No tasks found for this call.")
-            updated_notes = (existing_notes or "") + f"\n[{timestamp}] " + (new_notes or "")
-            updated_tasks = (existing_tasks or "") + f"\n[{timestamp}] " + (new_tasks or "")
-            c.execute("UPDATE customer_data SET notes = ?, tasks = ? WHERE call_id = ?", (updated_notes, updated_tasks, call_id))
-            conn.commit()
+
+def get_call_history(call_id, db_path="queue.db", limit=None) -> list:
+    """Call events for call_id, newest first, with transcripts decompressed."""
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            """SELECT event_id, created_at, status, summary, tasks, transcript FROM call_events
+               WHERE call_id = ? ORDER BY event_id DESC LIMIT ?""",
+            (call_id, limit if limit is not None else -1)
+        ).fetchall()
+    finally:
         conn.close()
+    return [
+        {
+            "event_id": event_id,
+            "created_at": created_at,
+            "status": status,
+            "summary": summary,
+            "tasks": tasks,
+            "transcript": json.loads(zlib.decompress(transcript)) if transcript else None,
+        }
+        for event_id, created_at, status, summary, tasks, transcript in rows
+    ]
 
 def export_customer_data_to_excel(db_path="queue.db", excel_path="resultant_excel.xlsx"):
     """
     Exports the entire customer_data table to resultant_excel.xlsx.
     Use this after all calls are processed to get the final Excel.
+    Rows are streamed from the cursor into a write-only workbook, so memory stays flat for large campaigns.
     """
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query("SELECT * FROM customer_data", conn)
-    df.to_excel(excel_path, index=False)
-    conn.commit()
-    conn.close()
+    columns, where, params = build_export_query(columns=EXCEL_COLUMNS)
+    rows = write_xlsx(excel_path, columns, iter_export_rows(columns, where, params, db_path=db_path))
+    logger.info(f"[export_customer_data_to_excel] Exported {rows} rows to {excel_path}.\n\n")
 
 
-def send_meeting_invite(parsed, customer_name, customer_email):
+def send_meeting_invite(parsed, customer_name, customer_email, already_sent=(), on_sent=None):
     """
     Sends a meeting invite based on the parsed data.
+    Invite types in already_sent ("in_person", "virtual") are skipped, and on_sent(type) is called after each
+    invite goes out, so a retried post-call job never sends the same invite twice.
+    Raises PostCallStepError if an invite request failed, so the post-call job is retried; a meeting time that
+    cannot be parsed is only logged, since retrying would not change it.
     """
+    failed_invites = []
     meeting_status = parsed.get("meeting_schedule_is_true", False)
     logger.info(f"[log_data] Meeting status: {meeting_status}\n\n")
     meeting_status_in_person = parsed.get("meeting_type_in_person", False)
@@ -255,7 +305,10 @@ def send_meeting_invite(parsed, customer_name, customer_email):
         logger.info(f"[log_data] Meeting status - In-person: {meeting_status_in_person}, Virtual: {meeting_status_virtual}\n\n")
 
         # Handle in-person meeting invite
-        if meeting_status_in_person is True:
+        if meeting_status_in_person is True and "in_person" in already_sent:
+            logger.info("[send_meeting_invite] In-person invite already sent on an earlier attempt.\n\n")
+        elif meeting_status_in_person is True:
+            sent_invite = None
             try:
                 raw_meeting_time_in_person = parsed.get("meeting_time_in_person_raw", "")
                 logger.info(f"[log_data] Raw in-person meeting time: {raw_meeting_time_in_person}\n\n")
@@ -288,17 +341,25 @@ def send_meeting_invite(parsed, customer_name, customer_email):
                             "start_time": meeting_time_in_person,
                             "duration_minutes": 30,
                             "meeting_type": "in_person"
-                        }
+                        },
+                        timeout=settings.MEETING_INVITE_TIMEOUT_SECONDS
                     )
                     response.raise_for_status()  # Raise an error for bad responses
                     logger.info("[log_data] In-person calendar invite sent successfully.\n\n")
+                    sent_invite = "in_person"
                 else:
                     logger.error(f"[send_meeting_invite] Could not parse in-person meeting time: '{raw_meeting_time_in_person}'")
             except Exception as e:
                 logger.error(f"[send_meeting_invite] Error sending in-person meeting invite: {e}")
+                failed_invites.append("in_person")
+            if sent_invite and on_sent:
+                on_sent(sent_invite)
 
         # Handle virtual meeting invite
-        if meeting_status_virtual is True:
+        if meeting_status_virtual is True and "virtual" in already_sent:
+            logger.info("[send_meeting_invite] Virtual invite already sent on an earlier attempt.\n\n")
+        elif meeting_status_virtual is True:
+            sent_invite = None
             try:
                 raw_meeting_time_virtual = parsed.get("meeting_time_virtual_raw", "No virtual meeting time provided")
                 logger.info(f"[log_data] Raw virtual meeting time: {raw_meeting_time_virtual}\n\n")
@@ -328,18 +389,26 @@ def send_meeting_invite(parsed, customer_name, customer_email):
                             "start_time": meeting_time_virtual,
                             "duration_minutes": 30,
                             "meeting_type": "virtual"
-                        }
+                        },
+                        timeout=settings.MEETING_INVITE_TIMEOUT_SECONDS
                     )
                     response.raise_for_status()  # Raise an error for bad responses
                     logger.info("[log_data] Virtual calendar invite sent successfully.\n\n")
+                    sent_invite = "virtual"
                 else:
                     logger.error(f"[send_meeting_invite] Could not parse virtual meeting time: '{raw_meeting_time_virtual}'")
             except Exception as e:
                 logger.error(f"[send_meeting_invite] Error sending virtual meeting invite: {e}")
+                failed_invites.append("virtual")
+            if sent_invite and on_sent:
+                on_sent(sent_invite)
 
         else:
             logger.info("[log_data] No meeting scheduled.\n\n")
             meeting_time_in_person = ""
             meeting_time_virtual = ""
 
-        logger.info("[log_data] logger call to Salesforce.\n\n")
\ No newline at end of file
+        logger.info("[log_data] logger call to Salesforce.\n\n")
+
+    if failed_invites:
+        raise PostCallStepError(f"Meeting invite request failed: {', '.join(failed_invites)}.")
\ No newline at end of file
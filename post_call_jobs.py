@@ -0,0 +1,242 @@
+import json
+import sqlite3
+import threading
+from typing import Optional
+from config import settings
+from logger_config import get_logger
+from db import connect, begin_immediate
+from helperfuncs import DB_PATH, WORKER_ID, register_query_plan_check
+from notes_and_tasks import (
+    summarize_conversation_transcript,
+    update_customer_data_notes_and_tasks,
+    send_meeting_invite
+)
+from tracing import span
+
+logger = get_logger(__name__)
+
+
+class PostCallLeaseLost(Exception):
+    """The job's lease expired and another worker re-claimed it; this worker must stop without completing it."""
+
+
+def enqueue_post_call_job(call_id, customer_name, customer_email, transcript, correlation_id: Optional[str] = None) -> int:
+    """
+    Persists the post-call work for a finished call in post_call_jobs and returns the job_id.
+    The transcript is stored as JSON so list-of-turns transcripts keep their roles; correlation_id carries the
+    call's trace over to the worker.
+    """
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO post_call_jobs (call_id, customer_name, customer_email, transcript, correlation_id, updated_at) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            (call_id, customer_name, customer_email, json.dumps(transcript), correlation_id)
+        )
+        conn.commit()
+        logger.info(f"[enqueue_post_call_job] Queued post-call job {c.lastrowid} for call_id {call_id}.\n\n")
+        return c.lastrowid
+    finally:
+        conn.close()
+
+
+# Claims the next due job (queued, or running with an expired lock). Params: worker_id, lease modifier
+CLAIM_POST_CALL_JOB_SQL = """
+    UPDATE post_call_jobs
+    SET status = 'running',
+        worker_id = ?,
+        locked_until = datetime('now', ?),
+        attempts = attempts + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE job_id = (
+        SELECT job_id FROM post_call_jobs
+        WHERE (status = 'queued' AND next_run_at <= datetime('now'))
+           OR (status = 'running' AND locked_until < datetime('now'))
+        ORDER BY next_run_at ASC, job_id ASC
+        LIMIT 1
+    )
+    RETURNING job_id, call_id, customer_name, customer_email, transcript, attempts, correlation_id, summary, invites_sent
+"""
+# The two status branches are read from the index separately, so the claim may sort the (few) due jobs
+register_query_plan_check("post-call job claim", CLAIM_POST_CALL_JOB_SQL, ("", ""), sort_allowed=True)
+
+
+def claim_post_call_job(worker_id: str = WORKER_ID) -> Optional[dict]:
+    """
+    Claims the next due job (queued, or running with an expired lock) for worker_id.
+    """
+    conn = connect(DB_PATH, isolation_level=None)
+    try:
+        c = conn.cursor()
+        begin_immediate(c)
+        c.execute(CLAIM_POST_CALL_JOB_SQL, (worker_id, f"+{settings.POST_CALL_JOB_LEASE_SECONDS} seconds"))
+        row = c.fetchone()
+        c.execute("COMMIT")
+    except sqlite3.Error as e:
+        logger.error(f"[claim_post_call_job] Error claiming post-call job: {e}", exc_info=True)
+        if conn.in_transaction:
+            conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+    if not row:
+        return None
+    job_id, call_id, customer_name, customer_email, transcript, attempts, correlation_id, summary, invites_sent = row
+    return {
+        "job_id": job_id,
+        "call_id": call_id,
+        "customer_name": customer_name,
+        "customer_email": customer_email,
+        "transcript": json.loads(transcript) if transcript else None,
+        "attempts": attempts,
+        "correlation_id": correlation_id,
+        "summary": json.loads(summary) if summary else None,
+        "invites_sent": json.loads(invites_sent) if invites_sent else [],
+    }
+
+
+def save_post_call_progress(job_id: int, summary: Optional[dict] = None, invites_sent: Optional[list] = None, worker_id: str = WORKER_ID):
+    """
+    Records a finished step (the parsed summary, the invites sent so far) on the job row and renews its lease.
+    Raises PostCallLeaseLost if worker_id no longer holds the job.
+    """
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(
+            """UPDATE post_call_jobs
+               SET summary = COALESCE(?, summary),
+                   invites_sent = COALESCE(?, invites_sent),
+                   locked_until = datetime('now', ?),
+                   updated_at = CURRENT_TIMESTAMP
+               WHERE job_id = ? AND status = 'running' AND worker_id = ?""",
+            (
+                json.dumps(summary) if summary is not None else None,
+                json.dumps(invites_sent) if invites_sent is not None else None,
+                f"+{settings.POST_CALL_JOB_LEASE_SECONDS} seconds",
+                job_id,
+                worker_id
+            )
+        )
+        conn.commit()
+        if c.rowcount == 0:
+            raise PostCallLeaseLost(f"Post-call job {job_id} is no longer held by {worker_id}.")
+    finally:
+        conn.close()
+
+
+def complete_post_call_job(job_id: int):
+    conn = connect(DB_PATH)
+    try:
+        conn.execute(
+            "UPDATE post_call_jobs SET status = 'done', locked_until = NULL, last_error = NULL, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (job_id,)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def fail_post_call_job(job_id: int, attempts: int, error: str):
+    """Schedules a retry with exponential backoff, or marks the job failed once attempts are exhausted."""
+    conn = connect(DB_PATH)
+    try:
+        if attempts >= settings.POST_CALL_MAX_ATTEMPTS:
+            logger.error(f"[fail_post_call_job] Job {job_id} failed after {attempts} attempts: {error}\n\n")
+            conn.execute(
+                "UPDATE post_call_jobs SET status = 'failed', locked_until = NULL, last_error = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                (error, job_id)
+            )
+        else:
+            delay = settings.POST_CALL_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            logger.warning(f"[fail_post_call_job] Job {job_id} attempt {attempts} failed: {error}. Retrying in {delay} seconds.\n\n")
+            conn.execute(
+                """UPDATE post_call_jobs
+                   SET status = 'queued', locked_until = NULL, last_error = ?, next_run_at = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                   WHERE job_id = ?""",
+                (error, f"+{delay} seconds", job_id)
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_post_call_job(job: dict):
+    """
+    Summarizes the transcript, appends notes/tasks and sends any meeting invite for one finished call.
+    A retry reuses the summary saved by an earlier attempt and skips invites already sent; saving each step
+    also renews the job's lease. Each stage is a span of the call's trace (jobs enqueued without a
+    correlation_id are not traced).
+    """
+    with span("call.post_call", job.get("correlation_id"), call_id=job["call_id"], job_id=job["job_id"], attempt=job["attempts"]):
+        parsed = job.get("summary")
+        if parsed is None:
+            with span("call.summary"):
+                parsed = summarize_conversation_transcript(job["transcript"])
+            save_post_call_progress(job["job_id"], summary=parsed)
+        with span("call.notes"):
+            update_customer_data_notes_and_tasks(
+                call_id=job["call_id"],
+                parsed=parsed,
+                db_path=DB_PATH,
+                status="completed",
+                transcript=job["transcript"],
+                post_call_job_id=job["job_id"]
+            )
+        invites_sent = list(job.get("invites_sent") or [])
+
+        def record_invite(kind: str):
+            invites_sent.append(kind)
+            save_post_call_progress(job["job_id"], invites_sent=invites_sent)
+
+        with span("call.invite"):
+            send_meeting_invite(
+                parsed=parsed,
+                customer_name=job["customer_name"],
+                customer_email=job["customer_email"],
+                already_sent=invites_sent,
+                on_sent=record_invite
+            )
+
+
+class PostCallWorkerPool:
+    """
+    Bounded pool of threads that drain post_call_jobs. wake() is called after enqueueing; the workers also
+    poll every POST_CALL_POLL_SECONDS to pick up retries and jobs enqueued by other processes.
+    """
+
+    def __init__(self, workers: int, name: str = "PostCallWorker"):
+        self._workers = max(1, workers)
+        self._name = name
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._run, daemon=True, name=f"{self._name}-{i}")
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"[{self._name}] Started {self._workers} post-call worker(s).\n\n")
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            job = claim_post_call_job()
+            if job is None:
+                self._wakeup.wait(timeout=settings.POST_CALL_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            logger.info(f"[{self._name}] Processing post-call job {job['job_id']} for call_id {job['call_id']} (attempt {job['attempts']}).\n\n")
+            try:
+                run_post_call_job(job)
+                complete_post_call_job(job["job_id"])
+            except PostCallLeaseLost as e:
+                logger.warning(f"[{self._name}] {e} Leaving it to the worker that re-claimed it.\n\n")
+            except Exception as e:
+                logger.error(f"[{self._name}] Post-call job {job['job_id']} raised: {e}\n\n", exc_info=True)
+                fail_post_call_job(job["job_id"], job["attempts"], str(e))
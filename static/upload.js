@@ -27,6 +27,7 @@ async function checkAuthentication() {
 
 const UPLOAD_URL = "/upload-file";  // Upload file to temp location
 const DOWNLOAD_URL = "/download-excel";
+let currentUploadId = null;  // upload_id returned by /upload-file, passed to /add-call
 
 
 async function uploadFile() {
@@ -63,6 +64,7 @@ async function uploadFile() {
         }
 
         const result = await response.json();
+        currentUploadId = result.upload_id;
         fileDetails.innerHTML = `<strong style="color: green;">✅ File uploaded:</strong><br>${result.message}`;
 
         // Enable the start button
@@ -135,14 +137,21 @@ async function logout() {
         window.location.href = "/";
     }
 }
-async function startCallProcessing() {
-    console.log("Start Call Processing clicked"); // 👈 ADD THIS
+const INGEST_POLL_MS = 1000;
+
+async function startCallProcessing(force = false) {
+    console.log("Start Call Processing clicked");
     const fileDetails = document.getElementById("fileDetails");
 
     try {
         fileDetails.innerHTML += '<br><span style="color: blue;">Processing file...</span>';
 
-        const response = await fetch("/add-call", {
+        // force=true re-imports content that an earlier job already processed (e.g. after the data was cleared)
+        const params = new URLSearchParams();
+        if (currentUploadId) params.set('upload_id', currentUploadId);
+        if (force) params.set('force', 'true');
+        const addCallUrl = params.toString() ? `/add-call?${params}` : "/add-call";
+        const response = await fetch(addCallUrl, {
             method: "POST",
             credentials: 'include'
         });
@@ -155,13 +164,57 @@ async function startCallProcessing() {
         }
 
         const result = await response.json();
-        fileDetails.innerHTML += `<br><strong style="color: green;">✅ Processing complete:</strong><br>${result.message}`;
+        if (result.duplicate) {
+            fileDetails.innerHTML += `<br><span style="color: orange;">${result.message}</span> `
+                + `<button type="button" onclick="startCallProcessing(true)">Re-import anyway</button>`;
+            return;
+        }
+        const progress = document.createElement('span');
+        fileDetails.appendChild(document.createElement('br'));
+        fileDetails.appendChild(progress);
+        pollIngestJob(result.job_id, progress);
     } catch (err) {
         console.error("Processing error:", err);
         fileDetails.innerHTML += '<br><span style="color: red;">Error processing file! Check console for details.</span>';
     }
 }
 
+async function pollIngestJob(jobId, progress) {
+    try {
+        const response = await fetch(`/ingest-jobs/${jobId}`, { credentials: 'include' });
+        if (!response.ok) {
+            progress.innerHTML = `<span style="color: red;">Could not read processing status: ${response.status}</span>`;
+            return;
+        }
+        const job = await response.json();
+        const counts = `${job.rows_parsed} rows processed, ${job.rows_inserted} new, ${job.rows_updated} updated, `
+            + `${job.rows_unchanged} unchanged, ${job.rows_skipped} skipped`;
+
+        if (job.status === 'completed') {
+            progress.innerHTML = `<strong style="color: green;">✅ Processing complete:</strong><br>${counts}.`;
+        } else if (job.status === 'cancelled') {
+            progress.innerHTML = `<span style="color: orange;">Processing cancelled after ${counts}.</span>`;
+        } else if (job.status === 'failed') {
+            progress.innerHTML = `<span style="color: red;">Processing failed: ${job.error || 'unknown error'}</span>`;
+        } else {
+            progress.innerHTML = `<span style="color: blue;">Processing... ${counts} (${Math.round(job.rows_per_second)} rows/s)</span> `
+                + `<button type="button" onclick="cancelIngestJob('${jobId}')">Cancel</button>`;
+            setTimeout(() => pollIngestJob(jobId, progress), INGEST_POLL_MS);
+        }
+    } catch (err) {
+        console.error("Progress poll error:", err);
+        setTimeout(() => pollIngestJob(jobId, progress), INGEST_POLL_MS);
+    }
+}
+
+async function cancelIngestJob(jobId) {
+    try {
+        await fetch(`/ingest-jobs/${jobId}/cancel`, { method: "POST", credentials: 'include' });
+    } catch (err) {
+        console.error("Cancel error:", err);
+    }
+}
+
 
 document.addEventListener('DOMContentLoaded', function () {
     checkAuthentication();
@@ -173,30 +226,5 @@ document.addEventListener('DOMContentLoaded', function () {
     fileInput.addEventListener('change', uploadFile);
 
     // Handle processing click
-    callBtn.addEventListener('click', async function () {
-        const fileDetails = document.getElementById("fileDetails");
-        console.log("Start Call Processing clicked");
-
-        try {
-            fileDetails.innerHTML += '<br><span style="color: blue;">Processing file...</span>';
-
-            const response = await fetch("/add-call", {
-                method: "POST",
-                credentials: 'include'
-            });
-
-            if (!response.ok) {
-                const errorText = await response.text();
-                console.error("Processing failed:", errorText);
-                fileDetails.innerHTML += `<br><span style="color: red;">Processing failed: ${response.status} - ${errorText}</span>`;
-                return;
-            }
-
-            const result = await response.json();
-            fileDetails.innerHTML += `<br><strong style="color: green;">✅ Processing complete:</strong><br>${result.message}`;
-        } catch (err) {
-            console.error("Processing error:", err);
-            fileDetails.innerHTML += '<br><span style="color: red;">Error processing file! Check console for details.</span>';
-        }
-    });
+    callBtn.addEventListener('click', () => startCallProcessing());
 });
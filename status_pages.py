@@ -0,0 +1,159 @@
+import hashlib
+import json
+from typing import Optional, Sequence
+from config import settings
+from db import connect
+from helperfuncs import DB_PATH, register_query_plan_check
+from data_export import timestamp_bound
+
+# Dashboard views: response field -> column, the fields returned when none are asked for, and the columns
+# the status/date filters apply to. call_id is always returned because it is the page cursor.
+STATUS_VIEWS = {
+    "call_queue": {
+        "fields": {
+            "call_id": "call_id", "customer_id": "customer_id", "customer_name": "customer_name", "phone": "phone_number",
+            "email": "email", "status": "status", "created_at": "created_at", "called_at": "called_at",
+            "attempts": "attempts", "twilio_status": "twilio_status",
+        },
+        "default_fields": ("call_id", "customer_id", "customer_name", "phone", "email", "status", "created_at"),
+        "status_column": "status",
+        "date_column": "created_at",
+    },
+    "customer_data": {
+        "fields": {
+            "call_id": "call_id", "customer_id": "customer_id", "customer_name": "customer_name", "phone": "phone_number",
+            "email": "email", "country_code": "country_code", "last_call_status": "last_call_status",
+            "company_name": "company_name", "industry": "industry", "location": "location", "updated_at": "updated_at",
+        },
+        "default_fields": ("call_id", "customer_id", "customer_name", "phone", "email", "country_code"),
+        "status_column": "last_call_status",
+        "date_column": "updated_at",
+    },
+}
+
+
+def build_status_query(
+    view: str,
+    fields: Optional[Sequence[str]] = None,
+    statuses: Optional[Sequence[str]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+) -> dict:
+    """
+    Validates the dashboard query for view and returns its fields plus the SQL filters. The per-status counts
+    only apply the date range, so they stay stable while the client flips between status tabs.
+    Raises ValueError for unknown fields or bad dates. statuses accepts 'none' for rows without a status.
+    """
+    spec = STATUS_VIEWS[view]
+    fields = list(fields) if fields else list(spec["default_fields"])
+    unknown = [field for field in fields if field not in spec["fields"]]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    if "call_id" not in fields:
+        fields.insert(0, "call_id")
+
+    date_where, date_params = [], []
+    if since:
+        operator, bound = timestamp_bound(since, end_of_range=False)
+        date_where.append(f"{spec['date_column']} {operator} ?")
+        date_params.append(bound)
+    if until:
+        operator, bound = timestamp_bound(until, end_of_range=True)
+        date_where.append(f"{spec['date_column']} {operator} ?")
+        date_params.append(bound)
+
+    where, params = list(date_where), list(date_params)
+    if statuses:
+        named = [status for status in statuses if status.lower() != "none"]
+        clauses = []
+        if named:
+            clauses.append(f"{spec['status_column']} IN ({', '.join('?' for _ in named)})")
+            params.extend(named)
+        if len(named) < len(statuses):
+            clauses.append(f"{spec['status_column']} IS NULL")
+        where.append(f"({' OR '.join(clauses)})")
+
+    return {
+        "view": view,
+        "fields": fields,
+        "where": " AND ".join(where),
+        "params": params,
+        "count_where": " AND ".join(date_where),
+        "count_params": date_params,
+        "key": [view, fields, statuses, since, until],
+    }
+
+
+def status_page_sql(query: dict) -> str:
+    """The keyset page statement for query; params are query["params"], then after and the row limit."""
+    spec = STATUS_VIEWS[query["view"]]
+    columns = ", ".join(spec["fields"][field] for field in query["fields"])
+    where = f"{query['where']} AND " if query["where"] else ""
+    return f"SELECT {columns} FROM {query['view']} WHERE {where}call_id > ? ORDER BY call_id ASC LIMIT ?"
+
+
+# The dashboards' default polls (no filters): each page must be a primary-key range read
+for _view in STATUS_VIEWS:
+    register_query_plan_check(f"{_view} status page", status_page_sql(build_status_query(_view)), (0, 0))
+
+
+def status_page_limit(limit: Optional[int]) -> int:
+    if not limit:
+        return settings.STATUS_PAGE_SIZE
+    return max(1, min(limit, settings.STATUS_PAGE_MAX))
+
+
+def fetch_status_page(
+    query: dict,
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    if_none_match: Optional[str] = None,
+    db_path=DB_PATH,
+    all_rows: bool = False
+) -> tuple:
+    """
+    Returns (etag, page) for one keyset page of query (rows with call_id > after, in call_id order).
+    all_rows is the explicit opt-in for every matching row in one response (limit and next_cursor are None);
+    it costs a read of the whole filtered table, so pollers should page instead.
+    The ETag is the table's data version plus a hash of the query, so a poll with a matching If-None-Match
+    costs one version read and returns (etag, None). Version, counts and rows come from one read snapshot.
+    """
+    spec = STATUS_VIEWS[query["view"]]
+    limit = None if all_rows else status_page_limit(limit)
+    query_hash = hashlib.sha1(json.dumps([*query["key"], after, limit, all_rows]).encode("utf-8")).hexdigest()[:16]
+
+    conn = connect(db_path, isolation_level=None)
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN")
+        row = c.execute("SELECT version FROM data_versions WHERE name = ?", (query["view"],)).fetchone()
+        etag = f'"{query["view"]}-v{row[0] if row else 0}-{query_hash}"'
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            c.execute("COMMIT")
+            return etag, None
+
+        count_where = f"WHERE {query['count_where']}" if query["count_where"] else ""
+        c.execute(
+            f"SELECT {spec['status_column']}, COUNT(*) FROM {query['view']} {count_where} GROUP BY {spec['status_column']}",
+            query["count_params"]
+        )
+        counts = {status if status is not None else "none": count for status, count in c.fetchall()}
+
+        c.execute(
+            status_page_sql(query),
+            [*query["params"], after if after is not None else float("-inf"), limit + 1 if limit is not None else -1]
+        )
+        rows = c.fetchall()
+        c.execute("COMMIT")
+    finally:
+        conn.close()
+
+    has_more = limit is not None and len(rows) > limit
+    items = [dict(zip(query["fields"], row)) for row in rows[:limit]]
+    return etag, {
+        "queue": items,
+        "counts": counts,
+        "total": sum(counts.values()),
+        "limit": limit,
+        "next_cursor": items[-1]["call_id"] if has_more else None,
+    }
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# Settings requires these at import time; the tests never reach the real services.
+for name in ("ELEVENLABS_API", "ELEVENLABS_WEBHOOK_SECRET", "AGENT_ID", "AGENT_PHONE_NUMBER_ID", "GROQ_API_KEY", "TWILIO_AUTH_TOKEN", "TWILIO_ACCOUNT_SID"):
+    os.environ.setdefault(name, "test")
+
+# Keep the log file, traces and uploads of a test run out of the working tree
+_runtime_dir = tempfile.mkdtemp(prefix="sdr-tests-")
+os.environ.setdefault("LOG_FILE", os.path.join(_runtime_dir, "app.log"))
+os.environ.setdefault("TRACE_EXPORTER", "none")
+os.environ.setdefault("TRACE_FILE", os.path.join(_runtime_dir, "traces.jsonl"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_runtime_dir, "uploads"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
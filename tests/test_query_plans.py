@@ -0,0 +1,53 @@
+import logging
+import pytest
+import helperfuncs
+import ingestion
+import post_call_jobs
+import status_pages
+from db import connect
+
+# The statements the code executes; each module registers its own with register_query_plan_check
+HOT_PATH_STATEMENTS = {
+    "claim next queued call": helperfuncs.CLAIM_NEXT_CALL_SQL,
+    "call lease renewal": helperfuncs.RENEW_CALL_LEASES_SQL,
+    "lease reaper requeue": helperfuncs.REQUEUE_EXPIRED_LEASES_SQL,
+    "lease reaper delete": helperfuncs.DELETE_EXPIRED_LEASES_SQL,
+    "call_sid lookup": helperfuncs.CALL_ID_BY_SID_SQL,
+    "call-ended lookup": helperfuncs.PROCESSING_CALL_BY_CUSTOMER_SQL,
+    "post-call job claim": post_call_jobs.CLAIM_POST_CALL_JOB_SQL,
+    "delta ingest key lookup": ingestion.ROW_HASH_LOOKUP_SQL.format(placeholders="?, ?"),
+    "call_queue status page": status_pages.status_page_sql(status_pages.build_status_query("call_queue")),
+    "customer_data status page": status_pages.status_page_sql(status_pages.build_status_query("customer_data")),
+}
+CHECKS = {name: (query, params, sort_allowed) for name, query, params, sort_allowed in helperfuncs.QUERY_PLAN_CHECKS}
+
+
+@pytest.fixture
+def schema_db(tmp_path, monkeypatch):
+    """A fresh queue.db built by init_db in a temp directory."""
+    db_path = str(tmp_path / "queue.db")
+    monkeypatch.setattr(helperfuncs, "DB_PATH", db_path)
+    helperfuncs.init_db(logging.getLogger(__name__))
+    conn = connect(db_path)
+    yield conn
+    conn.close()
+
+
+def test_hot_path_statements_are_registered():
+    for name, query in HOT_PATH_STATEMENTS.items():
+        assert name in CHECKS, name
+        assert CHECKS[name][0] == query, name
+
+
+@pytest.mark.parametrize("name", sorted(HOT_PATH_STATEMENTS))
+def test_hot_path_statement_uses_index(schema_db, name):
+    query, params, sort_allowed = CHECKS[name]
+    plan = helperfuncs.explain_query_plan(schema_db.cursor(), query, params)
+    assert any(" USING " in detail and ("INDEX" in detail or "PRIMARY KEY" in detail) for detail in plan), plan
+    assert not [detail for detail in plan if helperfuncs.is_table_scan(detail)], plan
+    if not sort_allowed:
+        assert not [detail for detail in plan if "USE TEMP B-TREE" in detail], plan
+
+
+def test_check_query_plans_reports_nothing(schema_db):
+    assert helperfuncs.check_query_plans(schema_db.cursor()) == []
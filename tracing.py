@@ -0,0 +1,252 @@
+import contextlib
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Optional
+import requests
+from config import settings
+from logger_config import get_logger
+from metrics import CALL_STAGE_SECONDS
+
+logger = get_logger(__name__)
+
+# Span-based tracing of the call lifecycle. The trace id is the call's correlation_id (assigned when the row is
+# claimed and stored with the call), so spans recorded by the dialer, the webhooks and the post-call workers
+# all land in the same trace. Finished spans are queued to one exporter thread (JSONL file or OTLP/HTTP).
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None, attributes: Optional[dict] = None, start_ns: Optional[int] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+
+@contextlib.contextmanager
+def span(name: str, trace_id: Optional[str] = None, **attributes):
+    """
+    Times the block as a span: a child of the enclosing span, or a top-level span of trace_id. A span with no
+    trace id yet stays pending until bind_trace() is called inside the block; if it never is, nothing is exported.
+    """
+    parent = _current_span.get()
+    if parent is not None and trace_id in (None, parent.trace_id):
+        current = Span(name, parent.trace_id, parent.span_id, attributes)
+    else:
+        current = Span(name, trace_id, None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        _finish(current)
+
+
+def traced(name: str, **attributes):
+    """Decorator running each call of a function (sync or async) inside span(name)."""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def in_current_trace(func):
+    """
+    Wraps func so calls made on other threads (executor workers) run inside the caller's current span,
+    e.g. so the Groq calls of parallel summary chunks are children of call.summary.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def bind_trace(trace_id: Optional[str], **attributes):
+    """Attaches the current pending span to trace_id (e.g. once a webhook has looked its call up) and adds attributes."""
+    current = _current_span.get()
+    if current is None:
+        return
+    if current.trace_id is None and trace_id:
+        current.trace_id = trace_id
+    current.attributes.update(attributes)
+
+
+def record_span(name: str, trace_id: Optional[str], start_ns: int, end_ns: int, **attributes):
+    """Records a span after the fact, for work timed before its trace id existed (the claim)."""
+    if not trace_id:
+        return
+    finished = Span(name, trace_id, None, attributes, start_ns=start_ns)
+    finished.end_ns = end_ns
+    _finish(finished)
+
+
+def _finish(finished: Span):
+    if finished.trace_id is None:
+        return
+    CALL_STAGE_SECONDS.observe((finished.end_ns - finished.start_ns) / 1e9, stage=finished.name)
+    if settings.TRACE_EXPORTER != "none":
+        span_exporter.submit(finished)
+
+
+def _otlp_id(value: str, length: int) -> str:
+    """OTLP wants hex ids (32 chars for traces); correlation ids are UUIDs, anything else is hashed."""
+    try:
+        return uuid.UUID(value).hex[:length]
+    except ValueError:
+        return hashlib.md5(value.encode("utf-8")).hexdigest()[:length]
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: list) -> dict:
+    """OTLP/HTTP JSON body (ExportTraceServiceRequest) for a batch of finished spans."""
+    otlp_spans = []
+    for finished in spans:
+        entry = {
+            "traceId": _otlp_id(finished.trace_id, 32),
+            "spanId": finished.span_id,
+            "name": finished.name,
+            "kind": 1,
+            "startTimeUnixNano": str(finished.start_ns),
+            "endTimeUnixNano": str(finished.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in {**finished.attributes, "correlation_id": finished.trace_id}.items() if value is not None
+            ],
+            "status": {"code": 2, "message": finished.error} if finished.error else {"code": 1},
+        }
+        if finished.parent_id:
+            entry["parentSpanId"] = finished.parent_id
+        otlp_spans.append(entry)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": settings.TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+        }]
+    }
+
+
+class SpanExporter:
+    """
+    Writes finished spans from a bounded queue on its own thread, a batch at a time, so recording a span never
+    waits on disk or the collector. When the queue is full new spans are dropped and counted.
+    """
+
+    def __init__(self, name: str = "SpanExporter"):
+        self._name = name
+        self._queue = queue.Queue(maxsize=settings.TRACE_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._stats = {"exported": 0, "dropped": 0, "errors": 0, "batches": 0}
+
+    def start(self):
+        if self._thread or settings.TRACE_EXPORTER == "none":
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+        self._thread.start()
+        target = settings.TRACE_OTLP_ENDPOINT if settings.TRACE_EXPORTER == "otlp" else settings.TRACE_FILE
+        logger.info(f"[{self._name}] Exporting call traces ({settings.TRACE_EXPORTER}) to {target}.\n\n")
+
+    def submit(self, finished: Span):
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize())
+
+    def _write_jsonl(self, batch: list):
+        if self._file is not None and self._file.tell() >= settings.TRACE_FILE_MAX_BYTES:
+            self._file.close()
+            os.replace(settings.TRACE_FILE, f"{settings.TRACE_FILE}.1")
+            self._file = None
+        if self._file is None:
+            self._file = open(settings.TRACE_FILE, "a", encoding="utf-8")
+        self._file.write("".join(json.dumps(finished.to_dict(), ensure_ascii=False, default=str) + "\n" for finished in batch))
+        self._file.flush()
+
+    def _post_otlp(self, batch: list):
+        response = requests.post(settings.TRACE_OTLP_ENDPOINT, json=to_otlp(batch), timeout=5)
+        if response.status_code >= 300:
+            raise RuntimeError(f"collector returned {response.status_code}: {response.text[:200]}")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < settings.TRACE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if settings.TRACE_EXPORTER == "otlp":
+                    self._post_otlp(batch)
+                else:
+                    self._write_jsonl(batch)
+                with self._lock:
+                    self._stats["exported"] += len(batch)
+                    self._stats["batches"] += 1
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                    self._stats["dropped"] += len(batch)
+                logger.warning(f"[{self._name}] Could not export {len(batch)} span(s): {e}\n\n")
+
+
+span_exporter = SpanExporter()
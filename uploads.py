@@ -0,0 +1,117 @@
+import hashlib
+import os
+import uuid
+from typing import Optional
+from fastapi import UploadFile
+from config import settings
+from logger_config import get_logger
+from db import connect
+from helperfuncs import DB_PATH
+
+logger = get_logger(__name__)
+
+ALLOWED_UPLOAD_EXTENSIONS = (".xlsx", ".xlsm", ".xls", ".csv")
+UPLOAD_COLUMNS = ("upload_id", "sha256", "filename", "path", "size_bytes", "uploaded_by", "created_at")
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds settings.UPLOAD_MAX_BYTES."""
+
+
+def upload_extension(filename: Optional[str]) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if extension in ALLOWED_UPLOAD_EXTENSIONS else ".xlsx"
+
+
+async def store_upload(file: UploadFile, uploaded_by: Optional[str] = None) -> dict:
+    """
+    Streams the upload to disk in UPLOAD_CHUNK_BYTES chunks while hashing it, then moves it to
+    UPLOAD_DIR/<sha256><ext>. Identical content is stored once; every upload still gets its own upload_id.
+    Raises UploadTooLarge (and removes the partial file) past UPLOAD_MAX_BYTES.
+    """
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    extension = upload_extension(file.filename)
+    part_path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(part_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise UploadTooLarge(f"Upload exceeds {settings.UPLOAD_MAX_BYTES} bytes")
+                digest.update(chunk)
+                buffer.write(chunk)
+        sha256 = digest.hexdigest()
+        path = os.path.join(settings.UPLOAD_DIR, f"{sha256}{extension}")
+        if os.path.exists(path):
+            os.remove(part_path)
+        else:
+            os.replace(part_path, path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    upload = {
+        "upload_id": uuid.uuid4().hex,
+        "sha256": sha256,
+        "filename": file.filename,
+        "path": path,
+        "size_bytes": size,
+        "uploaded_by": uploaded_by,
+    }
+    conn = connect(DB_PATH)
+    try:
+        conn.execute(
+            "INSERT INTO uploads (upload_id, sha256, filename, path, size_bytes, uploaded_by) VALUES (?, ?, ?, ?, ?, ?)",
+            (upload["upload_id"], sha256, file.filename, path, size, uploaded_by)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info(f"[store_upload] Stored upload {upload['upload_id']} ({size} bytes, sha256 {sha256[:12]}) at {path}.\n\n")
+    return upload
+
+
+def _fetch_upload(where: str, params) -> Optional[dict]:
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute(f"SELECT {', '.join(UPLOAD_COLUMNS)} FROM uploads WHERE {where} ORDER BY created_at DESC, rowid DESC LIMIT 1", params)
+        row = c.fetchone()
+    finally:
+        conn.close()
+    return dict(zip(UPLOAD_COLUMNS, row)) if row else None
+
+
+def get_upload(upload_id: str) -> Optional[dict]:
+    return _fetch_upload("upload_id = ?", (upload_id,))
+
+
+def latest_upload(uploaded_by: Optional[str] = None) -> Optional[dict]:
+    """Most recent upload by uploaded_by (or by anyone when None); used when /add-call gets no upload_id."""
+    if uploaded_by is None:
+        return _fetch_upload("1 = 1", ())
+    return _fetch_upload("uploaded_by = ?", (uploaded_by,))
+
+
+def completed_ingest_for_content(sha256: str) -> Optional[dict]:
+    """Returns the latest completed ingest job for an upload with this content hash, if any."""
+    conn = connect(DB_PATH)
+    try:
+        c = conn.cursor()
+        c.execute("""
+            SELECT j.job_id, j.upload_id, j.finished_at
+            FROM ingest_jobs j JOIN uploads u ON u.upload_id = j.upload_id
+            WHERE u.sha256 = ? AND j.status = 'completed'
+            ORDER BY j.finished_at DESC
+            LIMIT 1
+        """, (sha256,))
+        row = c.fetchone()
+    finally:
+        conn.close()
+    return dict(zip(("job_id", "upload_id", "finished_at"), row)) if row else None